@@ -29,9 +29,48 @@ def create_app(config_name: str = "default"):
         if request.method == "OPTIONS":
             return "", 200
 
+    from .services import (
+        attendance_sessions,
+        embedding_versions,
+        face_engine,
+        inference_pool,
+        face_index,
+        face_pipeline,
+        face_quality,
+        face_roster,
+        face_session_state,
+        frame_cache,
+        notification_dispatcher,
+    )
+
+    face_engine.init_app(app)
+    embedding_versions.init_app(app)
+    inference_pool.init_app(app)
+    face_index.init_app(app)
+    face_pipeline.init_app(app)
+    face_quality.init_app(app)
+    face_roster.init_app(app)
+    face_session_state.init_app(app)
+    frame_cache.init_app(app)
+    notification_dispatcher.init_app(app)
+    attendance_sessions.init_app(app)
+
     @app.route("/health", methods=["GET"])
     def health():
-        return jsonify({"success": True, "message": "Backend running"})
+        return jsonify(
+            {
+                "success": True,
+                "message": "Backend running",
+                "face_engine": face_engine.status(),
+                "inference_pool": inference_pool.metrics(),
+            }
+        )
+
+    @app.route("/health/ready", methods=["GET"])
+    def health_ready():
+        engine = face_engine.status()
+        ready = engine["ready"] and inference_pool.is_ready()
+        return jsonify({"success": ready, "face_engine": engine}), (200 if ready else 503)
 
     # Blueprints
     from .blueprints.auth.routes import auth_bp
@@ -8,13 +8,7 @@ import csv
 import io
 import os
 import cv2
-import json
-import numpy as np
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from deepface import DeepFace
-from flask import request, jsonify, Blueprint
+from flask import request, jsonify, Blueprint, current_app
 from app.utils.security import generate_random_password
 from ...extensions import db
 from ...models.classes import Class as SchoolClass
@@ -28,10 +22,31 @@ from ...models.attendance_session import AttendanceSession
 from ...models.attendance_record import AttendanceRecord
 from ...models.notification import Notification
 from ...models.teacher_attendance import TeacherAttendance
+from ...models.face_reembed_job import FaceReembedJob
+from ...services import (
+    attendance_sessions,
+    embedding_versions,
+    face_duplicates,
+    face_engine,
+    inference_pool,
+    face_enrollment_service,
+    face_index,
+    face_pipeline,
+    face_quality,
+    face_roster,
+    face_session_state,
+    frame_cache,
+    notification_dispatcher,
+    reembed_service,
+)
 from ...services.auth_service import create_user
+from ...services.face_template_service import add_template, save_template_image
+from ...services.face_match_service import invalidate_class, invalidate_classes
 from ...utils.decorators import role_required
 from ...utils.validators import validate_json
 from ...utils.errors import APIError
+from ...utils import image_preprocess
+from ...utils.image_preprocess import decode_image
 from datetime import datetime, timedelta
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func, case, or_
@@ -179,6 +194,7 @@ def delete_class(class_id):
         raise APIError("Class not found", status_code=404)
     db.session.delete(klass)
     db.session.commit()
+    invalidate_class(class_id)
     return jsonify({"success": True, "message": "Class deleted"})
 
 
@@ -337,6 +353,7 @@ def import_students_csv():
     updated = 0
     skipped = 0
     errors = []
+    touched_class_ids = set()
 
     try:
         for idx, row in enumerate(reader, start=2):
@@ -368,6 +385,8 @@ def import_students_csv():
                     )
                     db.session.add(student)
                 else:
+                    if student.class_id != class_id:
+                        touched_class_ids.update((student.class_id, class_id))
                     student.roll_no = roll_no
                     student.class_id = class_id
 
@@ -375,6 +394,7 @@ def import_students_csv():
                 skipped += 1
                 errors.append({"row": idx, "error": str(row_err)})
         db.session.commit()
+        invalidate_classes(touched_class_ids)
 
     except Exception as e:
         db.session.rollback()
@@ -422,6 +442,7 @@ def update_student(student_id):
         user.set_password(data["password"])
     if "roll_no" in data and data["roll_no"] is not None:
         student.roll_no = data["roll_no"]
+    old_class_id = student.class_id
     if "class_id" in data and data["class_id"] not in (None, ""):
         try:
             student.class_id = int(data["class_id"])
@@ -429,6 +450,8 @@ def update_student(student_id):
             raise APIError("Invalid class_id", status_code=400)
 
     db.session.commit()
+    if student.class_id != old_class_id:
+        invalidate_classes((old_class_id, student.class_id))
     return jsonify({"success": True, "data": student.to_dict()})
 
 
@@ -460,10 +483,13 @@ def delete_student(student_id):
     if not student:
         raise APIError("Student not found", status_code=404)
     user = student.user
+    class_id = student.class_id
     db.session.delete(student)
     if user:
         db.session.delete(user)
     db.session.commit()
+    invalidate_classes((class_id,))
+    face_index.remove_student(student_id)
     return jsonify({"success": True, "message": "Student and user deleted"})
 
 
@@ -1311,6 +1337,59 @@ def delete_teacher_subject(assignment_id):
         "message": "Teacher subject assignment deleted successfully"
     })
 
+# ---------- Face engine monitoring ----------
+@admin_bp.route("/face-engine/metrics", methods=["GET"])
+@role_required("ADMIN")
+def face_engine_metrics():
+    return jsonify(
+        {
+            "success": True,
+            "data": {
+                "engine": face_engine.status(),
+                "inference_pool": inference_pool.metrics(),
+                "preprocess": image_preprocess.metrics(),
+                "rosters": face_roster.status(),
+                "frame_cache": frame_cache.metrics(),
+                "session_cache": attendance_sessions.metrics(),
+                "sessions": face_session_state.status(),
+                "notifications": notification_dispatcher.status(),
+            },
+        }
+    )
+
+
+def _form_flag(name: str) -> bool:
+    return request.form.get(name, "").lower() in ("1", "true", "yes")
+
+
+def _replace_templates() -> bool:
+    """Registering adds a template; replace=true discards the previous ones."""
+    return _form_flag("replace")
+
+
+def _check_duplicate_face(student, embedding) -> None:
+    """
+    Refuse a face already enrolled for another student (409 with the
+    matches); allow_duplicate=true registers it anyway, e.g. for twins.
+    """
+    if _form_flag("allow_duplicate"):
+        return
+    matches = face_duplicates.find_matches([embedding], exclude_ids=[student.id])[0]
+    if matches:
+        people = face_duplicates.describe(sid for sid, _ in matches)
+        raise APIError(
+            "This face is already registered to another student",
+            409,
+            {
+                "reason": "DUPLICATE_FACE",
+                "matches": [
+                    {**people.get(sid, {"student_id": sid}), "distance": round(distance, 4)}
+                    for sid, distance in matches
+                ],
+            },
+        )
+
+
 @admin_bp.route("/students/<int:student_id>/register-face", methods=["POST"])
 @role_required("ADMIN")
 def register_student_face(student_id):
@@ -1326,72 +1405,153 @@ def register_student_face(student_id):
 
     try:
         # Convert image
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        image = decode_image(file.read(), current_app.config["FACE_IMAGE_MAX_SIDE"])
 
         if image is None:
             raise APIError("Invalid image", 400)
 
-        # Convert to RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # Detect once, embed the aligned crop in memory (see services/face_pipeline.py)
+        face, embedding = face_pipeline.largest_face(image, check_quality=True)
+
+        if face is None or embedding is None:
+            reason = face["rejected"] if face else face_quality.NO_FACE
+            raise APIError(face_quality.MESSAGES[reason], 400, {"reason": reason})
 
-        # Convert to MediaPipe Image
-        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+        _check_duplicate_face(student, embedding)
 
-        # Load face detection model
-        model_path = os.path.join("models", "blaze_face_short_range.tflite")
+        upload_dir = os.path.join("uploads", "faces")
+        os.makedirs(upload_dir, exist_ok=True)
 
-        base_options = python.BaseOptions(model_asset_path=model_path)
+        # the crop is kept for display, and per template so it can be
+        # re-embedded after a model change; it is never read back for matching
+        file_path = os.path.join(upload_dir, f"student_{student.id}.jpg")
+        cv2.imwrite(file_path, face["crop"])
+        template_path = save_template_image(cv2.imencode(".jpg", face["crop"])[1].tobytes())
 
-        options = vision.FaceDetectorOptions(
-            base_options=base_options, running_mode=vision.RunningMode.IMAGE
+        student.face_image_path = file_path
+        student.face_registered_at = datetime.utcnow()
+        template_count = add_template(
+            student, embedding, replace=_replace_templates(), image_path=template_path
         )
+        db.session.commit()
+        invalidate_classes((student.class_id,))
+        face_index.upsert_student(student.id, student.get_face_embedding())
 
-        detector = vision.FaceDetector.create_from_options(options)
+        return jsonify(
+            {
+                "success": True,
+                "message": "Face registered successfully",
+                "template_count": template_count,
+            }
+        )
 
-        detection_result = detector.detect(mp_image)
+    except APIError:
+        raise
 
-        if not detection_result.detections:
-            raise APIError("No face detected", 400)
+    except Exception as e:
+        db.session.rollback()
+        print("Face registration error:", e)
+        raise APIError("Face registration failed", 500)
 
-        # Get first face
-        bbox = detection_result.detections[0].bounding_box
 
-        x, y = bbox.origin_x, bbox.origin_y
-        w, h = bbox.width, bbox.height
+@admin_bp.route("/students/register-face/bulk", methods=["POST"])
+@role_required("ADMIN")
+def bulk_register_student_faces():
+    """
+    Start a bulk enrollment from a ZIP of photos named by roll number
+    (match_by=roll_no, default) or student id (match_by=id).
+    Returns 202 with a job id to poll.
+    """
+    if "file" not in request.files:
+        raise APIError("ZIP file required", 400)
+
+    match_by = request.form.get("match_by", "roll_no")
+    job = face_enrollment_service.start_job(
+        request.files["file"],
+        match_by=match_by,
+        created_by=get_jwt_identity(),
+        app=current_app._get_current_object(),
+    )
 
-        face_crop = image[y : y + h, x : x + w]
+    return jsonify({"success": True, "data": job.to_dict(include_report=False)}), 202
 
-        if face_crop.size == 0:
-            raise APIError("Face crop failed", 400)
 
-        upload_dir = os.path.join("uploads", "faces")
-        os.makedirs(upload_dir, exist_ok=True)
+@admin_bp.route("/students/register-face/bulk/<job_id>", methods=["GET"])
+@role_required("ADMIN")
+def bulk_register_student_faces_status(job_id):
+    job = face_enrollment_service.get_job(job_id)
+    include_report = job.status in ("COMPLETED", "FAILED")
+    return jsonify({"success": True, "data": job.to_dict(include_report=include_report)})
 
-        file_path = os.path.join(upload_dir, f"student_{student.id}.jpg")
 
-        cv2.imwrite(file_path, face_crop)
+@admin_bp.route("/students/face-duplicates", methods=["GET"])
+@role_required("ADMIN")
+def face_duplicates_report():
+    """
+    Pairs of enrolled students whose faces are closer than ?threshold=
+    (cosine distance, default FACE_DUPLICATE_THRESHOLD), closest first.
+    """
+    threshold = request.args.get("threshold", type=float)
+    limit = request.args.get("limit", 500, type=int)
+    pairs = face_duplicates.duplicate_pairs(threshold)
+    people = face_duplicates.describe(sid for a, b, _ in pairs[:limit] for sid in (a, b))
+    return jsonify(
+        {
+            "success": True,
+            "data": {
+                "threshold": face_duplicates.threshold() if threshold is None else threshold,
+                "total_pairs": len(pairs),
+                "pairs": [
+                    {
+                        "student_a": people.get(a, {"student_id": a}),
+                        "student_b": people.get(b, {"student_id": b}),
+                        "distance": round(distance, 4),
+                    }
+                    for a, b, distance in pairs[:limit]
+                ],
+            },
+        }
+    )
+
 
-        student.face_image_path = file_path
-        student.face_registered_at = datetime.utcnow()
-        db.session.commit()
+# ---------- Embedding model versions ----------
+@admin_bp.route("/face-embeddings", methods=["GET"])
+@role_required("ADMIN")
+def face_embedding_versions():
+    jobs = FaceReembedJob.query.order_by(FaceReembedJob.created_at.desc()).limit(10).all()
+    return jsonify(
+        {
+            "success": True,
+            "data": {**embedding_versions.status(), "jobs": [j.to_dict() for j in jobs]},
+        }
+    )
 
-        embedding = DeepFace.represent(
-            img_path=file_path, model_name="ArcFace", enforce_detection=False
-        )[0]["embedding"]
 
-        student.face_embedding = json.dumps(embedding)
-        db.session.commit()
+@admin_bp.route("/face-embeddings/reembed", methods=["POST"])
+@role_required("ADMIN")
+def start_face_reembed():
+    """
+    Re-embed every stored face with the configured model in the background.
+    Matching keeps using the active version until the job completes.
+    Returns 202 with a job id to poll.
+    """
+    job = reembed_service.start_job(
+        created_by=get_jwt_identity(), app=current_app._get_current_object()
+    )
+    return jsonify({"success": True, "data": job.to_dict()}), 202
 
-        return jsonify({"success": True, "message": "Face registered successfully"})
 
-    except APIError:
-        raise
+@admin_bp.route("/face-embeddings/reembed/<job_id>", methods=["GET"])
+@role_required("ADMIN")
+def face_reembed_status(job_id):
+    return jsonify({"success": True, "data": reembed_service.get_job(job_id).to_dict()})
 
-    except Exception as e:
-        db.session.rollback()
-        print("Face registration error:", e)
-        raise APIError("Face registration failed", 500)
+
+@admin_bp.route("/face-embeddings/reembed/<job_id>/resume", methods=["POST"])
+@role_required("ADMIN")
+def resume_face_reembed(job_id):
+    job = reembed_service.resume_job(job_id, app=current_app._get_current_object())
+    return jsonify({"success": True, "data": job.to_dict()}), 202
 
 
 # ---------- List teacher-subject assignments ----------
@@ -1445,32 +1605,43 @@ def register_teacher_face(teacher_id):
     file = request.files["image"]
 
     try:
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        image = decode_image(file.read(), current_app.config["FACE_IMAGE_MAX_SIDE"])
 
         if image is None:
             raise APIError("Invalid image", 400)
 
+        face, embedding = face_pipeline.largest_face(image, check_quality=True)
+
+        if face is None or embedding is None:
+            reason = face["rejected"] if face else face_quality.NO_FACE
+            raise APIError(face_quality.MESSAGES[reason], 400, {"reason": reason})
+
         # Save face image
         upload_dir = os.path.join("uploads", "faces")
         os.makedirs(upload_dir, exist_ok=True)
 
         file_path = os.path.join(upload_dir, f"teacher_{teacher.id}.jpg")
-        cv2.imwrite(file_path, image)
-
-        # Generate embedding
-        embedding = DeepFace.represent(
-            img_path=file_path,
-            model_name="ArcFace",
-            enforce_detection=False
-        )[0]["embedding"]
+        cv2.imwrite(file_path, face["crop"])
+        template_path = save_template_image(cv2.imencode(".jpg", face["crop"])[1].tobytes())
 
-        teacher.face_embedding = json.dumps(embedding)
+        template_count = add_template(
+            teacher, embedding, replace=_replace_templates(), image_path=template_path
+        )
         teacher.face_registered_at = datetime.utcnow()
 
         db.session.commit()
+        face_roster.bump(face_roster.TEACHERS)
+
+        return jsonify(
+            {
+                "success": True,
+                "message": "Teacher face registered successfully",
+                "template_count": template_count,
+            }
+        )
 
-        return jsonify({"success": True, "message": "Teacher face registered successfully"})
+    except APIError:
+        raise
 
     except Exception as e:
         db.session.rollback()
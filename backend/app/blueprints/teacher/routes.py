@@ -1,20 +1,15 @@
-from deepface import DeepFace
-import tempfile
 import os
-import cv2
-import json
 import uuid
-import numpy as np
 from datetime import date, datetime
-from scipy.spatial.distance import cosine
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import get_jwt_identity
-from sqlalchemy import func, case, select
+from sqlalchemy import func, case, insert, select
 from ...extensions import db
 from ...models.teacher_classes import TeacherClass
 from ...models.classes import Class as SchoolClass
 from ...models.teacher import Teacher
 from ...models.student import Student
+from ...models.user import User
 from ...models.attendance_session import AttendanceSession
 from ...models.attendance_record import AttendanceRecord
 from ...models.teacher_attendance import TeacherAttendance
@@ -25,13 +20,33 @@ from ...services.attendance_service import (
     is_teacher_assigned,
     create_session,
     save_records,
+    queue_change_notifications,
     get_session_with_records,
     list_sessions_for_teacher,
 )
+from ...services import (
+    attendance_sessions,
+    attendance_sync,
+    face_engine,
+    face_index,
+    face_pipeline,
+    face_quality,
+    face_roster,
+    face_session_state,
+    frame_cache,
+    notification_dispatcher,
+)
+from ...services.face_template_service import owner_matrix, best_distance
+from ...services.face_match_service import (
+    match_embedding,
+    assign_embeddings,
+    match_threshold,
+)
 from ...utils.decorators import role_required
 from ...utils.validators import validate_json
-from ...utils.notification_helper import create_notification
+from ...utils.notification_helper import queue_notifications
 from ...utils.errors import APIError
+from ...utils.image_preprocess import decode_image
 from app.models import teacher
 from ...models.teacher_subject_assignments import TeacherSubjectAssignment
 from ...models.subject import Subject
@@ -110,7 +125,7 @@ def teacher_self_attendance():
     if not teacher:
         return jsonify({"error": "Teacher profile not found"}), 404
 
-    if not teacher.face_embedding:
+    if not teacher.has_face_embedding:
         return jsonify({"error": "Face not registered by admin"}), 400
 
     if "image" not in request.files:
@@ -128,22 +143,29 @@ def teacher_self_attendance():
 
     try:
         file = request.files["image"]
-        file_bytes = np.frombuffer(file.read(), np.uint8)
-        image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-        embedding = DeepFace.represent(
-            img_path=image,
-            model_name="ArcFace",
-            enforce_detection=False
-        )[0]["embedding"]
-
-        stored_embedding = np.array(json.loads(teacher.face_embedding))
-        captured_embedding = np.array(embedding)
-
-        from scipy.spatial.distance import cosine
-        distance = cosine(stored_embedding, captured_embedding)
-
-        if distance > 0.6:
+        image = decode_image(file.read(), current_app.config["FACE_IMAGE_MAX_SIDE"])
+        if image is None:
+            raise APIError("Invalid image", 400)
+
+        face, captured_embedding = face_pipeline.largest_face(image, check_quality=True)
+        if face is None or captured_embedding is None:
+            reason = face["rejected"] if face else face_quality.NO_FACE
+            return jsonify(
+                {"success": False, "message": face_quality.MESSAGES[reason], "reason": reason}
+            ), 400
+
+        # centroid and every enrollment template in one vectorized pass
+        roster = face_roster.get_roster(face_roster.TEACHERS)
+        matrix = roster.owner_rows(teacher.id)
+        if matrix.size == 0:
+            # registered after this worker last mapped the roster
+            matrix = owner_matrix(teacher)
+
+        if (
+            matrix is None
+            or roster.version != face_engine.model_version()
+            or best_distance(matrix, captured_embedding) > match_threshold()
+        ):
             return jsonify({"success": False, "message": "Face not matched"}), 400
 
         record = TeacherAttendance(
@@ -158,6 +180,9 @@ def teacher_self_attendance():
 
         return jsonify({"success": True, "message": "Attendance marked"})
 
+    except APIError:
+        raise
+
     except Exception as e:
         db.session.rollback()
         print("Self attendance error:", e)
@@ -491,23 +516,12 @@ def create_attendance_session():
     if not assigned:
         raise APIError("Forbidden: Not assigned to this subject", 403)
 
-    # Check duplicate session
-    existing = AttendanceSession.query.filter_by(
-        class_id=class_id, subject_id=subject_id, session_date=session_date
-    ).first()
-
-    if existing:
-        raise APIError("Session already exists for this subject on this date", 400)
-
-    session = AttendanceSession(
-        class_id=class_id,
-        subject_id=subject_id,
-        teacher_id=teacher.id,
-        session_date=session_date,
+    session, created = attendance_sessions.get_or_create_session(
+        class_id, subject_id, datetime.strptime(session_date, "%Y-%m-%d").date(), teacher.id
     )
 
-    db.session.add(session)
-    db.session.commit()
+    if not created:
+        raise APIError("Session already exists for this subject on this date", 400)
 
     return jsonify({"success": True, "data": {"session_id": session.id}}), 201
 
@@ -569,32 +583,47 @@ def update_session_records(session_id):
         raise APIError("Not authorized for this subject", 403)
 
     try:
-        save_records(session_id=session_id, records=data)
-
-        #  Send notification to students
-        records = AttendanceRecord.query.filter_by(session_id=session_id).all()
+        changes = save_records(session_id=session_id, records=data, commit=False)
 
-        for record in records:
-            student = Student.query.get(record.student_id)
-            if not student:
-                continue
-
-            create_notification(
-                user_id=student.user_id,
-                title="Attendance Updated",
-                message=f"Your attendance has been marked as {record.status} for {session.session_date}.",
-                type="info" if record.status == "PRESENT" else "warning",
-            )
+        #  Notify students whose status changed, in the same transaction
+        queue_change_notifications(session, changes)
+        db.session.commit()
+        notification_dispatcher.wake()
 
     except APIError as e:
         # preserve real error
+        db.session.rollback()
         raise e
 
     except Exception:
+        db.session.rollback()
         raise APIError("Failed to save attendance", status_code=500)
 
     #  SUCCESS PATH — NO EXCEPTION AFTER THIS
-    return jsonify({"success": True, "message": "Attendance saved successfully"}), 200
+    return jsonify(
+        {"success": True, "message": "Attendance saved successfully", "changed": len(changes)}
+    ), 200
+
+
+@teacher_bp.route("/sync", methods=["POST"])
+@role_required("TEACHER")
+def sync_attendance():
+    """
+    Offline-first batch upload: a list of sessions with their records, each
+    under a client idempotency key (see services/attendance_sync). Missing
+    sessions are created and the whole batch is saved in one transaction.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise APIError("Expected a non-empty list of session items", status_code=400)
+    limit = current_app.config.get("ATTENDANCE_SYNC_MAX_ITEMS", 200)
+    if len(items) > limit:
+        raise APIError(f"At most {limit} session items per sync", status_code=413)
+
+    teacher = _get_current_teacher()
+    results = attendance_sync.sync_sessions(teacher.id, items)
+    return jsonify({"success": True, "data": {"results": results}}), 200
 
 
 @teacher_bp.route("/attendance/summary", methods=["GET"])
@@ -699,6 +728,95 @@ def teacher_assignments():
     return jsonify({"success": True, "data": data})
 
 
+def _mark_group_attendance(session, image):
+    """
+    Group-photo mode for face_attendance: embed every detected face in one
+    batched forward pass, assign faces to students one-to-one and write
+    the new PRESENT marks.
+    """
+    detected = face_pipeline.all_faces(image, check_quality=True, group=True)
+    faces = [face for face, _ in detected]
+
+    # faces rejected by the quality gate were not embedded
+    accepted = [i for i, (_, embedding) in enumerate(detected) if embedding is not None]
+    matches = [None] * len(detected)
+    accepted_matches = assign_embeddings(session.class_id, [detected[i][1] for i in accepted])
+    for i, match in zip(accepted, accepted_matches):
+        matches[i] = match
+    matched_ids = [m[0] for m in matches if m]
+
+    # marked students and names come from the in-process session state;
+    # new marks are written through (see face_session_state)
+    state = face_session_state.get_state(session)
+    students = {}
+    for sid in matched_ids:
+        student = state.student(sid)
+        if student is not None:
+            students[sid] = student
+    already_marked = {sid for sid in students if sid in state.marked}
+    new_ids = state.mark(sid for sid in matched_ids if sid in students)
+
+    results = []
+    for index, (face, match) in enumerate(zip(faces, matches)):
+        entry = {
+            "face_index": index,
+            "box": face["box"],
+            "matched": False,
+        }
+        if face.get("rejected"):
+            entry["reason"] = face["rejected"]
+        if match and match[0] in students:
+            entry.update(
+                {
+                    "matched": True,
+                    "student_id": match[0],
+                    "student_name": students[match[0]][1],
+                    "distance": round(match[1], 4),
+                    "already_marked": match[0] in already_marked,
+                }
+            )
+        results.append(entry)
+
+    return {
+        "success": True,
+        "faces_detected": len(faces),
+        "matched_count": len(matched_ids),
+        "newly_marked": len(new_ids),
+        "faces": results,
+    }
+
+
+def _mark_single_attendance(session, image):
+    """
+    Single-person mode for face_attendance: match the largest face against
+    the class and mark that student PRESENT.
+    """
+    face, embedding = face_pipeline.largest_face(image, check_quality=True)
+    if face is None:
+        return {"matched": False, "reason": face_quality.NO_FACE}
+    if embedding is None:
+        return {"matched": False, "reason": face["rejected"]}
+
+    match = match_embedding(session.class_id, embedding)
+
+    if not match:
+        return {"matched": False}
+
+    state = face_session_state.get_state(session)
+    student = state.student(match[0])
+    if student is None:
+        return {"matched": False}
+
+    new_ids = state.mark([match[0]])
+
+    return {
+        "matched": True,
+        "student_id": match[0],
+        "student_name": student[1],
+        "already_marked": not new_ids,
+    }
+
+
 @teacher_bp.route("/face-attendance", methods=["POST"])
 @role_required("TEACHER")
 def face_attendance():
@@ -727,83 +845,98 @@ def face_attendance():
     if not assigned:
         raise APIError("Not authorized for this subject", 403)
 
-    session = AttendanceSession.query.filter_by(
-        class_id=class_id, subject_id=subject_id, session_date=session_date_obj
-    ).first()
+    session, _ = attendance_sessions.get_or_create_session(
+        class_id, subject_id, session_date_obj, teacher.id
+    )
 
-    if not session:
-        session = AttendanceSession(
-            class_id=class_id,
-            subject_id=subject_id,
-            teacher_id=teacher.id,
-            session_date=session_date_obj,
-        )
-        db.session.add(session)
-        db.session.commit()
+    data = request.files["image"].read()
+    mode = "group" if request.form.get("mode") == "group" else "single"
 
-    file = request.files["image"]
-    file_bytes = np.frombuffer(file.read(), np.uint8)
-    captured_image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    # network retries re-send the same frame; reuse the earlier result
+    cached, cache_key = frame_cache.lookup(
+        (class_id, subject_id, session_date_obj, mode), data
+    )
+    if cached is not None:
+        return jsonify({**cached, "cached": True})
+
+    # group photos keep more resolution so back-row faces survive downscaling
+    max_side = current_app.config[
+        "FACE_GROUP_IMAGE_MAX_SIDE" if mode == "group" else "FACE_IMAGE_MAX_SIDE"
+    ]
+    captured_image = decode_image(data, max_side)
 
     if captured_image is None:
         raise APIError("Invalid image", 400)
 
-    # Single embedding only
-    representation = DeepFace.represent(
-        img_path=captured_image,
-        model_name="ArcFace",
-        detector_backend="opencv",
-        enforce_detection=False,
-    )[0]
-
-    captured_embedding = np.array(representation["embedding"])
-
-    students = Student.query.filter_by(class_id=class_id).all()
-
-    from scipy.spatial.distance import cosine
+    if mode == "group":
+        result = _mark_group_attendance(session, captured_image)
+    else:
+        result = _mark_single_attendance(session, captured_image)
 
-    best_match = None
-    best_distance = 999
+    # a look-alike frame may show another student; only reuse "no face" for it
+    if mode == "group":
+        no_face = result["faces_detected"] == 0
+    else:
+        no_face = result.get("reason") == face_quality.NO_FACE
+    frame_cache.store(cache_key, result, similar=no_face)
+    return jsonify(result)
 
-    for student in students:
 
-        if not student.face_embedding:
-            continue
+@teacher_bp.route("/kiosk/identify", methods=["POST"])
+@role_required("TEACHER", "ADMIN")
+def kiosk_identify():
+    """
+    Identify a face against every enrolled student in the school (no class
+    context), using the school-wide face index.
+    """
+    if "image" not in request.files:
+        raise APIError("Image required", 400)
 
-        stored_embedding = np.array(json.loads(student.face_embedding))
-        distance = cosine(captured_embedding, stored_embedding)
+    k = min(max(request.form.get("k", default=5, type=int), 1), 20)
 
-        if distance < best_distance:
-            best_distance = distance
-            best_match = student
+    image = decode_image(
+        request.files["image"].read(), current_app.config["FACE_IMAGE_MAX_SIDE"]
+    )
+    if image is None:
+        raise APIError("Invalid image", 400)
 
-    if not best_match or best_distance > 0.6:
-        return jsonify({"matched": False})
+    face, embedding = face_pipeline.largest_face(image)
+    if face is None:
+        return jsonify({"identified": False, "candidates": []})
 
-    existing = AttendanceRecord.query.filter_by(
-        session_id=session.id, student_id=best_match.id
-    ).first()
+    hits = face_index.identify(embedding, k=k)
 
-    if not existing:
-        db.session.add(
-            AttendanceRecord(
-                session_id=session.id, student_id=best_match.id, status="PRESENT"
+    students = {}
+    if hits:
+        students = {
+            row.id: row
+            for row in db.session.query(
+                Student.id, Student.roll_no, Student.class_id, User.name
             )
-        )
-        db.session.commit()
+            .join(User, User.id == Student.user_id)
+            .filter(Student.id.in_([sid for sid, _ in hits]))
+        }
 
-        create_notification(
-            user_id=best_match.user_id,
-            title="Attendance Marked (Face)",
-            message=f"You were marked PRESENT on {session.session_date}.",
-            type="success",
-        )
+    candidates = [
+        {
+            "student_id": sid,
+            "student_name": students[sid].name,
+            "roll_no": students[sid].roll_no,
+            "class_id": students[sid].class_id,
+            "similarity": round(similarity, 4),
+            "distance": round(1 - similarity, 4),
+        }
+        # the index may briefly hold students deleted by another worker
+        for sid, similarity in hits
+        if sid in students
+    ]
 
+    identified = bool(candidates) and candidates[0]["distance"] <= match_threshold()
     return jsonify(
         {
-            "matched": True,
-            "student_id": best_match.id,
-            "student_name": best_match.user.name,
+            "identified": identified,
+            "student": candidates[0] if identified else None,
+            "candidates": candidates,
         }
     )
 
@@ -836,6 +969,9 @@ def finalize_face_attendance():
     if not session:
         raise APIError("Session not found", 404)
 
+    # marks are already written; drop this process's capture state
+    face_session_state.finalize(session)
+
     students = Student.query.filter_by(class_id=class_id).all()
 
     present_ids = {
@@ -843,31 +979,28 @@ def finalize_face_attendance():
         for r in AttendanceRecord.query.filter_by(session_id=session.id).all()
     }
 
-    records_to_add = []
-
-    for student in students:
-        if student.id not in present_ids:
-            records_to_add.append(
-                AttendanceRecord(
-                    session_id=session.id, student_id=student.id, status="ABSENT"
-                )
-            )
+    absent = [student for student in students if student.id not in present_ids]
 
-    if records_to_add:
-        db.session.add_all(records_to_add)
+    if absent:
+        # records and notifications: one multi-row insert each, one commit
+        db.session.execute(
+            insert(AttendanceRecord),
+            [
+                {"session_id": session.id, "student_id": student.id, "status": "ABSENT"}
+                for student in absent
+            ],
+        )
+        queue_notifications(
+            {
+                "user_id": student.user_id,
+                "title": "Marked Absent",
+                "message": f"You were marked ABSENT on {session.session_date}.",
+                "type": "warning",
+            }
+            for student in absent
+        )
         db.session.commit()
-
-        for record in records_to_add:
-            student = Student.query.get(record.student_id)
-            if not student:
-                continue
-
-            create_notification(
-                user_id=student.user_id,
-                title="Marked Absent",
-                message=f"You were marked ABSENT on {session.session_date}.",
-                type="warning"
-            )
+        notification_dispatcher.wake()
 
     return jsonify({"success": True, "message": "Attendance finalized successfully"})
 
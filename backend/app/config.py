@@ -12,6 +12,143 @@ class BaseConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "change_me_jwt")
 
+    # Face engine: detector/model are loaded once per worker and warmed up
+    # at startup. Set FACE_ENGINE_WARMUP_BLOCKING=1 to hold create_app until
+    # the model is ready instead of warming up in a background thread.
+    FACE_DETECTOR_MODEL_PATH = os.environ.get(
+        "FACE_DETECTOR_MODEL_PATH",
+        os.path.join(basedir, "..", "models", "blaze_face_short_range.tflite"),
+    )
+    # The bundled short-range BlazeFace model expects faces within about 2 m.
+    # Group photos can use a full-range model instead (unset or missing file
+    # = the default detector), and are additionally detected in a
+    # GROUP_DETECT_TILES x GROUP_DETECT_TILES grid of overlapping tiles so
+    # back-row faces reach a size the detector finds (1 = whole frame only).
+    FACE_GROUP_DETECTOR_MODEL_PATH = os.environ.get("FACE_GROUP_DETECTOR_MODEL_PATH")
+    FACE_GROUP_DETECT_TILES = int(os.environ.get("FACE_GROUP_DETECT_TILES", "2"))
+    FACE_ENGINE_WARMUP = os.environ.get("FACE_ENGINE_WARMUP", "1") == "1"
+    FACE_ENGINE_WARMUP_BLOCKING = os.environ.get("FACE_ENGINE_WARMUP_BLOCKING", "0") == "1"
+
+    # Embedding backend: "deepface" (ArcFace), "onnx" (onnxruntime model at
+    # FACE_ONNX_MODEL_PATH) or "stub" (deterministic vectors, no model; for
+    # offline benchmarks and load tests, with optional simulated latency).
+    FACE_EMBEDDING_BACKEND = os.environ.get("FACE_EMBEDDING_BACKEND", "deepface")
+    FACE_ONNX_MODEL_PATH = os.environ.get("FACE_ONNX_MODEL_PATH")
+    FACE_STUB_DIM = int(os.environ.get("FACE_STUB_DIM", "512"))
+    FACE_STUB_LATENCY_MS = float(os.environ.get("FACE_STUB_LATENCY_MS", "0"))
+
+    # Label stored with every embedding next to the backend and model name;
+    # bump it when detection/alignment changes ("1" was the unaligned
+    # DeepFace pipeline, "2" the aligned face_pipeline). Stored vectors keep
+    # matching in the active version until a re-embed job has converted
+    # them, using REEMBED_WORKERS processes (0 = one per CPU core) and REEMBED_BATCH
+    # crops per model call. A job with no progress for STALL_SECONDS can be
+    # resumed.
+    FACE_EMBEDDING_VERSION = os.environ.get("FACE_EMBEDDING_VERSION", "2")
+    FACE_REEMBED_WORKERS = int(os.environ.get("FACE_REEMBED_WORKERS", "0"))
+    FACE_REEMBED_BATCH = int(os.environ.get("FACE_REEMBED_BATCH", "16"))
+    FACE_REEMBED_STALL_SECONDS = float(os.environ.get("FACE_REEMBED_STALL_SECONDS", "300"))
+
+    # Inference pool: number of dedicated embedding processes per web worker
+    # (0 = run inline), max queued/running requests before answering 503,
+    # and per-request timeout before answering 504.
+    FACE_POOL_WORKERS = int(os.environ.get("FACE_POOL_WORKERS", "0"))
+    FACE_POOL_MAX_PENDING = int(os.environ.get("FACE_POOL_MAX_PENDING", "8"))
+    FACE_POOL_TIMEOUT_SECONDS = float(os.environ.get("FACE_POOL_TIMEOUT_SECONDS", "30"))
+
+    # Cosine distance accepted as a face match, for model versions without a
+    # calibrated threshold (see scripts/evaluate_matching.py --apply).
+    FACE_MATCH_THRESHOLD = float(os.environ.get("FACE_MATCH_THRESHOLD", "0.6"))
+
+    # Register-face refuses a face closer than this cosine distance to another
+    # enrolled student (allow_duplicate=true overrides); also the default of
+    # the admin near-duplicate report.
+    FACE_DUPLICATE_THRESHOLD = float(os.environ.get("FACE_DUPLICATE_THRESHOLD", "0.6"))
+
+    # Enrollment templates kept per student/teacher (oldest dropped first).
+    FACE_MAX_TEMPLATES = int(os.environ.get("FACE_MAX_TEMPLATES", "5"))
+
+    # Uploaded face photos are decoded/downscaled so the longest side is at
+    # most this many pixels before detection (0 = keep full resolution).
+    FACE_IMAGE_MAX_SIDE = int(os.environ.get("FACE_IMAGE_MAX_SIDE", "1280"))
+    # Group-mode face attendance keeps more resolution for back-row faces.
+    FACE_GROUP_IMAGE_MAX_SIDE = int(os.environ.get("FACE_GROUP_IMAGE_MAX_SIDE", "2560"))
+
+    # Micro-batching of concurrent embedding requests: up to MAX_SIZE images
+    # collected for at most MAX_WAIT_MS run as one model call (1 = disabled).
+    FACE_BATCH_MAX_SIZE = int(os.environ.get("FACE_BATCH_MAX_SIZE", "8"))
+    FACE_BATCH_MAX_WAIT_MS = float(os.environ.get("FACE_BATCH_MAX_WAIT_MS", "10"))
+
+    # Processes used by bulk ZIP face enrollment (0 = one per CPU core).
+    FACE_BULK_ENROLL_WORKERS = int(os.environ.get("FACE_BULK_ENROLL_WORKERS", "0"))
+
+    # Memory-mapped embedding rosters shared by all worker processes, and how
+    # often each worker checks the database generation for changes.
+    FACE_ROSTER_DIR = os.environ.get(
+        "FACE_ROSTER_DIR", os.path.join(basedir, "..", "data", "roster")
+    )
+    FACE_ROSTER_CHECK_SECONDS = float(os.environ.get("FACE_ROSTER_CHECK_SECONDS", "2"))
+
+    # Per-worker LRU of face-attendance results keyed by frame hash, so a
+    # re-uploaded frame skips detection and embedding (0 = disabled).
+    # MAX_DISTANCE is the dHash bit difference (of 256) still treated as
+    # the same frame; such near-duplicates only reuse "no face" results.
+    FACE_FRAME_CACHE_SIZE = int(os.environ.get("FACE_FRAME_CACHE_SIZE", "256"))
+    FACE_FRAME_CACHE_TTL_SECONDS = float(os.environ.get("FACE_FRAME_CACHE_TTL_SECONDS", "120"))
+    FACE_FRAME_CACHE_MAX_DISTANCE = int(os.environ.get("FACE_FRAME_CACHE_MAX_DISTANCE", "8"))
+
+    # Per-session face-attendance state (marked students, names) is dropped
+    # after IDLE_SECONDS without frames; marks are written as they are made.
+    # The marked set is re-read every REFRESH_SECONDS to see other workers'
+    # marks and manual edits.
+    FACE_SESSION_IDLE_SECONDS = float(os.environ.get("FACE_SESSION_IDLE_SECONDS", "3600"))
+    FACE_SESSION_REFRESH_SECONDS = float(os.environ.get("FACE_SESSION_REFRESH_SECONDS", "5"))
+
+    # Quality gate run on a detected face before it is embedded (0 = off).
+    FACE_QUALITY_GATE = os.environ.get("FACE_QUALITY_GATE", "1") == "1"
+    FACE_QUALITY_MIN_CONFIDENCE = float(os.environ.get("FACE_QUALITY_MIN_CONFIDENCE", "0.6"))
+    FACE_QUALITY_MIN_FACE_PX = int(os.environ.get("FACE_QUALITY_MIN_FACE_PX", "60"))
+    # Faces in a group photo are much smaller than a selfie's.
+    FACE_QUALITY_GROUP_MIN_FACE_PX = int(os.environ.get("FACE_QUALITY_GROUP_MIN_FACE_PX", "24"))
+    FACE_QUALITY_MIN_SHARPNESS = float(os.environ.get("FACE_QUALITY_MIN_SHARPNESS", "30"))
+    FACE_QUALITY_MIN_BRIGHTNESS = float(os.environ.get("FACE_QUALITY_MIN_BRIGHTNESS", "40"))
+    FACE_QUALITY_MAX_BRIGHTNESS = float(os.environ.get("FACE_QUALITY_MAX_BRIGHTNESS", "220"))
+
+    # School-wide face index used by kiosk identification.
+    FACE_INDEX_PATH = os.environ.get(
+        "FACE_INDEX_PATH", os.path.join(basedir, "..", "data", "face_index.npz")
+    )
+    FACE_INDEX_NPROBE = int(os.environ.get("FACE_INDEX_NPROBE", "8"))
+    # First-pass vector storage: "int8" or "float16"; exact float32 vectors
+    # are memory-mapped from disk and only used to re-rank top candidates.
+    FACE_INDEX_QUANTIZATION = os.environ.get("FACE_INDEX_QUANTIZATION", "int8")
+    FACE_INDEX_SAVE_INTERVAL_SECONDS = float(
+        os.environ.get("FACE_INDEX_SAVE_INTERVAL_SECONDS", "30")
+    )
+
+    # Notifications queued in the outbox are delivered by a background
+    # dispatcher thread per serving process, started by its first request
+    # (NOTIFICATION_DISPATCHER=0 disables it), in batches, when woken after
+    # a commit and every INTERVAL_SECONDS.
+    NOTIFICATION_DISPATCHER = os.environ.get("NOTIFICATION_DISPATCHER", "1") == "1"
+    NOTIFICATION_DISPATCH_BATCH = int(os.environ.get("NOTIFICATION_DISPATCH_BATCH", "500"))
+    NOTIFICATION_DISPATCH_INTERVAL_SECONDS = float(
+        os.environ.get("NOTIFICATION_DISPATCH_INTERVAL_SECONDS", "1")
+    )
+    # Attendance edits to the same session within this window reach each
+    # student as one notification, with the latest status.
+    NOTIFICATION_COALESCE_SECONDS = float(os.environ.get("NOTIFICATION_COALESCE_SECONDS", "30"))
+
+    # Per-process cache of (class, subject, date) -> attendance session id
+    # used by get_or_create_session (0 disables it).
+    ATTENDANCE_SESSION_CACHE_SIZE = int(os.environ.get("ATTENDANCE_SESSION_CACHE_SIZE", "1024"))
+    ATTENDANCE_SESSION_CACHE_TTL_SECONDS = float(
+        os.environ.get("ATTENDANCE_SESSION_CACHE_TTL_SECONDS", "300")
+    )
+
+    # Offline sync: session items accepted per POST /api/teacher/sync batch.
+    ATTENDANCE_SYNC_MAX_ITEMS = int(os.environ.get("ATTENDANCE_SYNC_MAX_ITEMS", "200"))
+
 
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
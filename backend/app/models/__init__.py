@@ -10,4 +10,12 @@ from .teacher_subject_assignments import TeacherSubjectAssignment
 from .notification import Notification
 from .teacher_attendance import TeacherAttendance
 from .academic_assignment import AcademicAssignment
-from .assignment_submission import AssignmentSubmission
\ No newline at end of file
+from .assignment_submission import AssignmentSubmission
+from .face_enrollment_job import FaceEnrollmentJob
+from .face_template import FaceTemplate
+from .face_roster_generation import FaceRosterGeneration
+from .face_embedding_model import FaceEmbeddingModel
+from .face_reembed_job import FaceReembedJob
+from .face_staged_embedding import FaceStagedEmbedding
+from .notification_outbox import NotificationOutbox
+from .attendance_sync_receipt import AttendanceSyncReceipt
@@ -1,11 +1,17 @@
 """
-AttendanceRecord stores one student's status for one AttendanceSession.
+AttendanceRecord stores one student's status for one AttendanceSession
+(at most one record per student and session).
 """
 from ..extensions import db
 
 
 class AttendanceRecord(db.Model):
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "session_id", "student_id", name="uq_attendance_record_session_student"
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey("attendance_sessions.id", ondelete="CASCADE"))
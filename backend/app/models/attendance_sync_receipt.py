@@ -0,0 +1,38 @@
+"""
+AttendanceSyncReceipt records a session item applied by the offline sync
+endpoint under the device's idempotency key, so a batch replayed after a
+timeout returns the original result instead of writing twice.
+"""
+from datetime import datetime
+from ..extensions import db
+
+
+class AttendanceSyncReceipt(db.Model):
+    __tablename__ = "attendance_sync_receipts"
+
+    __table_args__ = (
+        db.UniqueConstraint("teacher_id", "idempotency_key", name="uq_sync_receipt_teacher_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    session_id = db.Column(
+        db.Integer, db.ForeignKey("attendance_sessions.id", ondelete="CASCADE"), nullable=False
+    )
+    # "created" or "updated", as first reported to the device
+    result = db.Column(db.String(20), nullable=False)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        return {
+            "key": self.idempotency_key,
+            "session_id": self.session_id,
+            "result": self.result,
+            "changed": self.changed,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f"<AttendanceSyncReceipt {self.idempotency_key} session={self.session_id}>"
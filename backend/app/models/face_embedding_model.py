@@ -0,0 +1,32 @@
+"""
+FaceEmbeddingModel records embedding model versions; the active one is the
+version every stored embedding is matched in and every worker serves with.
+Each version can carry its own calibrated match threshold
+(see scripts/evaluate_matching.py).
+"""
+from datetime import datetime
+from ..extensions import db
+
+
+class FaceEmbeddingModel(db.Model):
+    __tablename__ = "face_embedding_models"
+
+    # "<backend>:<model>:<FACE_EMBEDDING_VERSION>", e.g. "deepface:ArcFace:1"
+    version = db.Column(db.String(100), primary_key=True)
+    active = db.Column(db.Boolean, nullable=False, default=False)
+    activated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # cosine distance accepted as a match; None = FACE_MATCH_THRESHOLD
+    match_threshold = db.Column(db.Float, nullable=True)
+    calibrated_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "active": self.active,
+            "activated_at": self.activated_at.isoformat() if self.activated_at else None,
+            "match_threshold": self.match_threshold,
+            "calibrated_at": self.calibrated_at.isoformat() if self.calibrated_at else None,
+        }
+
+    def __repr__(self):
+        return f"<FaceEmbeddingModel {self.version} active={self.active}>"
@@ -0,0 +1,52 @@
+"""
+FaceEnrollmentJob tracks a bulk face enrollment upload so clients can poll
+its progress from any worker process.
+"""
+import json
+from datetime import datetime
+from sqlalchemy.dialects import mysql
+from ..extensions import db
+
+
+class FaceEnrollmentJob(db.Model):
+    __tablename__ = "face_enrollment_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(
+        db.Enum("QUEUED", "RUNNING", "COMPLETED", "FAILED"), nullable=False, default="QUEUED"
+    )
+    match_by = db.Column(db.String(20), nullable=False, default="roll_no")
+
+    total_files = db.Column(db.Integer, nullable=False, default=0)
+    processed_files = db.Column(db.Integer, nullable=False, default=0)
+    registered_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # JSON list of per-file results, written when the job finishes (about
+    # 75 bytes per file, so LONGTEXT on MySQL where TEXT stops at 64 KB)
+    report = db.Column(db.Text().with_variant(mysql.LONGTEXT(), "mysql"), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self, include_report: bool = True):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "match_by": self.match_by,
+            "total_files": self.total_files,
+            "processed_files": self.processed_files,
+            "registered_count": self.registered_count,
+            "failed_count": self.failed_count,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+        if include_report:
+            data["report"] = json.loads(self.report) if self.report else []
+        return data
+
+    def __repr__(self):
+        return f"<FaceEnrollmentJob {self.id} {self.status}>"
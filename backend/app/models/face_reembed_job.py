@@ -0,0 +1,49 @@
+"""
+FaceReembedJob tracks a background re-embedding of every stored face into a
+new model version. Finished items are staged in face_staged_embeddings, so
+an interrupted job resumes where it stopped.
+"""
+from datetime import datetime
+from ..extensions import db
+
+
+class FaceReembedJob(db.Model):
+    __tablename__ = "face_reembed_jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(
+        db.Enum("QUEUED", "RUNNING", "COMPLETED", "FAILED", "NEEDS_ATTENTION"),
+        nullable=False,
+        default="QUEUED",
+    )
+    source_version = db.Column(db.String(100), nullable=False)
+    target_version = db.Column(db.String(100), nullable=False)
+
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    processed_items = db.Column(db.Integer, nullable=False, default=0)
+    failed_items = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255), nullable=True)
+
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # heartbeat: refreshed at every checkpoint while the job runs
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "source_version": self.source_version,
+            "target_version": self.target_version,
+            "total_items": self.total_items,
+            "processed_items": self.processed_items,
+            "failed_items": self.failed_items,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<FaceReembedJob {self.id} {self.status}>"
@@ -0,0 +1,30 @@
+"""
+FaceRosterGeneration is a per-roster change counter shared by all worker
+processes. Writers bump it after changing enrolled embeddings; workers
+compare its token with the memory-mapped roster they hold and remap when
+it differs.
+"""
+from datetime import datetime
+from ..extensions import db
+
+
+class FaceRosterGeneration(db.Model):
+    __tablename__ = "face_roster_generations"
+
+    # roster name: "students" or "teachers"
+    name = db.Column(db.String(20), primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+    # random per bump, so roster files never collide across database resets
+    token = db.Column(db.String(32), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "generation": self.generation,
+            "token": self.token,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    def __repr__(self):
+        return f"<FaceRosterGeneration {self.name} gen={self.generation}>"
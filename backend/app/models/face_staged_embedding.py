@@ -0,0 +1,31 @@
+"""
+FaceStagedEmbedding holds one re-embedded vector of a FaceReembedJob until
+the job completes and swaps all staged vectors in at once.
+"""
+from ..extensions import db
+from ..utils.embedding_codec import load_embedding
+
+
+class FaceStagedEmbedding(db.Model):
+    __tablename__ = "face_staged_embeddings"
+    __table_args__ = (db.UniqueConstraint("job_id", "item_key", name="uq_staged_job_item"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(
+        db.String(36),
+        db.ForeignKey("face_reembed_jobs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # "template:<id>", or "student:<id>" / "teacher:<id>" for people enrolled
+    # before templates existed
+    item_key = db.Column(db.String(40), nullable=False)
+    # None when the item failed (see error)
+    embedding = db.Column(db.LargeBinary, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    def get_embedding(self):
+        return load_embedding(self.embedding, None)
+
+    def __repr__(self):
+        return f"<FaceStagedEmbedding job={self.job_id} {self.item_key}>"
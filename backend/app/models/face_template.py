@@ -0,0 +1,58 @@
+"""
+FaceTemplate stores one enrollment embedding of a student or teacher.
+
+A person can have several templates captured under different lighting and
+angles. The owner's face_embedding_bin column holds their normalised
+centroid; matching uses the centroid plus every template (max similarity).
+"""
+from datetime import datetime
+from ..extensions import db
+from ..utils.embedding_codec import encode_embedding, load_embedding
+
+
+class FaceTemplate(db.Model):
+    __tablename__ = "face_templates"
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(
+        db.Integer, db.ForeignKey("students.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    teacher_id = db.Column(
+        db.Integer, db.ForeignKey("teachers.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+    embedding = db.Column(db.LargeBinary, nullable=False)
+    # model version that produced the embedding (None = legacy ArcFace)
+    embedding_model = db.Column(db.String(100), nullable=True)
+    # aligned face crop the embedding was computed from, for re-embedding
+    image_path = db.Column(db.String(255), nullable=True)
+    # where the template came from: REGISTER, BULK, LEGACY
+    source = db.Column(db.String(20), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    student = db.relationship(
+        "Student",
+        backref=db.backref("face_templates", cascade="all, delete-orphan", passive_deletes=True),
+    )
+    teacher = db.relationship(
+        "Teacher",
+        backref=db.backref("face_templates", cascade="all, delete-orphan", passive_deletes=True),
+    )
+
+    def get_embedding(self):
+        return load_embedding(self.embedding, None)
+
+    def set_embedding(self, embedding) -> None:
+        self.embedding = encode_embedding(embedding)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "student_id": self.student_id,
+            "teacher_id": self.teacher_id,
+            "source": self.source,
+            "embedding_model": self.embedding_model,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f"<FaceTemplate {self.id} student={self.student_id} teacher={self.teacher_id}>"
@@ -0,0 +1,48 @@
+"""
+NotificationOutbox holds notifications written inside the transaction that
+caused them (e.g. saving attendance). The notification dispatcher moves
+them into the notifications table in the background, so a request does
+not pay for fan-out to a whole class.
+
+Rows queued with a coalesce_key (e.g. one attendance session) wait until
+deliver_after; a newer row for the same user and key replaces a pending
+one, so repeated edits reach the student as a single notification.
+coalesce_from is the state before the first of those edits; an edit that
+restores it drops the pending row.
+"""
+from datetime import datetime
+from ..extensions import db
+
+
+class NotificationOutbox(db.Model):
+    __tablename__ = "notification_outbox"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(50), default="info")
+    coalesce_key = db.Column(db.String(100), nullable=True)
+    coalesce_from = db.Column(db.String(50), nullable=True)
+    deliver_after = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_notification_outbox_coalesce", "coalesce_key", "user_id"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "title": self.title,
+            "message": self.message,
+            "type": self.type,
+            "coalesce_key": self.coalesce_key,
+            "coalesce_from": self.coalesce_from,
+            "deliver_after": self.deliver_after.isoformat() if self.deliver_after else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f"<NotificationOutbox {self.id} user={self.user_id}>"
@@ -4,6 +4,7 @@ Now supports face recognition encoding storage.
 """
 from datetime import datetime
 from ..extensions import db
+from ..utils.embedding_codec import encode_embedding, load_embedding
 
 
 class Student(db.Model):
@@ -32,7 +33,11 @@ class Student(db.Model):
     face_image_path = db.Column(db.String(255), nullable=True)
     face_registered_at = db.Column(db.DateTime, nullable=True)
 
+    # Legacy JSON text; superseded by face_embedding_bin (float32 bytes).
     face_embedding = db.Column(db.Text, nullable=True)
+    face_embedding_bin = db.Column(db.LargeBinary, nullable=True)
+    # model version that produced face_embedding_bin (None = legacy ArcFace)
+    face_embedding_model = db.Column(db.String(100), nullable=True)
 
     user = db.relationship(
         "User",
@@ -44,6 +49,19 @@ class Student(db.Model):
         backref=db.backref("students", lazy="dynamic")
     )
 
+    @property
+    def has_face_embedding(self) -> bool:
+        return bool(self.face_embedding_bin or self.face_embedding)
+
+    def get_face_embedding(self):
+        """Return the stored embedding as a float32 numpy array, or None."""
+        return load_embedding(self.face_embedding_bin, self.face_embedding)
+
+    def set_face_embedding(self, embedding) -> None:
+        """Store embedding in the binary column and clear the legacy JSON copy."""
+        self.face_embedding_bin = encode_embedding(embedding)
+        self.face_embedding = None
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -2,6 +2,7 @@
 Teacher model links to a User entry. A teacher can be assigned to multiple classes.
 """
 from ..extensions import db
+from ..utils.embedding_codec import encode_embedding, load_embedding
 
 
 class Teacher(db.Model):
@@ -10,10 +11,27 @@ class Teacher(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     employee_id = db.Column(db.String(50))
+    # Legacy JSON text; superseded by face_embedding_bin (float32 bytes).
     face_embedding = db.Column(db.Text, nullable=True)
+    face_embedding_bin = db.Column(db.LargeBinary, nullable=True)
+    # model version that produced face_embedding_bin (None = legacy ArcFace)
+    face_embedding_model = db.Column(db.String(100), nullable=True)
 
     user = db.relationship("User", backref=db.backref("teacher_profile", uselist=False))
 
+    @property
+    def has_face_embedding(self) -> bool:
+        return bool(self.face_embedding_bin or self.face_embedding)
+
+    def get_face_embedding(self):
+        """Return the stored embedding as a float32 numpy array, or None."""
+        return load_embedding(self.face_embedding_bin, self.face_embedding)
+
+    def set_face_embedding(self, embedding) -> None:
+        """Store embedding in the binary column and clear the legacy JSON copy."""
+        self.face_embedding_bin = encode_embedding(embedding)
+        self.face_embedding = None
+
     def to_dict(self):
         return {"id": self.id, "user": self.user.to_dict() if self.user else None, "employee_id": self.employee_id}
 
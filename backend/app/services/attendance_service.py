@@ -1,5 +1,6 @@
-from typing import List, Dict, Any, Optional
-from sqlalchemy import asc, func, case
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import asc, func, case, delete, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from ..extensions import db
 from ..models.teacher import Teacher
 from ..models.teacher_classes import TeacherClass
@@ -8,6 +9,8 @@ from ..models.student import Student
 from ..models.attendance_session import AttendanceSession
 from ..models.attendance_record import AttendanceRecord
 from ..utils.errors import APIError
+from ..utils.notification_helper import queue_notifications
+from .attendance_sessions import get_or_create_session
 from datetime import date, timedelta 
 
 def is_teacher_assigned(teacher_id: int, class_id: int) -> bool:
@@ -124,27 +127,23 @@ def get_students_by_class(class_id: int) -> List[Dict[str, Any]]:
         })
     return out
 
-def create_session(class_id: int, teacher_id: int, session_date: str) -> AttendanceSession:
+def create_session(class_id: int, teacher_id: int, session_date: str,
+                   subject_id: int) -> AttendanceSession:
     """
     Create a session after verifying teacher is assigned to the class.
-    Raises APIError(403) if not assigned.
+    Raises APIError(403) if not assigned, APIError(409) if the class
+    already has a session for this subject and date.
     """
     if not is_teacher_assigned(teacher_id, class_id):
         raise APIError("Forbidden: teacher not assigned to this class", status_code=403)
 
-    # correct logic
-    existing = AttendanceSession.query.filter_by(
-        class_id=class_id,
-        session_date=session_date
-    ).first()
-
-    if existing:
-        # If you prefer to allow multiple sessions per day, remove this check.
+    if isinstance(session_date, str):
+        session_date = date.fromisoformat(session_date)
+    session, created = get_or_create_session(
+        class_id, subject_id, session_date, teacher_id, commit=False
+    )
+    if not created:
         raise APIError("Session for this class and date already exists", status_code=409)
-
-    session = AttendanceSession(class_id=class_id, teacher_id=teacher_id, session_date=session_date)
-    db.session.add(session)
-    db.session.flush()  # get id without commit
     return session
 
 def list_sessions_for_teacher(teacher_id: int, class_id: Optional[int] = None,
@@ -210,33 +209,168 @@ def get_session_with_records(session_id: int) -> Optional[Dict[str, Any]]:
         "records": recs_out
     }
 
-def save_records(session_id: int, records: list):
+RECORD_STATUSES = ("PRESENT", "ABSENT")
+
+
+def upsert_records(rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert records in one statement; a row that already exists for the
+    (session, student) - e.g. written meanwhile by face attendance - gets
+    the new status and remarks (ON DUPLICATE KEY UPDATE / ON CONFLICT).
+    """
+    table = AttendanceRecord.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            status=stmt.inserted.status, remarks=stmt.inserted.remarks
+        )
+    elif dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id", "student_id"],
+            set_={"status": stmt.excluded.status, "remarks": stmt.excluded.remarks},
+        )
+    else:
+        stmt = table.insert()
+    db.session.execute(stmt, rows)
+
+
+def save_records(session_id: int, records: list, commit: bool = True) -> List[Dict[str, Any]]:
+    """
+    Make the session's records match `records` ([{student_id, status,
+    remarks}], one per student; the last entry wins). Only differences are
+    written: changed rows with one batched UPDATE, new ones with one upsert,
+    and records of students left out are deleted.
+
+    Returns the changes as [{student_id, status, remarks, previous_status}],
+    with previous_status None for new records and status None for deleted
+    ones. With commit=False the caller commits, e.g. after queueing
+    notifications for the changes in the same transaction.
+
+    The session's face-capture state in this process is dropped, so a
+    student set to ABSENT here is recognised (and marked) again.
+    """
+    # imported here: face_session_state writes its marks through this module
+    from . import face_session_state
+
     session = AttendanceSession.query.get(session_id)
     if not session:
         raise APIError("Attendance session not found", status_code=404)
 
-    try:
-        # SAFEST WAY: use session-level delete
-        db.session.query(AttendanceRecord)\
-            .filter(AttendanceRecord.session_id == session_id)\
-            .delete(synchronize_session=False)
-
-        db.session.add_all([
-            AttendanceRecord(
-                session_id=session_id,
-                student_id=r["student_id"],
-                status=r["status"],
-                remarks=r.get("remarks")
+    wanted: Dict[int, Tuple[str, Optional[str]]] = {}
+    for r in records:
+        if not isinstance(r, dict) or r.get("status") not in RECORD_STATUSES:
+            raise APIError("Each record needs a student_id and a status", status_code=400)
+        try:
+            wanted[int(r["student_id"])] = (r["status"], r.get("remarks"))
+        except (KeyError, TypeError, ValueError):
+            raise APIError("Each record needs a student_id and a status", status_code=400)
+
+    current = {
+        student_id: (record_id, status, remarks)
+        for record_id, student_id, status, remarks in db.session.query(
+            AttendanceRecord.id,
+            AttendanceRecord.student_id,
+            AttendanceRecord.status,
+            AttendanceRecord.remarks,
+        ).filter(AttendanceRecord.session_id == session_id)
+    }
+
+    changes, inserts, updates = [], [], []
+    for student_id, (status, remarks) in wanted.items():
+        existing = current.get(student_id)
+        if existing is None:
+            inserts.append(
+                {
+                    "session_id": session_id,
+                    "student_id": student_id,
+                    "status": status,
+                    "remarks": remarks,
+                }
             )
-            for r in records
-        ])
+        elif existing[1:] != (status, remarks):
+            updates.append({"id": existing[0], "status": status, "remarks": remarks})
+        else:
+            continue
+        changes.append(
+            {
+                "student_id": student_id,
+                "status": status,
+                "remarks": remarks,
+                "previous_status": existing[1] if existing else None,
+            }
+        )
+    removed = [
+        (student_id, record_id, status)
+        for student_id, (record_id, status, _) in current.items()
+        if student_id not in wanted
+    ]
+    changes.extend(
+        {"student_id": student_id, "status": None, "remarks": None, "previous_status": status}
+        for student_id, _, status in removed
+    )
 
-        db.session.commit()
+    if not changes:
+        return changes
 
-    except Exception as e:
+    try:
+        if updates:
+            # executemany UPDATE ... WHERE id = ? (ORM bulk update by primary key)
+            db.session.execute(update(AttendanceRecord), updates)
+        if inserts:
+            upsert_records(inserts)
+        if removed:
+            db.session.execute(
+                delete(AttendanceRecord).where(
+                    AttendanceRecord.id.in_([record_id for _, record_id, _ in removed])
+                )
+            )
+        if commit:
+            db.session.commit()
+
+    except Exception:
         db.session.rollback()
         raise
-     
+
+    face_session_state.invalidate(session_id)
+    return changes
+
+
+def queue_change_notifications(session: AttendanceSession, changes: List[Dict[str, Any]]) -> int:
+    """
+    Queue "Attendance Updated" notifications (in the caller's transaction)
+    for students whose status changed in `changes` from save_records;
+    remarks-only edits and deletions are skipped. Re-saves of the session
+    within NOTIFICATION_COALESCE_SECONDS coalesce into one per student, and
+    into none for a student whose status ends where it started.
+    """
+    changed = {
+        c["student_id"]: (c["previous_status"], c["status"])
+        for c in changes
+        if c["status"] and c["status"] != c["previous_status"]
+    }
+    if not changed:
+        return 0
+    users = db.session.query(Student.id, Student.user_id).filter(Student.id.in_(changed)).all()
+    return queue_notifications(
+        [
+            {
+                "user_id": user_id,
+                "title": "Attendance Updated",
+                "message": (
+                    f"Your attendance has been marked as {changed[student_id][1]} "
+                    f"for {session.session_date}."
+                ),
+                "type": "info" if changed[student_id][1] == "PRESENT" else "warning",
+                "coalesce_from": changed[student_id][0],
+                "coalesce_to": changed[student_id][1],
+            }
+            for student_id, user_id in users
+        ],
+        coalesce_key=f"attendance:{session.id}",
+    )
+
 
 def get_student_attendance(student_id: int, 
                           date_from: Optional[str] = None,
@@ -0,0 +1,161 @@
+"""
+Race-free get-or-create of the attendance session for a (class, subject,
+date), the key of uq_attendance_class_subject_date.
+
+Face-capture requests for one class arrive concurrently, and a SELECT
+followed by INSERT + commit either raises IntegrityError for the loser or
+costs an extra round trip. Instead the row is inserted with the dialect's
+conflict clause, so a concurrent or existing session is not an error:
+
+- MySQL/MariaDB      INSERT ... ON DUPLICATE KEY UPDATE id = id
+- PostgreSQL/SQLite  INSERT ... ON CONFLICT DO NOTHING RETURNING id
+
+followed by one lookup of the session by its unique key. The lookup is a
+locking read, so under REPEATABLE READ it sees a session another request
+committed after this transaction's snapshot was taken.
+
+Resolved ids are kept in a per-process LRU (ATTENDANCE_SESSION_CACHE_SIZE
+entries, ATTENDANCE_SESSION_CACHE_TTL_SECONDS expiry): a class captured
+frame after frame skips the insert and finds its session by primary key.
+A cached session that no longer matches its key (deleted) is dropped and
+resolved again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from ..extensions import db
+from ..models.attendance_session import AttendanceSession
+
+_lock = threading.Lock()
+# (class_id, subject_id, session_date) -> (session_id, expires_at)
+_entries: "OrderedDict[Tuple[int, int, date], Tuple[int, float]]" = OrderedDict()
+
+_config = {"size": 1024, "ttl": 300.0}
+
+_metrics = {"hits": 0, "misses": 0, "created": 0}
+
+
+def init_app(app) -> None:
+    _config["size"] = app.config.get("ATTENDANCE_SESSION_CACHE_SIZE", 1024)
+    _config["ttl"] = app.config.get("ATTENDANCE_SESSION_CACHE_TTL_SECONDS", 300.0)
+    clear()
+
+
+def _cached(key: Tuple[int, int, date]):
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[1] <= now:
+            _metrics["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _metrics["hits"] += 1
+        return entry[0]
+
+
+def _remember(key: Tuple[int, int, date], session_id: int) -> None:
+    if _config["size"] <= 0:
+        return
+    with _lock:
+        _entries[key] = (session_id, time.monotonic() + _config["ttl"])
+        _entries.move_to_end(key)
+        while len(_entries) > _config["size"]:
+            _entries.popitem(last=False)
+
+
+def _forget(key: Tuple[int, int, date]) -> None:
+    with _lock:
+        _entries.pop(key, None)
+
+
+def _insert_if_missing(row: Dict[str, Any]) -> Optional[int]:
+    """Insert the session unless its key exists; the new id, or None if it existed."""
+    table = AttendanceSession.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).values(row)
+        stmt = stmt.on_duplicate_key_update(id=table.c.id)
+        # affected rows are 1 for an existing row too (CLIENT_FOUND_ROWS), so
+        # the caller compares the generated id with the session it looks up
+        return db.session.execute(stmt).lastrowid or None
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table).values(row)
+        stmt = stmt.on_conflict_do_nothing(
+            index_elements=["class_id", "subject_id", "session_date"]
+        ).returning(table.c.id)
+        return db.session.execute(stmt).scalar()
+    exists = db.session.query(
+        AttendanceSession.query.filter_by(
+            class_id=row["class_id"],
+            subject_id=row["subject_id"],
+            session_date=row["session_date"],
+        ).exists()
+    ).scalar()
+    if exists:
+        return None
+    return db.session.execute(table.insert().values(row)).inserted_primary_key[0]
+
+
+def get_or_create_session(
+    class_id: int, subject_id: int, session_date: date, teacher_id: int, commit: bool = True
+) -> Tuple[AttendanceSession, bool]:
+    """
+    Return (session, created) for the (class, subject, date); a new session
+    is owned by teacher_id. With commit=False the caller commits (a created
+    session is then not cached until it is resolved again).
+    """
+    key = (class_id, subject_id, session_date)
+    session_id = _cached(key)
+    if session_id is not None:
+        session = db.session.get(AttendanceSession, session_id)
+        if session is not None and (
+            session.class_id,
+            session.subject_id,
+            session.session_date,
+        ) == key:
+            return session, False
+        _forget(key)
+
+    inserted_id = _insert_if_missing(
+        {
+            "class_id": class_id,
+            "subject_id": subject_id,
+            "teacher_id": teacher_id,
+            "session_date": session_date,
+        }
+    )
+    session = (
+        AttendanceSession.query.filter_by(
+            class_id=class_id, subject_id=subject_id, session_date=session_date
+        )
+        .with_for_update(read=True)
+        .one()
+    )
+    created = inserted_id is not None and inserted_id == session.id
+    if commit:
+        db.session.commit()
+    if commit or not created:
+        _remember(key, session.id)
+    if created:
+        with _lock:
+            _metrics["created"] += 1
+    return session, created
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        snapshot = dict(_metrics)
+        snapshot["size"] = len(_entries)
+    total = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / total, 3) if total else None
+    snapshot["max_size"] = _config["size"]
+    snapshot["ttl_seconds"] = _config["ttl"]
+    return snapshot
@@ -0,0 +1,173 @@
+"""
+Offline batch sync of attendance from teacher devices.
+
+A device that marked attendance without a usable connection uploads a
+day's sessions in one request:
+
+    [{"key": "<client idempotency key>", "class_id": 1, "subject_id": 2,
+      "session_date": "2026-03-20",
+      "records": [{"student_id": 7, "status": "PRESENT", "remarks": null}]}]
+
+Each item creates its session if it does not exist yet and makes the
+session's records match `records` (save_records semantics). The whole batch
+is one transaction: sessions, records, notifications and receipts commit
+together or not at all, so a device that timed out can resend the same
+batch. Items whose key already has a receipt are not applied again and
+return the original result.
+
+Per-item results are compact: {"key", "status", "session_id", "changed"}
+with status one of
+
+- created    the session was created by this item
+- updated    the item was applied to an existing session
+- duplicate  the key was already applied (the original result is in "result")
+- invalid    the item is malformed ("error" says why); nothing written
+- forbidden  the teacher is not assigned to the class and subject, or the
+             session belongs to another teacher; nothing written
+
+invalid and forbidden items leave no receipt, so a corrected item can be
+resent under the same key.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models.attendance_session import AttendanceSession
+from ..models.attendance_sync_receipt import AttendanceSyncReceipt
+from ..models.teacher_subject_assignments import TeacherSubjectAssignment
+from ..utils.errors import APIError
+from . import notification_dispatcher
+from .attendance_sessions import get_or_create_session
+from .attendance_service import RECORD_STATUSES, queue_change_notifications, save_records
+
+MAX_KEY_LENGTH = 64
+
+
+def _parse(item) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Validated item, or None and the reason it is invalid."""
+    if not isinstance(item, dict):
+        return None, "item must be an object"
+    key = item.get("key")
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        return None, f"key must be a string of 1-{MAX_KEY_LENGTH} characters"
+    for field in ("class_id", "subject_id"):
+        if not isinstance(item.get(field), int):
+            return None, f"{field} must be an integer"
+    try:
+        session_date = datetime.strptime(item.get("session_date") or "", "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None, "session_date must be YYYY-MM-DD"
+    records = item.get("records")
+    if not isinstance(records, list):
+        return None, "records must be a list"
+    for r in records:
+        if (
+            not isinstance(r, dict)
+            or not isinstance(r.get("student_id"), int)
+            or r.get("status") not in RECORD_STATUSES
+        ):
+            return None, "each record needs an integer student_id and a status"
+    return {**item, "session_date": session_date}, None
+
+
+def sync_sessions(teacher_id: int, items: list) -> List[Dict[str, Any]]:
+    """Apply a batch of offline session items in one transaction; returns per-item results."""
+    results: List[Dict[str, Any]] = [None] * len(items)
+    parsed = {}
+    for i, item in enumerate(items):
+        value, error = _parse(item)
+        if error:
+            key = item.get("key") if isinstance(item, dict) else None
+            results[i] = {"key": key, "status": "invalid", "error": error}
+        else:
+            parsed[i] = value
+    if not parsed:
+        return results
+
+    receipts = {
+        r.idempotency_key: r
+        for r in AttendanceSyncReceipt.query.filter(
+            AttendanceSyncReceipt.teacher_id == teacher_id,
+            AttendanceSyncReceipt.idempotency_key.in_({p["key"] for p in parsed.values()}),
+        )
+    }
+    assigned = {
+        (class_id, subject_id)
+        for class_id, subject_id in db.session.query(
+            TeacherSubjectAssignment.class_id, TeacherSubjectAssignment.subject_id
+        ).filter(TeacherSubjectAssignment.teacher_id == teacher_id)
+    }
+    sessions = {
+        (s.class_id, s.subject_id, s.session_date): s
+        for s in AttendanceSession.query.filter(
+            AttendanceSession.class_id.in_({p["class_id"] for p in parsed.values()}),
+            AttendanceSession.session_date.in_({p["session_date"] for p in parsed.values()}),
+        )
+    }
+
+    applied = False
+    try:
+        for i, item in parsed.items():
+            key = item["key"]
+            receipt = receipts.get(key)
+            if receipt is not None:
+                results[i] = {
+                    "key": key,
+                    "status": "duplicate",
+                    "result": receipt.result,
+                    "session_id": receipt.session_id,
+                    "changed": receipt.changed,
+                }
+                continue
+
+            slot = (item["class_id"], item["subject_id"], item["session_date"])
+            session = sessions.get(slot)
+            if (item["class_id"], item["subject_id"]) not in assigned or (
+                session is not None and session.teacher_id != teacher_id
+            ):
+                results[i] = {"key": key, "status": "forbidden"}
+                continue
+
+            status = "updated"
+            if session is None:
+                session, created = get_or_create_session(*slot, teacher_id, commit=False)
+                if session.teacher_id != teacher_id:
+                    # created meanwhile by another teacher
+                    results[i] = {"key": key, "status": "forbidden"}
+                    continue
+                sessions[slot] = session
+                if created:
+                    status = "created"
+
+            changes = save_records(session.id, item["records"], commit=False)
+            queue_change_notifications(session, changes)
+            receipt = AttendanceSyncReceipt(
+                teacher_id=teacher_id,
+                idempotency_key=key,
+                session_id=session.id,
+                result=status,
+                changed=len(changes),
+            )
+            db.session.add(receipt)
+            # a repeated key later in the same batch is a duplicate of this one
+            receipts[key] = receipt
+            applied = True
+            results[i] = {
+                "key": key,
+                "status": status,
+                "session_id": session.id,
+                "changed": len(changes),
+            }
+
+        db.session.commit()
+    except IntegrityError:
+        # the same key written concurrently by another request
+        db.session.rollback()
+        raise APIError("Conflicting sync in progress, retry the batch", status_code=409)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if applied:
+        notification_dispatcher.wake()
+    return results
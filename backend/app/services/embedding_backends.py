@@ -0,0 +1,162 @@
+"""
+Embedding backends: the model that turns an aligned face crop into a vector.
+
+face_engine holds one backend per process, chosen by FACE_EMBEDDING_BACKEND:
+
+    deepface   ArcFace through DeepFace/TensorFlow (default)
+    onnx       an ArcFace-style ONNX model run by onnxruntime
+               (FACE_ONNX_MODEL_PATH; 112x112 RGB input)
+    stub       deterministic vectors derived from the crop's pixels, with an
+               optional simulated latency; no model or TensorFlow needed, so
+               matching, caching and database work can be benchmarked and
+               load-tested offline
+
+Every stored embedding is tagged with `version_string(backend, label)`, where
+the label is FACE_EMBEDDING_VERSION; bump it when detector or alignment
+settings change so old vectors are re-embedded (see reembed_service).
+
+Backends receive aligned crops (DeepFace's own detector is always skipped)
+and only import their runtime in `load()`, so selecting the stub never
+imports TensorFlow.
+"""
+import hashlib
+import time
+from typing import Any, Dict, List, Sequence, Type
+import cv2
+import numpy as np
+
+
+class EmbeddingBackend:
+    """Base class: subclasses implement `load` and `embed`."""
+
+    name = "base"
+    model_name = ""
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+
+    def load(self) -> None:
+        """Load the model; called once per process before the first embed."""
+
+    def embed(self, images: Sequence[np.ndarray]) -> List[np.ndarray]:
+        """Return one float32 vector per BGR face crop."""
+        raise NotImplementedError
+
+    def represent_batch(self, images: Sequence[np.ndarray]) -> List[Any]:
+        """
+        DeepFace.represent-style result list per image, or the exception
+        raised for it. If the batch fails, images are retried one at a time
+        so a single bad image does not fail the others.
+        """
+        try:
+            return [[{"embedding": vec}] for vec in self.embed(images)]
+        except Exception:
+            if len(images) == 1:
+                raise
+        outcomes: List[Any] = []
+        for image in images:
+            try:
+                outcomes.append([{"embedding": self.embed([image])[0]}])
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+
+class DeepFaceBackend(EmbeddingBackend):
+    name = "deepface"
+    model_name = "ArcFace"
+
+    def load(self) -> None:
+        from deepface import DeepFace
+
+        self._deepface = DeepFace
+        DeepFace.build_model(self.model_name)
+
+    def embed(self, images):
+        results = self._deepface.represent(
+            img_path=list(images) if len(images) > 1 else images[0],
+            model_name=self.model_name,
+            detector_backend="skip",
+            enforce_detection=False,
+        )
+        if len(images) == 1:
+            results = [results]
+        return [np.asarray(r[0]["embedding"], dtype=np.float32).reshape(-1) for r in results]
+
+
+class OnnxBackend(EmbeddingBackend):
+    name = "onnx"
+    model_name = "ArcFace (ONNX)"
+
+    INPUT_SIZE = 112
+
+    def load(self) -> None:
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("FACE_EMBEDDING_BACKEND=onnx requires the onnxruntime package")
+
+        path = self.options.get("onnx_model_path")
+        if not path:
+            raise RuntimeError("FACE_EMBEDDING_BACKEND=onnx requires FACE_ONNX_MODEL_PATH")
+        self._session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._channels_first = model_input.shape[1] == 3
+        # models exported with a fixed batch of 1 are run one crop at a time
+        self._batch_limit = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+
+    def _prepare(self, image) -> np.ndarray:
+        size = self.INPUT_SIZE
+        rgb = cv2.cvtColor(cv2.resize(image, (size, size)), cv2.COLOR_BGR2RGB)
+        blob = (rgb.astype(np.float32) - 127.5) / 127.5
+        return blob.transpose(2, 0, 1) if self._channels_first else blob
+
+    def embed(self, images):
+        batch = np.stack([self._prepare(image) for image in images])
+        step = self._batch_limit or len(batch)
+        outputs = [
+            self._session.run(None, {self._input_name: batch[i : i + step]})[0]
+            for i in range(0, len(batch), step)
+        ]
+        return [row.astype(np.float32).reshape(-1) for row in np.concatenate(outputs)]
+
+
+class StubBackend(EmbeddingBackend):
+    name = "stub"
+    model_name = "stub"
+
+    def embed(self, images):
+        latency = self.options.get("stub_latency_ms", 0.0)
+        if latency:
+            time.sleep(latency / 1000.0)
+        dim = self.options.get("stub_dim", 512)
+        vectors = []
+        for image in images:
+            seed = hashlib.sha256(np.ascontiguousarray(image).tobytes()).digest()
+            rng = np.random.default_rng(int.from_bytes(seed[:8], "big"))
+            vec = rng.standard_normal(dim).astype(np.float32)
+            vectors.append(vec / np.linalg.norm(vec))
+        return vectors
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    DeepFaceBackend.name: DeepFaceBackend,
+    OnnxBackend.name: OnnxBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def version_string(name: str, label: str) -> str:
+    """Tag stored with every embedding: "<backend>:<model>:<label>"."""
+    return f"{name}:{BACKENDS[name].model_name}:{label}"
+
+
+def create(name: str, options: Dict[str, Any]) -> EmbeddingBackend:
+    """Instantiate the backend registered under name."""
+    try:
+        return BACKENDS[name](options)
+    except KeyError:
+        raise ValueError(
+            f"Unknown FACE_EMBEDDING_BACKEND {name!r}; expected one of: {', '.join(BACKENDS)}"
+        )
@@ -0,0 +1,198 @@
+"""
+Which embedding model version is stored, served and matched.
+
+Every stored vector carries a version tag ("<backend>:<model>:<label>",
+None meaning the legacy DeepFace ArcFace model). The active version lives
+in the face_embedding_models table. It changes only when a re-embed job
+completes (see reembed_service). Changing FACE_EMBEDDING_BACKEND or
+FACE_EMBEDDING_VERSION on its own therefore does not make stored vectors
+silently incompatible: workers keep serving the active version until the
+job has re-embedded everything.
+
+Each version may carry a calibrated match threshold (set by
+scripts/evaluate_matching.py); `match_threshold` falls back to
+FACE_MATCH_THRESHOLD for versions never calibrated.
+
+When the configured version differs from the pinned active one (e.g. after
+upgrading to the aligned pipeline, FACE_EMBEDDING_VERSION=2, over vectors
+stored as :1), each worker prints a warning once and `status()` reports
+reembed_needed until scripts/reembed_faces.py (or the admin re-embed
+endpoint) has run.
+
+Workers check the active version at most every FACE_ROSTER_CHECK_SECONDS.
+`ensure_engine` switches the face engine (and the inference pool) to it
+before embedding. Rosters are built from vectors of the active version
+only, and record it so a worker still on the previous model never
+compares across versions.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from flask import current_app, has_app_context
+from sqlalchemy import func
+from ..extensions import db
+from ..models.face_embedding_model import FaceEmbeddingModel
+from ..models.face_template import FaceTemplate
+from ..models.student import Student
+from ..models.teacher import Teacher
+from . import embedding_backends, face_engine, inference_pool
+
+# every embedding stored before versioning came from DeepFace ArcFace
+LEGACY_MODEL_VERSION = "deepface:ArcFace:1"
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    "active": None,
+    "pinned": False,
+    "thresholds": {},
+    "checked": 0.0,
+    "warned": False,
+}
+
+
+def tag(version: Optional[str]) -> str:
+    """Version of a stored vector from its (possibly empty) tag column."""
+    return version or LEGACY_MODEL_VERSION
+
+
+def configured_version() -> str:
+    """Version the app config asks for (the target of the next re-embed job)."""
+    name, options = face_engine.backend_settings(current_app.config)
+    return embedding_backends.version_string(name, options["version"])
+
+
+def _load_active() -> Tuple[str, bool, Dict[str, float]]:
+    rows = db.session.query(
+        FaceEmbeddingModel.version, FaceEmbeddingModel.active, FaceEmbeddingModel.match_threshold
+    ).all()
+    thresholds = {version: threshold for version, _, threshold in rows if threshold is not None}
+    version = next((version for version, active, _ in rows if active), None)
+    # nothing enrolled yet: serve what is configured until the first enrollment
+    if version is None:
+        return configured_version(), False, thresholds
+    return version, True, thresholds
+
+
+def active_version(refresh: bool = False) -> str:
+    """The version stored vectors are matched in (cached per check interval)."""
+    now = time.monotonic()
+    interval = current_app.config.get("FACE_ROSTER_CHECK_SECONDS", 2.0)
+    with _lock:
+        if not refresh and _state["active"] is not None and now - _state["checked"] < interval:
+            return _state["active"]
+    version, pinned, thresholds = _load_active()
+    with _lock:
+        _state.update(active=version, pinned=pinned, thresholds=thresholds, checked=now)
+        warn = pinned and not _state["warned"]
+    if warn and version != configured_version():
+        print(
+            f"Face embeddings are stored as {version} but {configured_version()} is "
+            "configured; matching stays on the stored version until a re-embed job "
+            "runs (python scripts/reembed_faces.py)"
+        )
+        with _lock:
+            _state["warned"] = True
+    return version
+
+
+def match_threshold(version: Optional[str] = None) -> float:
+    """Cosine distance accepted as a match for version (default: the active one)."""
+    active = active_version()
+    with _lock:
+        threshold = _state["thresholds"].get(version or active)
+    if threshold is None:
+        threshold = current_app.config.get("FACE_MATCH_THRESHOLD", 0.6)
+    return threshold
+
+
+def set_match_threshold(version: str, threshold: float) -> None:
+    """Store a calibrated threshold for version. The caller commits."""
+    row = db.session.get(FaceEmbeddingModel, version)
+    if row is None:
+        # calibrated before its first enrollment; not active yet
+        row = FaceEmbeddingModel(version=version, active=False, activated_at=None)
+        db.session.add(row)
+    row.match_threshold = threshold
+    row.calibrated_at = datetime.utcnow()
+    with _lock:
+        _state["checked"] = 0.0
+
+
+def activate(version: str) -> None:
+    """Make version the active one. The caller commits."""
+    db.session.query(FaceEmbeddingModel).filter(FaceEmbeddingModel.version != version).update(
+        {"active": False}, synchronize_session=False
+    )
+    row = db.session.get(FaceEmbeddingModel, version)
+    if row is None:
+        row = FaceEmbeddingModel(version=version)
+        db.session.add(row)
+    row.active = True
+    row.activated_at = datetime.utcnow()
+    with _lock:
+        _state["checked"] = 0.0
+
+
+def pin_active() -> str:
+    """
+    Record the served version as active on the first enrollment, so a later
+    config change needs a re-embed job. The caller commits.
+    """
+    version = active_version()
+    if not _state["pinned"]:
+        activate(version)
+        with _lock:
+            _state["pinned"] = True
+    return version
+
+
+def ensure_engine() -> str:
+    """Switch this process's face engine to the active version; return it."""
+    if not has_app_context():
+        return face_engine.model_version()
+    version = active_version()
+    if face_engine.use_version(version):
+        print("Face engine switched to embedding model", version)
+        inference_pool.use_backend(*face_engine.current_settings())
+    return version
+
+
+def serving_settings() -> Tuple[str, Dict[str, Any]]:
+    """(backend name, options) of the active version, for worker processes."""
+    ensure_engine()
+    return face_engine.current_settings()
+
+
+def init_app(app) -> None:
+    with _lock:
+        _state.update(active=None, pinned=False, thresholds={}, checked=0.0, warned=False)
+
+
+def _counts(query, column) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for version, count in query.with_entities(column, func.count()).group_by(column):
+        counts[tag(version)] = counts.get(tag(version), 0) + count
+    return counts
+
+
+def _enrolled(model):
+    return model.query.filter(
+        (model.face_embedding_bin.isnot(None)) | (model.face_embedding.isnot(None))
+    )
+
+
+def status() -> Dict[str, Any]:
+    """Active/configured/served versions and stored vectors per version."""
+    active = active_version()
+    configured = configured_version()
+    return {
+        "active_version": active,
+        "configured_version": configured,
+        "serving_version": face_engine.model_version(),
+        "reembed_needed": configured != active,
+        "match_threshold": match_threshold(face_engine.model_version()),
+        "students": _counts(_enrolled(Student), Student.face_embedding_model),
+        "teachers": _counts(_enrolled(Teacher), Teacher.face_embedding_model),
+        "templates": _counts(FaceTemplate.query, FaceTemplate.embedding_model),
+    }
@@ -0,0 +1,155 @@
+"""
+Detection of one face enrolled under several students.
+
+If the same person is registered against two students, face attendance
+marks whichever of them scores slightly higher. Both checks here run on
+the shared, memory-mapped student roster (see face_roster), whose rows
+are unit-length, so a cosine similarity is a dot product:
+
+- `find_matches` compares new embeddings against every enrolled student
+  school-wide before they are stored (register-face, bulk enrollment).
+- `duplicate_pairs` scans the whole roster for near-duplicate students,
+  for the admin report.
+
+Both work in row blocks of at most BLOCK_ELEMENTS similarities, so memory
+stays bounded on large enrollments. A student's similarity to another is
+the maximum over their rows (centroid and templates); rows of one student
+are contiguous in the roster, so the per-student maximum is a
+`np.maximum.reduceat`. Pairs closer than FACE_DUPLICATE_THRESHOLD (cosine
+distance) are reported.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from flask import current_app
+from ..models.student import Student
+from . import face_engine, face_roster
+from .face_match_service import DEFAULT_MATCH_THRESHOLD, normalize_embedding
+
+# similarities computed per block (float32: 4M = 16 MB)
+BLOCK_ELEMENTS = 4 * 1024 * 1024
+
+
+def threshold() -> float:
+    return current_app.config.get("FACE_DUPLICATE_THRESHOLD", DEFAULT_MATCH_THRESHOLD)
+
+
+def _block_rows(width: int) -> int:
+    return max(1, BLOCK_ELEMENTS // max(1, width))
+
+
+def _owner_starts(owner_ids: np.ndarray) -> np.ndarray:
+    """First row of each run of equal owner ids."""
+    return np.flatnonzero(np.r_[True, owner_ids[1:] != owner_ids[:-1]])
+
+
+def find_matches(
+    embeddings: Sequence,
+    exclude_ids: Optional[Sequence[Optional[int]]] = None,
+    max_distance: Optional[float] = None,
+) -> List[List[Tuple[int, float]]]:
+    """
+    For each embedding, the enrolled students closer than max_distance as
+    [(student_id, distance)], closest first. exclude_ids gives, per
+    embedding, the student it is being registered for (ignored). Nothing is
+    reported while this worker's model differs from the roster's version.
+    """
+    results: List[List[Tuple[int, float]]] = [[] for _ in embeddings]
+    roster = face_roster.get_roster(face_roster.STUDENTS)
+    if not embeddings or len(roster) == 0 or roster.version != face_engine.model_version():
+        return results
+
+    queries = np.vstack([normalize_embedding(e) for e in embeddings])
+    if queries.shape[1] != roster.matrix.shape[1]:
+        return results
+
+    max_distance = threshold() if max_distance is None else max_distance
+    excluded = np.asarray(
+        [-1 if i is None else i for i in (exclude_ids or [None] * len(embeddings))],
+        dtype=np.int64,
+    )
+    starts = _owner_starts(roster.owner_ids)
+    student_ids = roster.owner_ids[starts]
+    step = _block_rows(len(roster))
+
+    for lo in range(0, len(queries), step):
+        hi = min(lo + step, len(queries))
+        similarities = np.maximum.reduceat(queries[lo:hi] @ roster.matrix.T, starts, axis=1)
+        distances = 1.0 - similarities
+        hits = (distances <= max_distance) & (student_ids[None, :] != excluded[lo:hi, None])
+        for row, col in zip(*np.nonzero(hits)):
+            results[lo + row].append((int(student_ids[col]), float(distances[row, col])))
+
+    for matches in results:
+        matches.sort(key=lambda m: m[1])
+    return results
+
+
+def batch_pairs(
+    embeddings: Sequence, max_distance: Optional[float] = None
+) -> List[Tuple[int, int, float]]:
+    """(i, j, distance) for pairs of embeddings in one batch closer than max_distance."""
+    if len(embeddings) < 2:
+        return []
+    vectors = np.vstack([normalize_embedding(e) for e in embeddings])
+    return _close_pairs(vectors, np.arange(len(vectors)), max_distance)
+
+
+def _close_pairs(matrix: np.ndarray, owner_ids: np.ndarray, max_distance: Optional[float]):
+    """
+    Distinct-owner pairs (owner_a < owner_b, distance) closer than
+    max_distance, keeping the closest rows per owner pair. Scans the upper
+    triangle of matrix @ matrix.T one row block at a time.
+    """
+    max_distance = threshold() if max_distance is None else max_distance
+    min_similarity = 1.0 - max_distance
+    n = len(matrix)
+    step = _block_rows(n)
+    found_a, found_b, found_sim = [], [], []
+
+    for lo in range(0, n, step):
+        hi = min(lo + step, n)
+        similarities = np.asarray(matrix[lo:hi]) @ np.asarray(matrix[lo:]).T
+        rows, cols = np.nonzero(similarities >= min_similarity)
+        cols_global = cols + lo
+        # upper triangle only, and never a person against their own rows
+        keep = (cols_global > rows + lo) & (owner_ids[rows + lo] != owner_ids[cols_global])
+        rows, cols, cols_global = rows[keep], cols[keep], cols_global[keep]
+        a, b = owner_ids[rows + lo], owner_ids[cols_global]
+        found_a.append(np.minimum(a, b))
+        found_b.append(np.maximum(a, b))
+        found_sim.append(similarities[rows, cols])
+
+    a, b, sim = np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_sim)
+    if a.size == 0:
+        return []
+    # best similarity per owner pair: sort by pair, highest similarity first
+    order = np.lexsort((-sim, b, a))
+    a, b, sim = a[order], b[order], sim[order]
+    first = np.r_[True, (a[1:] != a[:-1]) | (b[1:] != b[:-1])]
+    a, b, distance = a[first], b[first], 1.0 - sim[first]
+    order = np.argsort(distance, kind="stable")
+    return [(int(a[i]), int(b[i]), float(distance[i])) for i in order]
+
+
+def duplicate_pairs(max_distance: Optional[float] = None) -> List[Tuple[int, int, float]]:
+    """All pairs of enrolled students closer than max_distance, closest first."""
+    roster = face_roster.get_roster(face_roster.STUDENTS)
+    if len(roster) < 2:
+        return []
+    return _close_pairs(roster.matrix, roster.owner_ids, max_distance)
+
+
+def describe(student_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Name, roll number and class of students, for reports and error payloads."""
+    ids = set(student_ids)
+    if not ids:
+        return {}
+    return {
+        s.id: {
+            "student_id": s.id,
+            "name": s.user.name if s.user else None,
+            "roll_no": s.roll_no,
+            "class_id": s.class_id,
+        }
+        for s in Student.query.filter(Student.id.in_(ids))
+    }
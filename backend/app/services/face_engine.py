@@ -0,0 +1,225 @@
+"""
+Process-wide face detector and recognition model.
+
+The MediaPipe face detector and the embedding backend (ArcFace through
+DeepFace by default, see embedding_backends) are created once per worker
+process and shared by every request. Group photos can use their own
+detector model (FACE_GROUP_DETECTOR_MODEL_PATH, e.g. full-range
+BlazeFace). `init_app` kicks off an explicit warm-up (model build + one
+dummy forward pass) when the app is created, and `status()` exposes a
+readiness flag for the health endpoints.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from mediapipe.tasks import python
+from mediapipe.tasks.python import vision
+from . import embedding_backends
+
+_lock = threading.Lock()
+# MediaPipe task objects are not safe to call from several threads at once.
+_detect_lock = threading.Lock()
+
+_detector = None
+_detector_model_path: Optional[str] = None
+_group_detector = None
+_group_detector_model_path: Optional[str] = None
+_backend: embedding_backends.EmbeddingBackend = embedding_backends.create("deepface", {})
+_model_loaded = False
+
+_state: Dict[str, Any] = {
+    "ready": False,
+    "warming_up": False,
+    "error": None,
+    "warmup_seconds": None,
+}
+
+
+def backend_settings(config) -> Tuple[str, Dict[str, Any]]:
+    """(backend name, backend options) from app config."""
+    return config.get("FACE_EMBEDDING_BACKEND", "deepface"), {
+        "version": str(config.get("FACE_EMBEDDING_VERSION", "2")),
+        "onnx_model_path": config.get("FACE_ONNX_MODEL_PATH"),
+        "stub_dim": config.get("FACE_STUB_DIM", 512),
+        "stub_latency_ms": config.get("FACE_STUB_LATENCY_MS", 0.0),
+    }
+
+
+def settings_for_version(version: str, options: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """(backend name, backend options) that produce embeddings of version."""
+    return version.split(":", 1)[0], {**options, "version": version.rsplit(":", 1)[-1]}
+
+
+def model_version() -> str:
+    """Version tag of the embeddings this process computes."""
+    return embedding_backends.version_string(_backend.name, _backend.options.get("version", "1"))
+
+
+def current_settings() -> Tuple[str, Dict[str, Any]]:
+    """(backend name, backend options) this process currently embeds with."""
+    return _backend.name, dict(_backend.options)
+
+
+def use_version(version: str) -> bool:
+    """Switch to the backend producing version; returns True if it changed."""
+    if version == model_version():
+        return False
+    configure(_detector_model_path, *settings_for_version(version, _backend.options))
+    return True
+
+
+def configure(
+    detector_model_path: str,
+    backend_name: str = "deepface",
+    backend_options: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Set where the detector model is loaded from and which embedding backend to use."""
+    global _detector_model_path, _backend, _model_loaded
+    _detector_model_path = detector_model_path
+    if backend_name != _backend.name or (backend_options or {}) != _backend.options:
+        with _lock:
+            _backend = embedding_backends.create(backend_name, backend_options or {})
+            _model_loaded = False
+
+
+def configure_group_detector(model_path: Optional[str]) -> None:
+    """Detector model for group photos; None or a missing file uses the default one."""
+    global _group_detector_model_path, _group_detector
+    if model_path and not os.path.exists(model_path):
+        print("Group face detector model not found, using the default detector:", model_path)
+        model_path = None
+    if model_path != _group_detector_model_path:
+        with _lock:
+            _group_detector_model_path = model_path
+            _group_detector = None
+
+
+def _create_detector(model_path: str):
+    base_options = python.BaseOptions(model_asset_path=model_path)
+    options = vision.FaceDetectorOptions(
+        base_options=base_options, running_mode=vision.RunningMode.IMAGE
+    )
+    return vision.FaceDetector.create_from_options(options)
+
+
+def get_detector(group: bool = False):
+    """Return the shared MediaPipe FaceDetector, creating it on first use."""
+    global _detector, _group_detector
+    if group and _group_detector_model_path:
+        if _group_detector is None:
+            with _lock:
+                if _group_detector is None:
+                    _group_detector = _create_detector(_group_detector_model_path)
+        return _group_detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                _detector = _create_detector(_detector_model_path)
+    return _detector
+
+
+def detect(mp_image, group: bool = False):
+    """Run the shared MediaPipe detector (or the group-photo one) on an mp.Image."""
+    detector = get_detector(group)
+    with _detect_lock:
+        return detector.detect(mp_image)
+
+
+def get_model() -> embedding_backends.EmbeddingBackend:
+    """Return the shared embedding backend, loading its model on first use."""
+    global _model_loaded
+    if not _model_loaded:
+        with _lock:
+            if not _model_loaded:
+                _backend.load()
+                _model_loaded = True
+    return _backend
+
+
+def represent(image, **kwargs):
+    """DeepFace.represent-style result list for one aligned face crop."""
+    outcome = get_model().represent_batch([image])[0]
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+def represent_batch(images, **kwargs) -> List[Any]:
+    """
+    Represent several aligned face crops with one batched forward pass.
+    Returns one entry per image: its represent() result list, or the
+    exception raised for it. If the batched call fails, images are retried
+    one at a time so a single bad image does not fail the others.
+
+    Crops always come from face_pipeline, so every backend skips detection;
+    kwargs (the pipeline's DeepFace options) are accepted for compatibility.
+    """
+    if len(images) == 1:
+        try:
+            return [represent(images[0], **kwargs)]
+        except Exception as e:
+            return [e]
+
+    try:
+        return get_model().represent_batch(list(images))
+    except Exception as e:
+        return [e] * len(images)
+
+
+def warm_up(load_model: bool = True) -> None:
+    """
+    Build the detector and model and push one dummy image through ArcFace
+    so graph tracing happens now rather than on the first real request.
+    With load_model=False only the detector is loaded (the model lives in
+    the inference pool processes instead).
+    """
+    with _lock:
+        if _state["ready"] or _state["warming_up"]:
+            return
+        _state["warming_up"] = True
+        _state["error"] = None
+
+    started = time.perf_counter()
+    try:
+        get_detector()
+        if load_model:
+            get_model()
+            represent(np.zeros((112, 112, 3), dtype=np.uint8))
+        _state["ready"] = True
+        _state["warmup_seconds"] = round(time.perf_counter() - started, 2)
+    except Exception as e:
+        _state["error"] = str(e)
+        print("Face engine warm-up failed:", e)
+    finally:
+        _state["warming_up"] = False
+
+
+def status() -> Dict[str, Any]:
+    """Return a copy of the readiness state for health reporting."""
+    return {
+        "model": _backend.model_name,
+        "backend": _backend.name,
+        "version": model_version(),
+        **_state,
+    }
+
+
+def init_app(app) -> None:
+    """Configure the engine from app config and start warm-up if enabled."""
+    configure(app.config["FACE_DETECTOR_MODEL_PATH"], *backend_settings(app.config))
+    configure_group_detector(app.config.get("FACE_GROUP_DETECTOR_MODEL_PATH"))
+
+    if not app.config.get("FACE_ENGINE_WARMUP", True):
+        return
+
+    # When inference runs in a process pool the web worker only needs the detector.
+    load_model = app.config.get("FACE_POOL_WORKERS", 0) <= 0
+
+    if app.config.get("FACE_ENGINE_WARMUP_BLOCKING", False):
+        warm_up(load_model)
+    else:
+        threading.Thread(
+            target=warm_up, args=(load_model,), name="face-engine-warmup", daemon=True
+        ).start()
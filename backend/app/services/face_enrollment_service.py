@@ -0,0 +1,319 @@
+"""
+Bulk face enrollment from a ZIP of student photos.
+
+Each image's filename stem identifies the student (roll number or student
+id). Images are decoded, cropped and embedded in parallel across CPU cores
+in a dedicated process pool, and all embeddings are written in a single
+transaction at the end. Progress and the per-file report live on a
+FaceEnrollmentJob row so any worker can answer status polls; the report is
+written in its own transaction after the embeddings, so failing to store
+it cannot undo the enrollment.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from ..extensions import db
+from ..models.face_enrollment_job import FaceEnrollmentJob
+from ..models.student import Student
+from ..utils.errors import APIError
+from ..utils.image_preprocess import decode_image
+from . import embedding_versions, face_duplicates, face_index, face_pipeline
+from .face_match_service import invalidate_classes
+from .face_template_service import add_template, save_template_image
+from .inference_pool import init_inference_worker
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+MATCH_FIELDS = ("roll_no", "id")
+
+# Commit progress to the job row every N processed files.
+PROGRESS_EVERY = 25
+
+
+# ---------- worker process side ----------
+def _enroll_one(name: str, data: bytes, max_side: int = 0):
+    """Decode, crop and embed one photo. Returns (name, embedding, crop_jpeg, error)."""
+    try:
+        image = decode_image(data, max_side)
+        if image is None:
+            return name, None, None, "Invalid image"
+
+        faces = face_pipeline.detect_faces(image, max_faces=1)
+        if not faces:
+            return name, None, None, "No face detected"
+
+        crop = faces[0]["crop"]
+        embedding = face_pipeline.embed_crop_inline(crop)
+        ok, encoded = cv2.imencode(".jpg", crop)
+        return name, embedding, encoded.tobytes() if ok else None, None
+    except Exception as e:
+        return name, None, None, str(e)
+
+
+# ---------- web worker side ----------
+def _image_entries(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    entries = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        base = os.path.basename(info.filename)
+        # skip macOS resource forks and hidden files
+        if not base or base.startswith("."):
+            continue
+        if os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS:
+            entries.append(info)
+    return entries
+
+
+def _student_lookup(match_by: str) -> Dict[str, Tuple[int, Optional[int]]]:
+    """Return {key: (student_id, class_id)} keyed by roll_no or id."""
+    rows = db.session.query(Student.id, Student.roll_no, Student.class_id).all()
+    if match_by == "id":
+        return {str(sid): (sid, cid) for sid, _, cid in rows}
+    return {roll.strip().lower(): (sid, cid) for sid, roll, cid in rows if roll}
+
+
+def start_job(upload, match_by: str, created_by: Optional[int], app) -> FaceEnrollmentJob:
+    """
+    Validate the uploaded ZIP, persist it to a temp file, create the job row
+    and start processing in a background thread. Returns the job.
+    """
+    if match_by not in MATCH_FIELDS:
+        raise APIError(f"match_by must be one of: {', '.join(MATCH_FIELDS)}", 400)
+
+    fd, zip_path = tempfile.mkstemp(suffix=".zip", prefix="face_enroll_")
+    os.close(fd)
+    upload.save(zip_path)
+
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            total = len(_image_entries(archive))
+    except zipfile.BadZipFile:
+        os.remove(zip_path)
+        raise APIError("Uploaded file is not a valid ZIP archive", 400)
+
+    if total == 0:
+        os.remove(zip_path)
+        raise APIError("ZIP contains no images", 400)
+
+    job = FaceEnrollmentJob(
+        id=str(uuid.uuid4()),
+        status="QUEUED",
+        match_by=match_by,
+        total_files=total,
+        created_by=created_by,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _spawn(app, job.id, zip_path)
+    return job
+
+
+def _spawn(app, job_id: str, zip_path: str) -> None:
+    threading.Thread(
+        target=_run_job, args=(app, job_id, zip_path), name=f"face-enroll-{job_id}", daemon=True
+    ).start()
+
+
+def _run_job(app, job_id: str, zip_path: str) -> None:
+    with app.app_context():
+        job = FaceEnrollmentJob.query.get(job_id)
+        try:
+            job.status = "RUNNING"
+            db.session.commit()
+            report, touched_classes = _process_archive(app, job, zip_path)
+            # Embeddings and counts land in one transaction.
+            db.session.commit()
+            invalidate_classes(touched_classes)
+            face_index.rebuild()
+            _finish(job_id, report)
+        except Exception as e:
+            db.session.rollback()
+            print("Bulk face enrollment failed:", e)
+            job = FaceEnrollmentJob.query.get(job_id)
+            job.status = "FAILED"
+            job.error = str(e)[:255]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        finally:
+            db.session.remove()
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+
+
+def _finish(job_id: str, report: List[Dict[str, Any]]) -> None:
+    """Mark the job COMPLETED with its report; the embeddings are already committed."""
+    job = FaceEnrollmentJob.query.get(job_id)
+    job.status = "COMPLETED"
+    job.finished_at = datetime.utcnow()
+    try:
+        job.report = json.dumps(report)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print("Bulk face enrollment report not saved:", e)
+        job = FaceEnrollmentJob.query.get(job_id)
+        job.status = "COMPLETED"
+        job.error = "Per-file report could not be saved"
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _process_archive(app, job: FaceEnrollmentJob, zip_path: str):
+    lookup = _student_lookup(job.match_by)
+    report: List[Dict[str, Any]] = []
+    pending_files: Dict[str, Tuple[int, Optional[int]]] = {}
+    embedded: Dict[str, Tuple[np.ndarray, Optional[bytes]]] = {}
+
+    with zipfile.ZipFile(zip_path) as archive:
+        todo = []
+        seen_students = set()
+        for info in _image_entries(archive):
+            key = os.path.splitext(os.path.basename(info.filename))[0].strip().lower()
+            student = lookup.get(key)
+            if not student:
+                error = f"No student with {job.match_by} '{key}'"
+            elif student[0] in seen_students:
+                error = "Duplicate photo for the same student"
+            else:
+                seen_students.add(student[0])
+                pending_files[info.filename] = student
+                todo.append(info)
+                continue
+            report.append({"file": info.filename, "status": "skipped", "error": error})
+
+        job.processed_files = len(report)
+        job.failed_count = len(report)
+        db.session.commit()
+
+        workers = app.config.get("FACE_BULK_ENROLL_WORKERS") or os.cpu_count() or 1
+        max_side = app.config.get("FACE_IMAGE_MAX_SIDE", 0)
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_inference_worker,
+            # embed with the active model version, like the web workers
+            initargs=(
+                app.config["FACE_DETECTOR_MODEL_PATH"],
+                *embedding_versions.serving_settings(),
+            ),
+        )
+        try:
+            # Keep a bounded window of in-flight files so a huge ZIP is never
+            # fully resident in memory.
+            queue = iter(todo)
+            in_flight = set()
+            done_since_commit = 0
+            while True:
+                while len(in_flight) < workers * 2:
+                    info = next(queue, None)
+                    if info is None:
+                        break
+                    in_flight.add(
+                        executor.submit(_enroll_one, info.filename, archive.read(info), max_side)
+                    )
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, embedding, crop, error = future.result()
+                    if error:
+                        report.append(
+                            {
+                                "file": name,
+                                "student_id": pending_files[name][0],
+                                "status": "failed",
+                                "error": error,
+                            }
+                        )
+                        job.failed_count += 1
+                    else:
+                        embedded[name] = (embedding, crop)
+                    job.processed_files += 1
+                    done_since_commit += 1
+
+                if done_since_commit >= PROGRESS_EVERY:
+                    db.session.commit()
+                    done_since_commit = 0
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    touched_classes = _apply_embeddings(job, pending_files, embedded, report)
+    return report, touched_classes
+
+
+def _duplicate_students(students, vectors) -> Dict[int, set]:
+    """
+    Students whose photo matches another student, already enrolled or in
+    this archive (one vectorized pass each), as {student_id: {other ids}}.
+    """
+    conflicts: Dict[int, set] = {student.id: set() for student in students}
+    matches = face_duplicates.find_matches(vectors, exclude_ids=[s.id for s in students])
+    for student, found in zip(students, matches):
+        conflicts[student.id].update(student_id for student_id, _ in found)
+    for i, j, _ in face_duplicates.batch_pairs(vectors):
+        conflicts[students[i].id].add(students[j].id)
+        conflicts[students[j].id].add(students[i].id)
+    return {student_id: ids for student_id, ids in conflicts.items() if ids}
+
+
+def _apply_embeddings(job, pending_files, embedded, report) -> set:
+    """Stage every successful embedding on the session; the caller commits once."""
+    upload_dir = os.path.join("uploads", "faces")
+    os.makedirs(upload_dir, exist_ok=True)
+
+    by_student = {pending_files[name][0]: name for name in embedded}
+    students = Student.query.filter(Student.id.in_(list(by_student))).all() if by_student else []
+    duplicates = _duplicate_students(
+        students, [embedded[by_student[student.id]][0] for student in students]
+    )
+    now = datetime.utcnow()
+    touched_classes = set()
+
+    for student in students:
+        name = by_student[student.id]
+        if student.id in duplicates:
+            # register these one by one (allow_duplicate) after checking them
+            report.append(
+                {
+                    "file": name,
+                    "student_id": student.id,
+                    "status": "duplicate",
+                    "error": "Face matches another student",
+                    "matches": sorted(duplicates[student.id]),
+                }
+            )
+            job.failed_count += 1
+            continue
+        embedding, crop = embedded[name]
+        template_path = None
+        if crop is not None:
+            file_path = os.path.join(upload_dir, f"student_{student.id}.jpg")
+            with open(file_path, "wb") as fh:
+                fh.write(crop)
+            student.face_image_path = file_path
+            template_path = save_template_image(crop)
+        student.face_registered_at = now
+        add_template(student, embedding, source="BULK", image_path=template_path)
+        touched_classes.add(student.class_id)
+        report.append({"file": name, "student_id": student.id, "status": "registered"})
+
+    job.registered_count = len(students) - len(duplicates)
+    return touched_classes
+
+
+def get_job(job_id: str) -> FaceEnrollmentJob:
+    job = FaceEnrollmentJob.query.get(job_id)
+    if not job:
+        raise APIError("Enrollment job not found", 404)
+    return job
@@ -0,0 +1,540 @@
+"""
+School-wide approximate nearest-neighbour index over student face embeddings.
+
+Used by kiosk identification, where the class is unknown and a linear scan
+of every enrolled student would be too slow. The index is an IVF
+(inverted file) structure built with numpy: vectors are L2-normalised,
+clustered around spherical k-means centroids, and a query only scans the
+`n_probe` lists whose centroids are closest to it.
+
+Small rosters (fewer than MIN_TRAIN_SIZE vectors) use a single list, which
+is an exact flat scan. The index supports incremental insert/delete as
+faces are registered and is persisted to an .npz file so workers restart
+without rebuilding from MySQL. Changes are saved at most every
+FACE_INDEX_SAVE_INTERVAL_SECONDS; one made sooner is saved by a deferred
+timer, so other workers see every enrollment within that interval. With
+nobody enrolled an empty marker file is written instead, so workers do
+not rebuild from the database on every query. A file that fails to load,
+or one another worker saved while this one holds unsaved changes, is
+replaced by a rebuild from the database.
+
+The lists hold int8 (or float16) quantized vectors for the first-pass scan.
+Exact float32 vectors are only used to re-rank the best candidates; after a
+save/load they live in a memory-mapped .npy next to the index, so the OS
+page cache shares them between gunicorn workers instead of each worker
+holding its own copy. Writers hold an exclusive lock on `<path>.lock`
+while they replace the .npz and delete the .npy it replaced, and loads hold
+a shared one, so no worker can read an .npz whose .npy is already gone.
+"""
+import atexit
+import contextlib
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from ..extensions import db
+from ..models.student import Student
+from ..utils.embedding_codec import load_embedding
+from . import embedding_versions
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no locking
+    fcntl = None
+
+MIN_TRAIN_SIZE = 2048
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000
+# Retrain once the index has grown this much past its training size.
+RETRAIN_GROWTH = 4
+
+QUANTIZATIONS = ("int8", "float16")
+# Candidates re-ranked with exact vectors: max(k * RERANK_FACTOR, MIN_RERANK).
+RERANK_FACTOR = 4
+MIN_RERANK = 32
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray, mode: str = "int8") -> Tuple[np.ndarray, np.ndarray]:
+    """Return (codes, per-row scales) so that codes * scale approximates vectors."""
+    if mode == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    if mode != "int8":
+        raise ValueError(f"Unknown quantization: {mode}")
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_SAMPLE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_SAMPLE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_lists)
+        empty = counts == 0
+        # re-seed empty clusters with random points
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index with quantized inner-product search and exact re-ranking."""
+
+    def __init__(
+        self,
+        dim: int,
+        centroids: Optional[np.ndarray] = None,
+        trained_size: int = 0,
+        quantization: str = "int8",
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.dim = dim
+        self.centroids = centroids
+        self.trained_size = trained_size
+        self.quantization = quantization
+        code_dtype = np.int8 if quantization == "int8" else np.float16
+        n_lists = 1 if centroids is None else len(centroids)
+        self._ids: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._codes: List[np.ndarray] = [
+            np.empty((0, dim), dtype=code_dtype) for _ in range(n_lists)
+        ]
+        self._scales: List[np.ndarray] = [
+            np.empty(0, dtype=np.float32) for _ in range(n_lists)
+        ]
+        self._where: Dict[int, int] = {}
+        # exact vectors: a (possibly memory-mapped) matrix plus vectors added since
+        self._exact = np.empty((0, dim), dtype=np.float32)
+        self._exact_row: Dict[int, int] = {}
+        self._exact_extra: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    @classmethod
+    def build(
+        cls, ids, vectors, n_lists: Optional[int] = None, quantization: str = "int8"
+    ) -> "IVFIndex":
+        vectors = _normalize_rows(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        centroids = None
+        if len(ids) >= MIN_TRAIN_SIZE:
+            n_lists = n_lists or int(np.sqrt(len(ids)))
+            centroids = _spherical_kmeans(vectors, n_lists)
+        index = cls(vectors.shape[1], centroids, trained_size=len(ids), quantization=quantization)
+        index._add_batch(ids, vectors)
+        index._exact = vectors
+        index._exact_row = {int(item_id): row for row, item_id in enumerate(ids)}
+        return index
+
+    @property
+    def needs_retrain(self) -> bool:
+        if self.centroids is None:
+            return len(self) >= MIN_TRAIN_SIZE
+        return len(self) > self.trained_size * RETRAIN_GROWTH
+
+    def memory_bytes(self) -> int:
+        """Heap bytes used by the scan structures (memory-mapped vectors excluded)."""
+        total = sum(
+            codes.nbytes + scales.nbytes + ids.nbytes
+            for codes, scales, ids in zip(self._codes, self._scales, self._ids)
+        )
+        total += sum(v.nbytes for v in self._exact_extra.values())
+        if not isinstance(self._exact, np.memmap):
+            total += self._exact.nbytes
+        return total
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _add_batch(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        lists = self._assign(vectors)
+        codes, scales = quantize(vectors, self.quantization)
+        for list_no in np.unique(lists):
+            mask = lists == list_no
+            self._ids[list_no] = np.concatenate([self._ids[list_no], ids[mask]])
+            self._codes[list_no] = np.vstack([self._codes[list_no], codes[mask]])
+            self._scales[list_no] = np.concatenate([self._scales[list_no], scales[mask]])
+            for item_id in ids[mask]:
+                self._where[int(item_id)] = int(list_no)
+
+    def add(self, item_id: int, vector) -> None:
+        """Insert or replace the vector stored for item_id."""
+        self.remove(item_id)
+        vector = _normalize_rows(vector)
+        self._add_batch(np.asarray([item_id], dtype=np.int64), vector)
+        self._exact_extra[int(item_id)] = vector[0]
+
+    def remove(self, item_id: int) -> bool:
+        list_no = self._where.pop(int(item_id), None)
+        if list_no is None:
+            return False
+        keep = self._ids[list_no] != item_id
+        self._ids[list_no] = self._ids[list_no][keep]
+        self._codes[list_no] = self._codes[list_no][keep]
+        self._scales[list_no] = self._scales[list_no][keep]
+        self._exact_row.pop(int(item_id), None)
+        self._exact_extra.pop(int(item_id), None)
+        return True
+
+    def _exact_vector(self, item_id: int) -> np.ndarray:
+        extra = self._exact_extra.get(item_id)
+        if extra is not None:
+            return extra
+        return self._exact[self._exact_row[item_id]]
+
+    def search(self, query, k: int = 5, n_probe: int = 8) -> List[Tuple[int, float]]:
+        """Return up to k (item_id, cosine_similarity) pairs, best first."""
+        if not self._where:
+            return []
+        query = _normalize_rows(query)[0]
+        if query.shape[0] != self.dim:
+            return []
+
+        if self.centroids is None:
+            probe = [0]
+        else:
+            n_probe = min(n_probe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+
+        ids = np.concatenate([self._ids[p] for p in probe])
+        if ids.size == 0:
+            return []
+        approx = np.concatenate(
+            [(self._codes[p].astype(np.float32) @ query) * self._scales[p] for p in probe]
+        )
+
+        n_rerank = min(max(k * RERANK_FACTOR, MIN_RERANK), ids.size)
+        candidates = np.argpartition(-approx, n_rerank - 1)[:n_rerank]
+        candidate_ids = ids[candidates]
+        exact = np.vstack([self._exact_vector(int(i)) for i in candidate_ids]) @ query
+
+        k = min(k, candidate_ids.size)
+        top = np.argpartition(-exact, k - 1)[:k]
+        top = top[np.argsort(-exact[top])]
+        return [(int(candidate_ids[i]), float(exact[i])) for i in top]
+
+    def save(self, path: str) -> None:
+        """
+        Atomically write the index to path (.npz) and its exact vectors to a
+        uniquely named .npy beside it; the .npy of the replaced file is removed.
+        """
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.splitext(path)[0]
+        ids = np.concatenate(self._ids)
+        exact = (
+            np.vstack([self._exact_vector(int(i)) for i in ids])
+            if ids.size
+            else np.empty((0, self.dim), dtype=np.float32)
+        )
+
+        exact_path = f"{base}.{uuid.uuid4().hex[:12]}.exact.npy"
+        tmp_exact = f"{exact_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_exact, exact.astype(np.float32, copy=False))
+        os.replace(tmp_exact, exact_path)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        offsets = np.cumsum([0] + [len(list_ids) for list_ids in self._ids])
+        np.savez(
+            tmp_path,
+            dim=np.int64(self.dim),
+            trained_size=np.int64(self.trained_size),
+            quantization=np.array(self.quantization),
+            exact_file=np.array(os.path.basename(exact_path)),
+            centroids=self.centroids if self.centroids is not None else np.empty((0, self.dim), np.float32),
+            ids=ids,
+            codes=np.vstack(self._codes),
+            scales=np.concatenate(self._scales),
+            offsets=offsets,
+        )
+        _replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with _file_lock(path, exclusive=False):
+            return cls._load(path)
+
+    @classmethod
+    def _load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            index = cls(
+                int(data["dim"]),
+                centroids if len(centroids) else None,
+                trained_size=int(data["trained_size"]),
+                quantization=str(data["quantization"]),
+            )
+            exact_file = str(data["exact_file"])
+            offsets = data["offsets"]
+            ids, codes, scales = data["ids"], data["codes"], data["scales"]
+        for list_no in range(len(offsets) - 1):
+            start, end = offsets[list_no], offsets[list_no + 1]
+            index._ids[list_no] = ids[start:end].copy()
+            index._codes[list_no] = codes[start:end].copy()
+            index._scales[list_no] = scales[start:end].copy()
+            for item_id in index._ids[list_no]:
+                index._where[int(item_id)] = list_no
+        index._exact = np.load(
+            os.path.join(os.path.dirname(path) or ".", exact_file), mmap_mode="r"
+        )
+        index._exact_row = {int(item_id): row for row, item_id in enumerate(ids)}
+        return index
+
+
+@contextlib.contextmanager
+def _file_lock(path: str, exclusive: bool):
+    """Lock `<path>.lock` across processes (shared for readers)."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _exact_file_of(path: str) -> Optional[str]:
+    """Path of the .npy the index file at path refers to, if any."""
+    try:
+        with np.load(path) as data:
+            if "exact_file" not in data.files:
+                return None
+            return os.path.join(os.path.dirname(path) or ".", str(data["exact_file"]))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _replace(tmp_path: str, path: str) -> None:
+    """
+    Move tmp_path over path and delete the .npy the replaced file referred
+    to. Readers that already mapped it keep their handle (POSIX unlink).
+    """
+    with _file_lock(path, exclusive=True):
+        replaced = _exact_file_of(path)
+        os.replace(tmp_path, path)
+        if replaced and replaced != _exact_file_of(path):
+            try:
+                os.remove(replaced)
+            except OSError:
+                pass
+
+
+# ---------- process-wide student index ----------
+_lock = threading.RLock()
+_index: Optional[IVFIndex] = None
+_loaded_mtime = 0.0
+_dirty = False
+_last_save = 0.0
+_save_timer: Optional[threading.Timer] = None
+
+_config = {
+    "path": None,
+    "n_probe": 8,
+    "save_interval": 30.0,
+    "quantization": "int8",
+    "app": None,
+}
+
+
+def init_app(app) -> None:
+    _config["app"] = app
+    _config["path"] = app.config["FACE_INDEX_PATH"]
+    _config["n_probe"] = app.config.get("FACE_INDEX_NPROBE", 8)
+    _config["save_interval"] = app.config.get("FACE_INDEX_SAVE_INTERVAL_SECONDS", 30.0)
+    _config["quantization"] = app.config.get("FACE_INDEX_QUANTIZATION", "int8")
+
+
+def _file_mtime() -> float:
+    path = _config["path"]
+    return os.path.getmtime(path) if path and os.path.exists(path) else 0.0
+
+
+def rebuild() -> IVFIndex:
+    """Rebuild the index from every student enrolled in the active model version and persist it."""
+    global _index, _dirty, _loaded_mtime
+    rows = (
+        db.session.query(
+            Student.id,
+            Student.face_embedding_bin,
+            Student.face_embedding,
+            Student.face_embedding_model,
+        )
+        .filter((Student.face_embedding_bin.isnot(None)) | (Student.face_embedding.isnot(None)))
+        .all()
+    )
+    version = embedding_versions.active_version(refresh=True)
+    ids, vectors = [], []
+    for student_id, blob, legacy, model in rows:
+        if embedding_versions.tag(model) != version:
+            continue
+        vec = load_embedding(blob, legacy)
+        if vec is not None:
+            ids.append(student_id)
+            vectors.append(vec)
+
+    with _lock:
+        if vectors:
+            _index = IVFIndex.build(
+                ids, np.vstack(vectors), quantization=_config["quantization"]
+            )
+        else:
+            _index = None
+        _dirty = True
+        _persist(force=True)
+        _loaded_mtime = _file_mtime()
+        return _index
+
+
+def get_index() -> Optional[IVFIndex]:
+    """Return the loaded index, loading from disk or rebuilding as needed."""
+    global _index, _loaded_mtime
+    with _lock:
+        mtime = _file_mtime()
+        if mtime and mtime > _loaded_mtime:
+            if _dirty:
+                # Another worker saved while we hold unsaved changes; the
+                # database is the source of truth, so rebuild from it.
+                return rebuild()
+            try:
+                _index = _load_file(_config["path"])
+            except Exception as e:
+                # corrupt or half-deleted file: the database is the source of truth
+                print("Face index load error, rebuilding:", e)
+                return rebuild()
+            _loaded_mtime = mtime
+            if _index is not None and _index.quantization != _config["quantization"]:
+                return rebuild()
+        if _index is None and not mtime:
+            return rebuild()
+        return _index
+
+
+def _save_empty(path: str) -> None:
+    """Atomically replace the index file with the no-students marker."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, empty=np.int64(1))
+    _replace(tmp_path, path)
+
+
+def _load_file(path: str) -> Optional[IVFIndex]:
+    """The index saved at path, or None for the no-students marker."""
+    with _file_lock(path, exclusive=False):
+        with np.load(path) as data:
+            if "empty" in data.files:
+                return None
+        return IVFIndex._load(path)
+
+
+def _deferred_save() -> None:
+    global _save_timer
+    with _lock:
+        _save_timer = None
+        if not _dirty:
+            return
+        try:
+            if _file_mtime() > _loaded_mtime and _config["app"] is not None:
+                # another worker saved meanwhile; writing ours would drop its
+                # changes, so rebuild from the database instead
+                with _config["app"].app_context():
+                    try:
+                        rebuild()
+                    finally:
+                        db.session.remove()
+            else:
+                _persist(force=True)
+        except Exception as e:
+            print("Face index save error:", e)
+
+
+def _schedule_save(delay: float) -> None:
+    global _save_timer
+    if _save_timer is None:
+        _save_timer = threading.Timer(delay, _deferred_save)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+def _persist(force: bool = False) -> None:
+    global _index, _dirty, _last_save, _loaded_mtime
+    if not _dirty or not _config["path"]:
+        return
+    now = time.monotonic()
+    if not force and now - _last_save < _config["save_interval"]:
+        # saved recently: write this change once the interval has passed
+        _schedule_save(_config["save_interval"] - (now - _last_save))
+        return
+    if _index is not None:
+        _index.save(_config["path"])
+        # reopen so the exact vectors are memory-mapped rather than on the heap
+        _index = IVFIndex.load(_config["path"])
+    else:
+        _save_empty(_config["path"])
+    _loaded_mtime = _file_mtime()
+    _dirty = False
+    _last_save = now
+
+
+def upsert_student(student_id: int, embedding) -> None:
+    """Insert or replace one student's embedding after face registration."""
+    global _dirty
+    with _lock:
+        index = get_index()
+        if index is None or index.needs_retrain:
+            rebuild()
+            return
+        index.add(student_id, embedding)
+        _dirty = True
+        _persist()
+
+
+def remove_student(student_id: int) -> None:
+    global _dirty
+    with _lock:
+        index = get_index()
+        if index is not None and index.remove(student_id):
+            _dirty = True
+            _persist()
+
+
+def flush() -> None:
+    """Write pending index changes to disk now."""
+    with _lock:
+        _persist(force=True)
+
+
+atexit.register(flush)
+
+
+def identify(embedding, k: int = 5) -> List[Tuple[int, float]]:
+    """Return the k most similar enrolled students as (student_id, similarity)."""
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(embedding, k=k, n_probe=_config["n_probe"])
@@ -0,0 +1,146 @@
+"""
+Face matching helpers.
+
+Each class's enrolled face embeddings are a pre-normalised float32 matrix
+plus a parallel vector of student ids, so a captured face is matched
+against the whole class with one matrix-vector product instead of a
+decode + cosine call per student.
+
+The matrices are zero-copy slices of the shared, memory-mapped student
+roster (see face_roster), so every worker process reads the same pages.
+A worker whose model differs from the roster's version (it has not yet
+switched after a re-embed) matches nobody rather than comparing vectors
+of different models.
+
+A student with several enrollment templates contributes one row for their
+centroid and one per template (rows of a student are contiguous); a
+student's similarity is the maximum over their rows.
+
+A face matches when its cosine distance is within `match_threshold()`:
+the threshold calibrated for the served model version, or
+FACE_MATCH_THRESHOLD.
+
+Callers that change a class roster or a student's embedding must call
+`invalidate_class` after committing.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from . import embedding_versions, face_engine, face_roster
+
+# used when neither the model version nor FACE_MATCH_THRESHOLD sets one
+DEFAULT_MATCH_THRESHOLD = 0.6
+
+_lock = threading.Lock()
+# class_id -> (student_ids, matrix) views into the roster with token _cache_token
+_class_cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+_cache_token: Optional[str] = None
+
+
+def normalize_embedding(embedding) -> np.ndarray:
+    """Return embedding as an L2-normalised 1-D float32 vector."""
+    vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec
+
+
+def match_threshold() -> float:
+    """Match threshold (cosine distance) of the model version this worker serves."""
+    return embedding_versions.match_threshold(face_engine.model_version())
+
+
+def get_class_matrix(class_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (student_ids, matrix) for class_id from the shared student roster.
+    Matrix rows are unit-length float32 embeddings aligned with student_ids;
+    a student with several templates appears on consecutive rows.
+    """
+    global _cache_token
+    roster = face_roster.get_roster(face_roster.STUDENTS)
+    if roster.version != face_engine.model_version():
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    with _lock:
+        if roster.token != _cache_token:
+            _class_cache.clear()
+            _cache_token = roster.token
+        entry = _class_cache.get(class_id)
+        if entry is None:
+            entry = _class_cache[class_id] = roster.group_rows(class_id)
+    return entry
+
+
+def invalidate_class(class_id: Optional[int] = None) -> None:
+    """
+    Signal that enrolled embeddings changed (for class_id, or any class).
+    Bumps the student roster generation so every worker remaps it.
+    """
+    face_roster.bump(face_roster.STUDENTS)
+
+
+def invalidate_classes(class_ids: Iterable[Optional[int]]) -> None:
+    """Invalidate several classes, ignoring None ids (one roster bump)."""
+    if any(class_id is not None for class_id in class_ids):
+        invalidate_class()
+
+
+def match_embedding(
+    class_id: int, embedding, threshold: Optional[float] = None
+) -> Optional[Tuple[int, float]]:
+    """
+    Return (student_id, cosine_distance) of the closest enrolled student in
+    class_id, or None when nobody is enrolled or the best distance exceeds
+    threshold (default: match_threshold()).
+    """
+    ids, matrix = get_class_matrix(class_id)
+    if ids.size == 0:
+        return None
+
+    query = normalize_embedding(embedding)
+    if query.shape[0] != matrix.shape[1]:
+        return None
+
+    similarities = matrix @ query
+    best = int(np.argmax(similarities))
+    distance = float(1.0 - similarities[best])
+
+    if distance > (match_threshold() if threshold is None else threshold):
+        return None
+
+    return int(ids[best]), distance
+
+
+def assign_embeddings(
+    class_id: int, embeddings: Sequence, threshold: Optional[float] = None
+) -> List[Optional[Tuple[int, float]]]:
+    """
+    Match several faces from one photo against class_id at once.
+    Solves a one-to-one assignment on cosine distance so no student is
+    claimed by two faces. Returns one (student_id, distance) or None per
+    input embedding, in input order.
+    """
+    results: List[Optional[Tuple[int, float]]] = [None] * len(embeddings)
+    ids, matrix = get_class_matrix(class_id)
+    if ids.size == 0 or not embeddings:
+        return results
+
+    queries = np.vstack([normalize_embedding(e) for e in embeddings])
+    if queries.shape[1] != matrix.shape[1]:
+        return results
+
+    # best row per student (max similarity over centroid and templates)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    similarities = np.maximum.reduceat(queries @ matrix.T, starts, axis=1)
+    student_ids = ids[starts]
+
+    distances = 1.0 - similarities
+    threshold = match_threshold() if threshold is None else threshold
+    rows, cols = linear_sum_assignment(distances)
+    for row, col in zip(rows, cols):
+        distance = float(distances[row, col])
+        if distance <= threshold:
+            results[row] = (int(student_ids[col]), distance)
+
+    return results
@@ -0,0 +1,228 @@
+"""
+Single-detection face pipeline shared by every face endpoint.
+
+A decoded BGR image goes through the shared MediaPipe detector exactly once.
+Each detected face is aligned in memory (rotated so the eyes are level) and
+cropped, and the crops are fed to the embedding backend with detection
+skipped. Nothing is written to or re-read from disk, and no face is
+detected twice.
+
+Faces are plain dicts:
+
+    {"crop": ndarray, "box": {"x", "y", "w", "h"}, "confidence": float}
+
+With check_quality=True each face first goes through face_quality; a
+rejected face gets a "rejected" reason code and is not embedded.
+
+Group photos (group=True) use the group detector and are also detected in
+a FACE_GROUP_DETECT_TILES grid of overlapping tiles: the detector scales
+its input down to a small fixed size, where a back-row face in a whole
+classroom frame is only a few pixels wide. Detections from the tiles and
+the whole frame are merged, keeping the most confident of overlapping boxes.
+"""
+import math
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import mediapipe as mp
+import numpy as np
+from . import embedding_versions, face_engine, face_quality, inference_pool
+
+# Detector output is already a tight face box; DeepFace must not detect again.
+EMBED_OPTIONS = {"detector_backend": "skip"}
+
+# Extra context around the box that is rotated with the face, as a fraction of
+# the box size, so aligned crops do not have empty corners.
+_ALIGN_MARGIN = 0.25
+
+# Tiles overlap by this fraction of their size, so a face on a tile border
+# is whole in one of them.
+_TILE_OVERLAP = 0.25
+# A box covering this much of a more confident one is the same face.
+_SAME_FACE_OVERLAP = 0.5
+
+# keypoint normalised to the whole image, like MediaPipe's
+_Point = namedtuple("_Point", "x y")
+
+_config = {"group_tiles": 2}
+
+
+def init_app(app) -> None:
+    _config["group_tiles"] = app.config.get("FACE_GROUP_DETECT_TILES", 2)
+
+
+def _align_crop(image, box: Dict[str, int], keypoints) -> Optional[np.ndarray]:
+    x, y, w, h = box["x"], box["y"], box["w"], box["h"]
+    img_h, img_w = image.shape[:2]
+
+    if keypoints and len(keypoints) >= 2:
+        eyes = sorted(
+            ((kp.x * img_w, kp.y * img_h) for kp in keypoints[:2]), key=lambda p: p[0]
+        )
+        (lx, ly), (rx, ry) = eyes
+        angle = math.degrees(math.atan2(ry - ly, rx - lx))
+    else:
+        angle = 0.0
+
+    if abs(angle) < 1.0:
+        crop = image[y : y + h, x : x + w]
+        return crop if crop.size else None
+
+    # rotate only a padded region around the face, not the whole frame
+    mx, my = int(w * _ALIGN_MARGIN), int(h * _ALIGN_MARGIN)
+    x0, y0 = max(x - mx, 0), max(y - my, 0)
+    x1, y1 = min(x + w + mx, img_w), min(y + h + my, img_h)
+    region = image[y0:y1, x0:x1]
+    if region.size == 0:
+        return None
+
+    center = ((lx + rx) / 2 - x0, (ly + ry) / 2 - y0)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    rotated = cv2.warpAffine(
+        region, matrix, (region.shape[1], region.shape[0]), borderMode=cv2.BORDER_REPLICATE
+    )
+    crop = rotated[y - y0 : y - y0 + h, x - x0 : x - x0 + w]
+    return crop if crop.size else None
+
+
+def _detect(rgb_image, group: bool = False):
+    """Detections in rgb_image as ((x, y, w, h), keypoints, score)."""
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+    if group:
+        result = face_engine.detect(mp_image, group=True)
+    else:
+        result = face_engine.detect(mp_image)
+    detections = []
+    for detection in result.detections:
+        bbox = detection.bounding_box
+        detections.append(
+            (
+                (bbox.origin_x, bbox.origin_y, bbox.width, bbox.height),
+                detection.keypoints,
+                float(detection.categories[0].score) if detection.categories else 0.0,
+            )
+        )
+    return detections
+
+
+def _tiles(img_w: int, img_h: int, n: int) -> List[Tuple[int, int, int, int]]:
+    """n x n overlapping (x, y, w, h) tiles covering the image."""
+    tile_w = min(img_w, int(math.ceil(img_w / (n - (n - 1) * _TILE_OVERLAP))))
+    tile_h = min(img_h, int(math.ceil(img_h / (n - (n - 1) * _TILE_OVERLAP))))
+    xs = np.linspace(0, img_w - tile_w, n).astype(int)
+    ys = np.linspace(0, img_h - tile_h, n).astype(int)
+    return [(int(x), int(y), tile_w, tile_h) for y in ys for x in xs]
+
+
+def _overlap(a, b) -> float:
+    """Intersection of two (x, y, w, h) boxes as a fraction of the smaller one."""
+    iw = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    ih = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    return iw * ih / max(min(a[2] * a[3], b[2] * b[3]), 1)
+
+
+def _detect_group(rgb_image):
+    """Whole-frame and tiled detections, merged so each face appears once."""
+    img_h, img_w = rgb_image.shape[:2]
+    detections = _detect(rgb_image, group=True)
+    n = _config["group_tiles"]
+    if n > 1:
+        for tx, ty, tw, th in _tiles(img_w, img_h, n):
+            tile = np.ascontiguousarray(rgb_image[ty : ty + th, tx : tx + tw])
+            for (x, y, w, h), keypoints, score in _detect(tile, group=True):
+                points = [
+                    _Point((tx + kp.x * tw) / img_w, (ty + kp.y * th) / img_h)
+                    for kp in keypoints
+                ]
+                detections.append(((tx + x, ty + y, w, h), points, score))
+
+    kept = []
+    for detection in sorted(detections, key=lambda d: d[2], reverse=True):
+        if all(_overlap(detection[0], other[0]) < _SAME_FACE_OVERLAP for other in kept):
+            kept.append(detection)
+    return kept
+
+
+def detect_faces(
+    image, max_faces: Optional[int] = None, group: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Detect and align faces in a BGR image, largest first.
+    Returns an empty list when no usable face was found.
+    """
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    detections = _detect_group(rgb_image) if group else _detect(rgb_image)
+
+    img_h, img_w = image.shape[:2]
+    faces = []
+    for (bx, by, bw, bh), keypoints, score in detections:
+        x, y = max(bx, 0), max(by, 0)
+        box = {
+            "x": int(x),
+            "y": int(y),
+            "w": int(min(bw, img_w - x)),
+            "h": int(min(bh, img_h - y)),
+        }
+        if box["w"] <= 0 or box["h"] <= 0:
+            continue
+        crop = _align_crop(image, box, keypoints)
+        if crop is None:
+            continue
+        faces.append({"crop": crop, "box": box, "confidence": score})
+
+    faces.sort(key=lambda f: f["box"]["w"] * f["box"]["h"], reverse=True)
+    return faces[:max_faces] if max_faces else faces
+
+
+def embed_faces(faces: List[Dict[str, Any]]) -> List[np.ndarray]:
+    """Embed face crops in one batched call through the inference pool."""
+    embedding_versions.ensure_engine()
+    results = inference_pool.represent_many([f["crop"] for f in faces], **EMBED_OPTIONS)
+    return [np.asarray(r[0]["embedding"], dtype=np.float32).reshape(-1) for r in results]
+
+
+def embed_crop_inline(crop) -> np.ndarray:
+    """Embed one crop with the in-process model (used inside pool workers)."""
+    embedding = face_engine.represent(crop, **EMBED_OPTIONS)[0]["embedding"]
+    return np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+
+def _embed_accepted(
+    faces, check_quality: bool, group: bool = False
+) -> List[Optional[np.ndarray]]:
+    if check_quality:
+        for face in faces:
+            face["rejected"] = face_quality.assess(face, group=group)
+    accepted = [face for face in faces if not face.get("rejected")]
+    embeddings = iter(embed_faces(accepted) if accepted else [])
+    return [None if face.get("rejected") else next(embeddings) for face in faces]
+
+
+def largest_face(
+    image, check_quality: bool = False
+) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+    """
+    Detect, align and embed the largest face. Returns (face, embedding),
+    (None, None) without a face, or (face, None) if the face was rejected.
+    """
+    faces = detect_faces(image, max_faces=1)
+    if not faces:
+        return None, None
+    return faces[0], _embed_accepted(faces, check_quality)[0]
+
+
+def all_faces(
+    image, check_quality: bool = False, group: bool = False
+) -> List[Tuple[Dict[str, Any], Optional[np.ndarray]]]:
+    """
+    Detect, align and embed every face; returns [(face, embedding)] largest
+    first, with embedding None for rejected faces. group=True detects with
+    the group-photo detector and tiling, and gates with the group minimum
+    face size.
+    """
+    faces = detect_faces(image, group=group)
+    if not faces:
+        return []
+    return list(zip(faces, _embed_accepted(faces, check_quality, group=group)))
@@ -0,0 +1,280 @@
+"""
+Embedding rosters shared by every worker process through memory-mapped files.
+
+Each roster ("students", "teachers") is written once to FACE_ROSTER_DIR as
+
+    <name>.<token>.npy        float32 matrix, one unit-length row per vector
+    <name>.<token>.ids.npz    sidecar: owner id and group (class) id per row,
+                              and the embedding model version of the rows
+
+Rows are sorted by (group id, owner id), so a class is a contiguous slice
+of the mapped matrix and is matched without copying. Every worker maps the
+same file read-only, so the OS page cache holds one copy instead of one
+per gunicorn/waitress worker.
+
+The current token for a roster lives in the face_roster_generations table.
+Writers call `bump(name)` after committing a change, and workers check the
+token at most every FACE_ROSTER_CHECK_SECONDS. On a new token a worker maps
+the file if another worker already wrote it; otherwise it builds the file
+from MySQL.
+"""
+import glob
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from flask import current_app
+from sqlalchemy import update
+from ..extensions import db
+from ..models.face_roster_generation import FaceRosterGeneration
+from ..models.student import Student
+from ..models.teacher import Teacher
+from ..utils.embedding_codec import load_embedding
+from . import embedding_versions
+from .face_template_service import matching_vectors, student_templates, teacher_templates
+
+STUDENTS = "students"
+TEACHERS = "teachers"
+
+# group id used for students without a class
+NO_GROUP = -1
+
+_lock = threading.Lock()
+_state: Dict[str, Dict] = {
+    STUDENTS: {"roster": None, "checked": 0.0},
+    TEACHERS: {"roster": None, "checked": 0.0},
+}
+
+
+class Roster:
+    """Read-only view over one roster file."""
+
+    def __init__(self, token: str, matrix: np.ndarray, owner_ids: np.ndarray,
+                 group_ids: np.ndarray, owner_order: np.ndarray, version: str):
+        self.token = token
+        # embedding model version every row was produced by
+        self.version = version
+        self.matrix = matrix
+        self.owner_ids = owner_ids
+        self.group_ids = group_ids
+        # rows sorted by owner id, for per-person lookups
+        self.owner_order = owner_order
+        self._owner_sorted = owner_ids[owner_order]
+
+    def __len__(self) -> int:
+        return len(self.owner_ids)
+
+    def group_rows(self, group_id: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (owner_ids, matrix) views for one group (class)."""
+        key = NO_GROUP if group_id is None else group_id
+        lo = int(np.searchsorted(self.group_ids, key, side="left"))
+        hi = int(np.searchsorted(self.group_ids, key, side="right"))
+        return self.owner_ids[lo:hi], self.matrix[lo:hi]
+
+    def owner_rows(self, owner_id: int) -> np.ndarray:
+        """Return the matrix rows (centroid and templates) of one person."""
+        lo = int(np.searchsorted(self._owner_sorted, owner_id, side="left"))
+        hi = int(np.searchsorted(self._owner_sorted, owner_id, side="right"))
+        return np.asarray(self.matrix[np.sort(self.owner_order[lo:hi])])
+
+    @classmethod
+    def load(cls, directory: str, name: str, token: str) -> Optional["Roster"]:
+        matrix_path, ids_path = _paths(directory, name, token)
+        try:
+            matrix = np.load(matrix_path, mmap_mode="r")
+            with np.load(ids_path) as sidecar:
+                owner_ids = sidecar["owner_ids"]
+                group_ids = sidecar["group_ids"]
+                owner_order = sidecar["owner_order"]
+                version = str(sidecar["version"])
+        except FileNotFoundError:
+            # not written yet, or removed as stale by a worker on a newer token
+            return None
+        return cls(token, matrix, owner_ids, group_ids, owner_order, version)
+
+
+def _paths(directory: str, name: str, token: str) -> Tuple[str, str]:
+    base = os.path.join(directory, f"{name}.{token}")
+    return f"{base}.npy", f"{base}.ids.npz"
+
+
+def _directory() -> str:
+    return current_app.config["FACE_ROSTER_DIR"]
+
+
+# ---------- generation counter ----------
+def current_token(name: str) -> str:
+    # Rows are seeded by the migration; until the first bump a database
+    # created with create_all() has none.
+    token = (
+        db.session.query(FaceRosterGeneration.token)
+        .filter(FaceRosterGeneration.name == name)
+        .scalar()
+    )
+    return token or "initial"
+
+
+def bump(name: str) -> None:
+    """Record that roster `name` changed; call after committing the change."""
+    result = db.session.execute(
+        update(FaceRosterGeneration)
+        .where(FaceRosterGeneration.name == name)
+        .values(generation=FaceRosterGeneration.generation + 1, token=uuid.uuid4().hex)
+    )
+    if result.rowcount == 0:
+        db.session.add(FaceRosterGeneration(name=name, generation=1, token=uuid.uuid4().hex))
+    db.session.commit()
+    with _lock:
+        # re-check on the next lookup instead of waiting for the interval
+        _state[name]["checked"] = 0.0
+
+
+# ---------- building ----------
+def _centroid(blob, legacy, model, version):
+    # vectors of another model version are never matched
+    return load_embedding(blob, legacy) if embedding_versions.tag(model) == version else None
+
+
+def _student_rows(version: str) -> List[Tuple[int, int, np.ndarray]]:
+    rows = (
+        db.session.query(
+            Student.id,
+            Student.class_id,
+            Student.face_embedding_bin,
+            Student.face_embedding,
+            Student.face_embedding_model,
+        )
+        .filter((Student.face_embedding_bin.isnot(None)) | (Student.face_embedding.isnot(None)))
+        .all()
+    )
+    templates = student_templates((r[0] for r in rows), version)
+    return [
+        (student_id, NO_GROUP if class_id is None else class_id, vec)
+        for student_id, class_id, blob, legacy, model in rows
+        for vec in matching_vectors(
+            _centroid(blob, legacy, model, version), templates.get(student_id, [])
+        )
+    ]
+
+
+def _teacher_rows(version: str) -> List[Tuple[int, int, np.ndarray]]:
+    rows = (
+        db.session.query(
+            Teacher.id,
+            Teacher.face_embedding_bin,
+            Teacher.face_embedding,
+            Teacher.face_embedding_model,
+        )
+        .filter((Teacher.face_embedding_bin.isnot(None)) | (Teacher.face_embedding.isnot(None)))
+        .all()
+    )
+    templates = teacher_templates((r[0] for r in rows), version)
+    return [
+        (teacher_id, NO_GROUP, vec)
+        for teacher_id, blob, legacy, model in rows
+        for vec in matching_vectors(
+            _centroid(blob, legacy, model, version), templates.get(teacher_id, [])
+        )
+    ]
+
+
+_BUILDERS = {STUDENTS: _student_rows, TEACHERS: _teacher_rows}
+
+
+def _write(directory: str, name: str, token: str) -> Roster:
+    """Build roster `name` from the database, write it and return it (in memory)."""
+    # read afresh: the version is activated before the roster token is bumped
+    version = embedding_versions.active_version(refresh=True)
+    rows = _BUILDERS[name](version)
+    # stable sort keeps each person's rows (centroid first) together
+    rows.sort(key=lambda r: (r[1], r[0]))
+
+    if rows:
+        matrix = np.vstack([np.asarray(r[2], dtype=np.float32).reshape(-1) for r in rows])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+    else:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    owner_ids = np.asarray([r[0] for r in rows], dtype=np.int64)
+    group_ids = np.asarray([r[1] for r in rows], dtype=np.int64)
+
+    os.makedirs(directory, exist_ok=True)
+    matrix_path, ids_path = _paths(directory, name, token)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+    owner_order = np.argsort(owner_ids, kind="stable")
+
+    # sidecar first: a roster counts as written once its matrix file exists
+    np.savez(
+        ids_path + suffix + ".npz",
+        owner_ids=owner_ids,
+        group_ids=group_ids,
+        owner_order=owner_order,
+        version=np.array(version),
+    )
+    os.replace(ids_path + suffix + ".npz", ids_path)
+    np.save(matrix_path + suffix + ".npy", matrix)
+    os.replace(matrix_path + suffix + ".npy", matrix_path)
+
+    return Roster(token, matrix, owner_ids, group_ids, owner_order, version)
+
+
+def _remove_stale(directory: str, name: str, token: str) -> None:
+    keep = set(_paths(directory, name, token))
+    for path in glob.glob(os.path.join(glob.escape(directory), f"{name}.*")):
+        if path not in keep and not path.endswith(".tmp.npy") and not path.endswith(".tmp.npz"):
+            try:
+                # workers still mapping the old file keep their pages (POSIX unlink)
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_roster(name: str) -> Roster:
+    """Return the mapped roster, remapping or rebuilding when its token changed."""
+    now = time.monotonic()
+    interval = current_app.config.get("FACE_ROSTER_CHECK_SECONDS", 2.0)
+    with _lock:
+        state = _state[name]
+        roster = state["roster"]
+        if roster is not None and now - state["checked"] < interval:
+            return roster
+
+    token = current_token(name)
+    if roster is None or roster.token != token:
+        directory = _directory()
+        roster = Roster.load(directory, name, token)
+        if roster is None:
+            built = _write(directory, name, token)
+            _remove_stale(directory, name, token)
+            # map the file we just wrote so this worker shares pages too
+            roster = Roster.load(directory, name, token) or built
+
+    with _lock:
+        state["roster"] = roster
+        state["checked"] = now
+    return roster
+
+
+def init_app(app) -> None:
+    """Forget rosters mapped for a previous app (e.g. another test database)."""
+    with _lock:
+        for state in _state.values():
+            state["roster"] = None
+            state["checked"] = 0.0
+
+
+def status() -> Dict[str, Dict]:
+    """Token and row count of the rosters mapped by this process."""
+    with _lock:
+        return {
+            name: {
+                "token": state["roster"].token if state["roster"] else None,
+                "rows": len(state["roster"]) if state["roster"] else 0,
+                "version": state["roster"].version if state["roster"] else None,
+            }
+            for name, state in _state.items()
+        }
@@ -0,0 +1,201 @@
+"""
+In-process state for a face-attendance session while frames are captured.
+
+Per (attendance) session this keeps the set of students already marked
+PRESENT and the class's student names, so a re-recognised student costs
+no queries. The marked set is re-read from the database (one query) at
+most every FACE_SESSION_REFRESH_SECONDS, and dropped at once when
+save_records changes the session in this process, so a manual edit (e.g.
+a student set back to ABSENT) is not hidden by the cached set.
+
+Newly recognised students are written through at once: one upsert of their
+PRESENT records, their (outbox) notifications and one commit per frame.
+Nothing is held back in memory, so a mark survives a crash or a closed tab,
+and `finalize_face_attendance` on any worker sees every student recognised
+by the others. The upsert also turns an ABSENT written by a finalize that
+raced the capture into PRESENT, and notifies the student.
+
+Matching still scans the whole class rather than only unmarked students:
+with marked students removed from the candidates, a re-captured student
+would be matched to their closest unmarked lookalike and mark them PRESENT.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from ..extensions import db
+from ..models.attendance_record import AttendanceRecord
+from ..models.student import Student
+from ..models.user import User
+from ..utils.notification_helper import queue_notifications
+from . import notification_dispatcher
+from .attendance_service import upsert_records
+
+_lock = threading.Lock()
+_states: Dict[int, "SessionState"] = {}
+
+_config = {"idle_seconds": 3600.0, "refresh_seconds": 5.0}
+
+
+class SessionState:
+    """Marked students and names of one attendance session."""
+
+    def __init__(self, session_id: int, session_date, marked: Set[int],
+                 students: Dict[int, Tuple[int, str]]):
+        self.session_id = session_id
+        self.session_date = session_date
+        self.marked = marked
+        # student_id -> (user_id, name)
+        self.students = students
+        self.touched = time.monotonic()
+        self.refreshed = self.touched
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """Re-read the marked set (marks and edits made by other workers)."""
+        marked = _marked(self.session_id)
+        with self.lock:
+            self.marked = marked
+        self.refreshed = time.monotonic()
+
+    def student(self, student_id: int) -> Optional[Tuple[int, str]]:
+        """(user_id, name) of a student, loading students who joined the class later."""
+        if student_id not in self.students:
+            row = (
+                db.session.query(Student.user_id, User.name)
+                .join(User, User.id == Student.user_id)
+                .filter(Student.id == student_id)
+                .first()
+            )
+            if row is None:
+                return None
+            self.students[student_id] = (row.user_id, row.name)
+        return self.students[student_id]
+
+    def mark(self, student_ids) -> List[int]:
+        """Write PRESENT for students not marked yet; return the newly marked ids."""
+        new_ids = []
+        with self.lock:
+            for student_id in student_ids:
+                if student_id in self.marked:
+                    continue
+                self.marked.add(student_id)
+                new_ids.append(student_id)
+        if not new_ids:
+            return new_ids
+
+        try:
+            self._write(new_ids)
+        except Exception as e:
+            db.session.rollback()
+            with self.lock:
+                self.marked.difference_update(new_ids)
+            print("Face attendance write error:", e)
+            raise
+        return new_ids
+
+    def _write(self, student_ids: List[int]) -> None:
+        # another process (or a manual edit) may have written some already;
+        # an ABSENT from finalize is overwritten
+        current = dict(
+            db.session.query(AttendanceRecord.student_id, AttendanceRecord.status).filter(
+                AttendanceRecord.session_id == self.session_id,
+                AttendanceRecord.student_id.in_(student_ids),
+            )
+        )
+        present = [sid for sid in student_ids if current.get(sid) != "PRESENT"]
+        if not present:
+            return
+        upsert_records(
+            [
+                {
+                    "session_id": self.session_id,
+                    "student_id": sid,
+                    "status": "PRESENT",
+                    "remarks": None,
+                }
+                for sid in present
+            ]
+        )
+        queue_notifications(
+            {
+                "user_id": self.students[sid][0],
+                "title": "Attendance Marked (Face)",
+                "message": f"You were marked PRESENT on {self.session_date}.",
+                "type": "success",
+            }
+            for sid in present
+            if sid in self.students
+        )
+        db.session.commit()
+        notification_dispatcher.wake()
+
+
+def _marked(session_id: int) -> Set[int]:
+    return {
+        sid
+        for (sid,) in db.session.query(AttendanceRecord.student_id).filter(
+            AttendanceRecord.session_id == session_id,
+            AttendanceRecord.status == "PRESENT",
+        )
+    }
+
+
+def _load(session) -> SessionState:
+    marked = _marked(session.id)
+    students = {
+        row.id: (row.user_id, row.name)
+        for row in db.session.query(Student.id, Student.user_id, User.name)
+        .join(User, User.id == Student.user_id)
+        .filter(Student.class_id == session.class_id)
+    }
+    return SessionState(session.id, session.session_date, marked, students)
+
+
+def _evict_idle(now: float) -> None:
+    idle = [
+        session_id
+        for session_id, state in _states.items()
+        if now - state.touched > _config["idle_seconds"]
+    ]
+    for session_id in idle:
+        del _states[session_id]
+
+
+def get_state(session) -> SessionState:
+    """Return the capture state for an AttendanceSession, loading it on first use."""
+    now = time.monotonic()
+    with _lock:
+        _evict_idle(now)
+        state = _states.get(session.id)
+
+    if state is None:
+        state = _load(session)
+        with _lock:
+            state = _states.setdefault(session.id, state)
+    elif now - state.refreshed > _config["refresh_seconds"]:
+        state.refresh()
+    state.touched = now
+    return state
+
+
+def invalidate(session_id: int) -> None:
+    """Drop a session's capture state after its records were edited."""
+    with _lock:
+        _states.pop(session_id, None)
+
+
+def finalize(session) -> None:
+    """Forget the session's capture state (every mark is already written)."""
+    invalidate(session.id)
+
+
+def init_app(app) -> None:
+    _config["idle_seconds"] = app.config.get("FACE_SESSION_IDLE_SECONDS", 3600.0)
+    _config["refresh_seconds"] = app.config.get("FACE_SESSION_REFRESH_SECONDS", 5.0)
+    with _lock:
+        _states.clear()
+
+
+def status() -> Dict[str, int]:
+    with _lock:
+        return {"sessions": len(_states)}
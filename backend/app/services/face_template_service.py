@@ -0,0 +1,195 @@
+"""
+Multiple enrollment templates per student or teacher.
+
+Each registration adds a FaceTemplate (keeping at most FACE_MAX_TEMPLATES,
+oldest dropped first) and recomputes the owner's centroid, which is stored
+in the owner's face_embedding_bin column so the class cache, the kiosk
+index and older code paths keep working unchanged.
+
+Matching treats a person as the set {centroid} + templates and takes the
+maximum similarity over that set.
+
+Templates and centroids are tagged with the embedding model version that
+produced them, and only vectors of one version are ever combined or
+matched (see embedding_versions).
+"""
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from flask import current_app
+from ..extensions import db
+from ..models.face_template import FaceTemplate
+from ..models.student import Student
+from ..utils.embedding_codec import load_embedding
+from . import embedding_versions, face_engine
+
+DEFAULT_MAX_TEMPLATES = 5
+
+
+def _normalize_rows(vectors) -> np.ndarray:
+    matrix = np.vstack([np.asarray(v, dtype=np.float32).reshape(-1) for v in vectors])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def compute_centroid(vectors) -> np.ndarray:
+    """Return the normalised mean of the normalised vectors."""
+    mean = _normalize_rows(vectors).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return mean / norm if norm > 0 else mean
+
+
+def _owner_kwargs(owner) -> Dict:
+    return {"student_id": owner.id} if isinstance(owner, Student) else {"teacher_id": owner.id}
+
+
+def save_template_image(data: bytes) -> str:
+    """Store an aligned face crop (JPEG bytes) for later re-embedding; return its path."""
+    upload_dir = os.path.join("uploads", "faces", "templates")
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.jpg")
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return path
+
+
+def _owner_templates(owner) -> List[FaceTemplate]:
+    column = FaceTemplate.student_id if isinstance(owner, Student) else FaceTemplate.teacher_id
+    return (
+        FaceTemplate.query.filter(column == owner.id)
+        .order_by(FaceTemplate.created_at, FaceTemplate.id)
+        .all()
+    )
+
+
+def add_template(
+    owner,
+    embedding,
+    source: str = "REGISTER",
+    replace: bool = False,
+    max_templates: Optional[int] = None,
+    image_path: Optional[str] = None,
+    model_version: Optional[str] = None,
+) -> int:
+    """
+    Add embedding as a new template for a Student or Teacher and refresh the
+    owner's centroid. With replace=True existing templates are discarded,
+    as are templates of another model version. An embedding enrolled before
+    templates existed is kept as the first template. model_version defaults
+    to the version this process embeds with. The caller commits. Returns
+    the owner's template count.
+    """
+    if max_templates is None:
+        max_templates = current_app.config.get("FACE_MAX_TEMPLATES", DEFAULT_MAX_TEMPLATES)
+    max_templates = max(1, max_templates)
+    if model_version is None:
+        model_version = face_engine.model_version()
+    embedding_versions.pin_active()
+
+    templates = _owner_templates(owner)
+    if replace:
+        stale, templates = templates, []
+    else:
+        stale = [t for t in templates if embedding_versions.tag(t.embedding_model) != model_version]
+        templates = [t for t in templates if t not in stale]
+    for template in stale:
+        db.session.delete(template)
+
+    if (
+        not replace
+        and not templates
+        and owner.has_face_embedding
+        and embedding_versions.tag(owner.face_embedding_model) == model_version
+    ):
+        legacy = FaceTemplate(
+            source="LEGACY", embedding_model=model_version, **_owner_kwargs(owner)
+        )
+        legacy.set_embedding(owner.get_face_embedding())
+        db.session.add(legacy)
+        templates.append(legacy)
+
+    template = FaceTemplate(
+        source=source, embedding_model=model_version, image_path=image_path, **_owner_kwargs(owner)
+    )
+    template.set_embedding(embedding)
+    db.session.add(template)
+    templates.append(template)
+
+    while len(templates) > max_templates:
+        oldest = templates.pop(0)
+        if oldest.id is None:
+            db.session.expunge(oldest)
+        else:
+            db.session.delete(oldest)
+
+    owner.set_face_embedding(compute_centroid([t.get_embedding() for t in templates]))
+    owner.face_embedding_model = model_version
+    return len(templates)
+
+
+def _templates_by_owner(
+    column, owner_ids: Iterable[int], version: str
+) -> Dict[int, List[np.ndarray]]:
+    owner_ids = list(owner_ids)
+    if not owner_ids:
+        return {}
+    templates: Dict[int, List[np.ndarray]] = {}
+    rows = (
+        db.session.query(column, FaceTemplate.embedding, FaceTemplate.embedding_model)
+        .filter(column.in_(owner_ids))
+        .order_by(column, FaceTemplate.id)
+    )
+    for owner_id, blob, model in rows:
+        if embedding_versions.tag(model) != version:
+            continue
+        vec = load_embedding(blob, None)
+        if vec is not None:
+            templates.setdefault(owner_id, []).append(vec)
+    return templates
+
+
+def student_templates(student_ids: Iterable[int], version: str) -> Dict[int, List[np.ndarray]]:
+    """Return {student_id: [template vectors of version]} for the given students."""
+    return _templates_by_owner(FaceTemplate.student_id, student_ids, version)
+
+
+def teacher_templates(teacher_ids: Iterable[int], version: str) -> Dict[int, List[np.ndarray]]:
+    """Return {teacher_id: [template vectors of version]} for the given teachers."""
+    return _templates_by_owner(FaceTemplate.teacher_id, teacher_ids, version)
+
+
+def matching_vectors(centroid, templates: List[np.ndarray]) -> List[np.ndarray]:
+    """Vectors a person is matched against: the centroid, plus templates if there are several."""
+    if len(templates) > 1:
+        return ([centroid] if centroid is not None else []) + templates
+    if centroid is not None:
+        return [centroid]
+    return templates
+
+
+def owner_matrix(owner) -> Optional[np.ndarray]:
+    """Normalised matrix of every active-version vector the owner is matched against, or None."""
+    version = embedding_versions.active_version()
+    templates = [
+        t.get_embedding()
+        for t in _owner_templates(owner)
+        if embedding_versions.tag(t.embedding_model) == version
+    ]
+    centroid = (
+        owner.get_face_embedding()
+        if embedding_versions.tag(owner.face_embedding_model) == version
+        else None
+    )
+    vectors = matching_vectors(centroid, [t for t in templates if t is not None])
+    return _normalize_rows(vectors) if vectors else None
+
+
+def best_distance(matrix: np.ndarray, embedding) -> float:
+    """Smallest cosine distance between embedding and any row of matrix."""
+    query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(query)
+    if norm > 0:
+        query = query / norm
+    return float(1.0 - np.max(matrix @ query))
@@ -0,0 +1,135 @@
+"""
+Dedup cache for repeated face-attendance uploads.
+
+When the network stutters the attendance UI re-sends the same (or a
+re-encoded, nearly identical) frame. Each entry maps a frame fingerprint,
+scoped to one (class, subject, date, mode) session, to the response that
+was computed for it, so a repeat skips decode, detection and embedding.
+
+Lookup first tries the SHA-1 of the uploaded bytes (exact re-send), then a
+256-bit difference hash of a 1/8-scale grayscale decode (re-encoded copy)
+within FACE_FRAME_CACHE_MAX_DISTANCE bits. A dHash barely changes when one
+face replaces another in front of the same background, so near-duplicate
+hits are only served for results stored with similar=True: frames in which
+no face was found. A result that matched (or rejected) a face is reused for
+exact re-sends only.
+
+The cache is an LRU bounded to FACE_FRAME_CACHE_SIZE entries per worker
+process, with FACE_FRAME_CACHE_TTL_SECONDS expiry. `metrics()` reports
+hit/miss counters.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import cv2
+import numpy as np
+
+_HASH_SIZE = 16
+
+_lock = threading.Lock()
+# (scope, sha1) -> (dhash, result, expires_at)
+_entries: "OrderedDict[Tuple[Hashable, str], Tuple[Optional[int], Dict[str, Any], float]]" = (
+    OrderedDict()
+)
+
+_config = {"size": 256, "ttl": 120.0, "max_distance": 8}
+
+_metrics = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0}
+
+
+def init_app(app) -> None:
+    _config["size"] = app.config.get("FACE_FRAME_CACHE_SIZE", 256)
+    _config["ttl"] = app.config.get("FACE_FRAME_CACHE_TTL_SECONDS", 120.0)
+    _config["max_distance"] = app.config.get("FACE_FRAME_CACHE_MAX_DISTANCE", 8)
+    clear()
+
+
+def enabled() -> bool:
+    return _config["size"] > 0
+
+
+def difference_hash(data: bytes) -> Optional[int]:
+    """256-bit dHash of the image bytes, or None if they do not decode."""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (_HASH_SIZE + 1, _HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def lookup(scope: Hashable, data: bytes) -> Tuple[Optional[Dict[str, Any]], Tuple]:
+    """
+    Return (cached_result or None, key). Pass key to `store` after
+    computing the result for a miss.
+    """
+    sha = hashlib.sha1(data).hexdigest()
+    if not enabled():
+        return None, (scope, sha, None)
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get((scope, sha))
+        if entry and entry[2] > now:
+            _entries.move_to_end((scope, sha))
+            _metrics["exact_hits"] += 1
+            return entry[1], (scope, sha, entry[0])
+
+    dhash = difference_hash(data)
+    with _lock:
+        if dhash is not None:
+            for (entry_scope, entry_sha), (entry_hash, result, expires) in reversed(
+                _entries.items()
+            ):
+                if (
+                    entry_scope == scope
+                    and entry_hash is not None
+                    and expires > now
+                    and _distance(entry_hash, dhash) <= _config["max_distance"]
+                ):
+                    _entries.move_to_end((entry_scope, entry_sha))
+                    _metrics["similar_hits"] += 1
+                    return result, (scope, sha, dhash)
+        _metrics["misses"] += 1
+    return None, (scope, sha, dhash)
+
+
+def store(key: Tuple, result: Dict[str, Any], similar: bool = False) -> None:
+    """
+    Cache result for the frame identified by key (from `lookup`). With
+    similar=True the result is also returned for re-encoded copies.
+    """
+    if not enabled():
+        return
+    scope, sha, dhash = key
+    if not similar:
+        dhash = None
+    with _lock:
+        _entries[(scope, sha)] = (dhash, result, time.monotonic() + _config["ttl"])
+        _entries.move_to_end((scope, sha))
+        while len(_entries) > _config["size"]:
+            _entries.popitem(last=False)
+            _metrics["evictions"] += 1
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        snapshot = dict(_metrics)
+        snapshot["size"] = len(_entries)
+    hits = snapshot["exact_hits"] + snapshot["similar_hits"]
+    total = hits + snapshot["misses"]
+    snapshot["hit_rate"] = round(hits / total, 3) if total else None
+    snapshot["max_size"] = _config["size"]
+    snapshot["ttl_seconds"] = _config["ttl"]
+    return snapshot
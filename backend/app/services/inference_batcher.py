@@ -0,0 +1,124 @@
+"""
+Micro-batching scheduler for face embedding.
+
+Concurrent requests (e.g. many teachers starting face attendance at the same
+time) each need one `represent` call. Running them one by one keeps the
+model at batch size 1. The scheduler queues requests for up to
+FACE_BATCH_MAX_WAIT_MS (or until FACE_BATCH_MAX_SIZE are waiting), runs the
+images that share the same represent options as one batched call, and
+resolves each caller's future with its own result.
+
+Batching happens per web worker process; `run_batch` decides where the
+batch actually executes (inline or in the inference pool).
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+from ..utils.errors import APIError
+
+# run_batch(images, kwargs) -> Future resolving to one entry per image, each
+# either a represent() result list or the exception raised for that image.
+RunBatch = Callable[[List[Any], Dict[str, Any]], Future]
+
+
+class _Request:
+    __slots__ = ("image", "kwargs", "key", "future")
+
+    def __init__(self, image, kwargs: Dict[str, Any]):
+        self.image = image
+        self.kwargs = kwargs
+        self.key = tuple(sorted(kwargs.items()))
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """Collects submitted images into batches on a dispatcher thread."""
+
+    def __init__(self, run_batch: RunBatch, max_batch_size: int = 8, max_wait_ms: float = 10):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"batches": 0, "items": 0, "max_batch": 0}
+
+    def submit(self, image, **kwargs) -> Future:
+        """Queue one image; the returned future resolves to its represent() result."""
+        request = _Request(image, kwargs)
+        self._ensure_thread()
+        self._queue.put(request)
+        return request.future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["avg_batch"] = (
+            round(snapshot["items"] / snapshot["batches"], 2) if snapshot["batches"] else None
+        )
+        snapshot["max_batch_size"] = self.max_batch_size
+        snapshot["max_wait_ms"] = round(self.max_wait * 1000, 1)
+        return snapshot
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name="face-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            groups: Dict[Tuple, List[_Request]] = {}
+            for request in batch:
+                # callers that timed out while queued cancel their future
+                if request.future.set_running_or_notify_cancel():
+                    groups.setdefault(request.key, []).append(request)
+            for requests in groups.values():
+                self._dispatch(requests)
+
+    def _dispatch(self, requests: List[_Request]) -> None:
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(requests)
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(requests))
+
+        try:
+            batch_future = self.run_batch([r.image for r in requests], requests[0].kwargs)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        def resolve(done: Future) -> None:
+            # a pool reset or shutdown(cancel_futures=True) cancels the batch;
+            # exception() would raise CancelledError here and strand every caller
+            if done.cancelled():
+                error = APIError("Face recognition unavailable", status_code=503)
+            else:
+                error = done.exception()
+            outcomes = [error] * len(requests) if error else done.result()
+            for request, outcome in zip(requests, outcomes):
+                if isinstance(outcome, BaseException):
+                    request.future.set_exception(outcome)
+                else:
+                    request.future.set_result(outcome)
+
+        batch_future.add_done_callback(resolve)
@@ -0,0 +1,292 @@
+"""
+Bounded process pool for face embedding.
+
+Face inference is CPU-heavy and holds the GIL for long stretches, so running
+it in the Flask request thread starves ordinary API calls. When
+FACE_POOL_WORKERS > 0, `represent` ships the decoded image to a dedicated
+pool of inference processes (each with its own warm ArcFace model) and
+waits for the result with a per-request timeout.
+
+Backpressure: at most FACE_POOL_MAX_PENDING requests may be queued or
+running per web worker; beyond that callers get a 503 straight away rather
+than piling up behind the model. `metrics()` reports queue depth and
+outcome counters.
+
+With FACE_POOL_WORKERS = 0 (the default) inference runs inline, as before.
+
+Either way, concurrent calls are first grouped by the micro-batching
+scheduler (see inference_batcher) unless FACE_BATCH_MAX_SIZE is 1.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List
+import numpy as np
+from ..utils.errors import APIError
+from . import face_engine
+from .inference_batcher import MicroBatcher
+
+_lock = threading.Lock()
+_executor = None
+_batcher = None
+_slots = threading.BoundedSemaphore(8)
+
+_config: Dict[str, Any] = {
+    "workers": 0,
+    "max_pending": 8,
+    "timeout": 30.0,
+    "detector_model_path": None,
+    "backend_name": "deepface",
+    "backend_options": {},
+    "batch_max_size": 1,
+    "batch_max_wait_ms": 10.0,
+}
+
+_metrics: Dict[str, Any] = {
+    "pending": 0,
+    "completed": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "failures": 0,
+    "workers_ready": 0,
+    "total_seconds": 0.0,
+}
+
+
+def _incr(key: str, amount=1) -> None:
+    with _lock:
+        _metrics[key] += amount
+
+
+# ---------- worker process side ----------
+def init_inference_worker(detector_model_path: str, backend_name: str, backend_options) -> None:
+    """Process initializer: configure and warm the face engine in the child."""
+    face_engine.configure(detector_model_path, backend_name, backend_options)
+    face_engine.warm_up()
+
+
+def _worker_ping() -> bool:
+    return face_engine.status()["ready"]
+
+
+def _worker_represent_batch(images, kwargs) -> List[Any]:
+    outcomes = face_engine.represent_batch(images, **kwargs)
+    # float32 arrays pickle far smaller than lists of Python floats
+    return [
+        outcome
+        if isinstance(outcome, BaseException)
+        else [
+            {**r, "embedding": np.asarray(r["embedding"], dtype=np.float32).reshape(-1)}
+            for r in outcome
+        ]
+        for outcome in outcomes
+    ]
+
+
+# ---------- web worker side ----------
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=_config["workers"],
+                # TensorFlow (and other model runtimes) are not fork-safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_inference_worker,
+                initargs=(
+                    _config["detector_model_path"],
+                    _config["backend_name"],
+                    _config["backend_options"],
+                ),
+            )
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _lock:
+        broken, _executor = _executor, None
+        _metrics["workers_ready"] = 0
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def use_backend(backend_name: str, backend_options) -> None:
+    """Embed with another backend from now on; pool workers are respawned."""
+    if (backend_name, backend_options) == (_config["backend_name"], _config["backend_options"]):
+        return
+    _config["backend_name"], _config["backend_options"] = backend_name, backend_options
+    if _config["workers"] > 0:
+        _reset_executor()
+
+
+def _run_inline_batch(images, kwargs) -> Future:
+    future = Future()
+    future.set_result(face_engine.represent_batch(images, **kwargs))
+    return future
+
+
+def _run_pool_batch(images, kwargs) -> Future:
+    try:
+        return _get_executor().submit(_worker_represent_batch, images, kwargs)
+    except Exception as e:
+        _reset_executor()
+        raise BrokenProcessPool(str(e))
+
+
+def _on_done(started: float, count: int):
+    remaining = [count]
+    failed = [False]
+
+    def callback(future):
+        with _lock:
+            remaining[0] -= 1
+            if future.cancelled() or future.exception() is not None:
+                failed[0] = True
+            if remaining[0]:
+                return
+            _metrics["pending"] -= 1
+            if not failed[0]:
+                _metrics["completed"] += 1
+                _metrics["total_seconds"] += time.perf_counter() - started
+        # The slot is held until the worker actually finishes, even if the
+        # caller already gave up, so queue depth reflects real load.
+        _slots.release()
+
+    return callback
+
+
+def _submit(images, kwargs) -> List[Future]:
+    """One future per image when batching, otherwise one for the whole list."""
+    if _batcher is not None:
+        return [_batcher.submit(image, **kwargs) for image in images]
+    if _config["workers"] <= 0:
+        return [_run_inline_batch(images, kwargs)]
+    return [_get_executor().submit(_worker_represent_batch, images, kwargs)]
+
+
+def _gather(futures: List[Future], timeout=None) -> List[List[Dict[str, Any]]]:
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = [
+        f.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        for f in futures
+    ]
+    if _batcher is not None:
+        return results
+    outcomes = results[0]
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return outcomes
+
+
+def represent_many(images, **kwargs) -> List[List[Dict[str, Any]]]:
+    """
+    Return DeepFace.represent-style results for each image, computed in the
+    inference pool (or inline when the pool is disabled). The images run as
+    one batched model call and count as a single queued request.
+    Raises APIError 503 when the queue is full and 504 on timeout.
+    """
+    images = list(images)
+    if not images:
+        return []
+
+    if _config["workers"] <= 0:
+        started = time.perf_counter()
+        results = _gather(_submit(images, kwargs))
+        _incr("completed")
+        _incr("total_seconds", time.perf_counter() - started)
+        return results
+
+    if not _slots.acquire(blocking=False):
+        _incr("rejected")
+        raise APIError("Face recognition is busy, please retry shortly", status_code=503)
+
+    _incr("pending")
+    try:
+        futures = _submit(images, kwargs)
+    except Exception:
+        _slots.release()
+        _incr("pending", -1)
+        _incr("failures")
+        _reset_executor()
+        raise APIError("Face recognition unavailable", status_code=503)
+
+    callback = _on_done(time.perf_counter(), len(futures))
+    for future in futures:
+        future.add_done_callback(callback)
+
+    try:
+        return _gather(futures, timeout=_config["timeout"])
+    except FutureTimeout:
+        for future in futures:
+            future.cancel()
+        _incr("timeouts")
+        raise APIError("Face recognition timed out", status_code=504)
+    except BrokenProcessPool:
+        _incr("failures")
+        _reset_executor()
+        raise APIError("Face recognition unavailable", status_code=503)
+
+
+def represent(image, **kwargs) -> List[Dict[str, Any]]:
+    """represent_many for a single image."""
+    return represent_many([image], **kwargs)[0]
+
+
+def _warm_workers() -> None:
+    executor = _get_executor()
+    futures = [executor.submit(_worker_ping) for _ in range(_config["workers"])]
+    for future in futures:
+        try:
+            if future.result():
+                _incr("workers_ready")
+        except Exception as e:
+            print("Inference worker warm-up failed:", e)
+
+
+def metrics() -> Dict[str, Any]:
+    """Return queue depth and outcome counters for monitoring."""
+    with _lock:
+        snapshot = dict(_metrics)
+    completed = snapshot.pop("total_seconds")
+    snapshot["avg_seconds"] = (
+        round(completed / snapshot["completed"], 4) if snapshot["completed"] else None
+    )
+    snapshot["mode"] = "pool" if _config["workers"] > 0 else "inline"
+    snapshot["workers"] = _config["workers"]
+    snapshot["max_pending"] = _config["max_pending"]
+    snapshot["batching"] = _batcher.stats() if _batcher is not None else None
+    return snapshot
+
+
+def is_ready() -> bool:
+    if _config["workers"] <= 0:
+        return True
+    return _metrics["workers_ready"] >= _config["workers"]
+
+
+def init_app(app) -> None:
+    """Read pool settings from config and pre-spawn workers if warm-up is on."""
+    global _slots, _batcher
+    _config["workers"] = app.config.get("FACE_POOL_WORKERS", 0)
+    _config["max_pending"] = app.config.get("FACE_POOL_MAX_PENDING", 8)
+    _config["timeout"] = app.config.get("FACE_POOL_TIMEOUT_SECONDS", 30.0)
+    _config["detector_model_path"] = app.config["FACE_DETECTOR_MODEL_PATH"]
+    _config["backend_name"], _config["backend_options"] = face_engine.backend_settings(app.config)
+    _config["batch_max_size"] = app.config.get("FACE_BATCH_MAX_SIZE", 1)
+    _config["batch_max_wait_ms"] = app.config.get("FACE_BATCH_MAX_WAIT_MS", 10.0)
+    _slots = threading.BoundedSemaphore(_config["max_pending"])
+
+    _batcher = None
+    if _config["batch_max_size"] > 1:
+        _batcher = MicroBatcher(
+            _run_pool_batch if _config["workers"] > 0 else _run_inline_batch,
+            max_batch_size=_config["batch_max_size"],
+            max_wait_ms=_config["batch_max_wait_ms"],
+        )
+
+    if _config["workers"] > 0 and app.config.get("FACE_ENGINE_WARMUP", True):
+        threading.Thread(target=_warm_workers, name="inference-pool-warmup", daemon=True).start()
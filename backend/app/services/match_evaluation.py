@@ -0,0 +1,258 @@
+"""
+Offline match-quality evaluation: FAR/FRR/ROC of face matching on a
+labeled probe set against the enrolled gallery.
+
+The gallery is the student roster (centroid and template rows, labeled by
+student id); probes are embeddings labeled with the student they show, or
+UNKNOWN for people who are not enrolled. A probe is scored against an
+enrolled student as the maximum similarity over that student's rows, the
+same rule face_attendance uses.
+
+Every probe/student score is a comparison:
+
+- genuine   the probe against its own student; rejected when its distance
+            exceeds the threshold (false reject)
+- impostor  the probe against any other student; accepted when within the
+            threshold (false accept)
+
+Scores are computed as probe-block x gallery matrix products. Distances are
+binned on a fixed threshold grid as they are produced, so memory stays
+bounded for any number of comparisons, and FAR/FRR at every grid threshold
+come out of one cumulative sum.
+
+Besides the verification curve, `evaluate` reports closed/open-set
+identification at the chosen threshold, as attendance sees it: the best
+match in the gallery is correct, wrong, below threshold, or (for unknown
+probes) a false accept.
+
+StageTimer collects per-stage latencies (decode, detect, quality, embed,
+match) for the report.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+# probe label of people who are not enrolled
+UNKNOWN = -1
+
+# threshold grid (cosine distance) the curves are reported on
+GRID_STEP = 0.005
+GRID_MAX = 2.0
+
+# similarities computed per block (float32: 4M = 16 MB)
+BLOCK_ELEMENTS = 4 * 1024 * 1024
+
+
+def _normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def threshold_grid(step: float = GRID_STEP, maximum: float = GRID_MAX) -> np.ndarray:
+    return np.round(np.arange(0.0, maximum + step / 2, step), 6)
+
+
+class ScoreHistogram:
+    """Counts of distances at or below each grid threshold, accumulated blockwise."""
+
+    def __init__(self, grid: np.ndarray):
+        self.grid = grid
+        self._bins = np.zeros(len(grid) + 1, dtype=np.int64)
+
+    def add(self, distances: np.ndarray) -> None:
+        # bin k holds distances in (grid[k-1], grid[k]]
+        self._bins += np.bincount(
+            np.searchsorted(self.grid, distances.ravel(), side="left"),
+            minlength=len(self._bins),
+        )
+
+    @property
+    def total(self) -> int:
+        return int(self._bins.sum())
+
+    def at_or_below(self) -> np.ndarray:
+        """Number of distances <= each grid threshold."""
+        return np.cumsum(self._bins)[:-1]
+
+
+def score_probes(
+    gallery,
+    gallery_labels: Sequence[int],
+    probes,
+    probe_labels: Sequence[int],
+    grid: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Score every probe against every enrolled identity. Returns genuine and
+    impostor histograms plus, per probe, the best identity and its distance
+    and the distance to its own identity (NaN if not enrolled).
+    """
+    grid = threshold_grid() if grid is None else grid
+    gallery_labels = np.asarray(gallery_labels, dtype=np.int64)
+    probe_labels = np.asarray(probe_labels, dtype=np.int64)
+
+    # rows of one identity must be contiguous for reduceat
+    order = np.argsort(gallery_labels, kind="stable")
+    gallery = _normalize_rows(gallery)[order]
+    gallery_labels = gallery_labels[order]
+    starts = np.flatnonzero(np.r_[True, gallery_labels[1:] != gallery_labels[:-1]])
+    identities = gallery_labels[starts]
+    probes = _normalize_rows(probes)
+
+    genuine, impostor = ScoreHistogram(grid), ScoreHistogram(grid)
+    best_label = np.empty(len(probes), dtype=np.int64)
+    best_distance = np.empty(len(probes), dtype=np.float32)
+    own_distance = np.full(len(probes), np.nan, dtype=np.float32)
+
+    step = max(1, BLOCK_ELEMENTS // max(1, len(gallery)))
+    for lo in range(0, len(probes), step):
+        hi = min(lo + step, len(probes))
+        distances = 1.0 - np.maximum.reduceat(probes[lo:hi] @ gallery.T, starts, axis=1)
+        is_own = identities[None, :] == probe_labels[lo:hi, None]
+
+        genuine.add(distances[is_own])
+        impostor.add(distances[~is_own])
+
+        best = np.argmin(distances, axis=1)
+        best_label[lo:hi] = identities[best]
+        best_distance[lo:hi] = distances[np.arange(hi - lo), best]
+        rows, cols = np.nonzero(is_own)
+        own_distance[lo + rows] = distances[rows, cols]
+
+    return {
+        "genuine": genuine,
+        "impostor": impostor,
+        "best_label": best_label,
+        "best_distance": best_distance,
+        "own_distance": own_distance,
+        "probe_labels": probe_labels,
+    }
+
+
+def roc(genuine: ScoreHistogram, impostor: ScoreHistogram) -> Dict[str, np.ndarray]:
+    """FAR and FRR at every grid threshold (a match is distance <= threshold)."""
+    far = impostor.at_or_below() / max(1, impostor.total)
+    frr = 1.0 - genuine.at_or_below() / max(1, genuine.total)
+    return {"threshold": genuine.grid, "far": far, "frr": frr}
+
+
+def equal_error_rate(curve: Dict[str, np.ndarray]) -> Dict[str, float]:
+    """Grid point where FAR and FRR are closest."""
+    i = int(np.argmin(np.abs(curve["far"] - curve["frr"])))
+    return {
+        "threshold": float(curve["threshold"][i]),
+        "rate": float((curve["far"][i] + curve["frr"][i]) / 2),
+    }
+
+
+def threshold_for_far(curve: Dict[str, np.ndarray], target_far: float) -> float:
+    """Largest grid threshold whose FAR does not exceed target_far."""
+    allowed = np.flatnonzero(curve["far"] <= target_far)
+    return float(curve["threshold"][allowed[-1]]) if allowed.size else 0.0
+
+
+def identification(scores: Dict[str, Any], threshold: float) -> Dict[str, float]:
+    """Rank-1 outcomes at threshold, as attendance would mark them."""
+    labels = scores["probe_labels"]
+    accepted = scores["best_distance"] <= threshold
+    correct = scores["best_label"] == labels
+    enrolled = ~np.isnan(scores["own_distance"])
+    unknown = ~enrolled
+
+    def rate(mask, of):
+        return float(mask[of].mean()) if of.any() else 0.0
+
+    return {
+        "enrolled_probes": int(enrolled.sum()),
+        "unknown_probes": int(unknown.sum()),
+        # enrolled probes marked as themselves
+        "true_accept_rate": rate(accepted & correct, enrolled),
+        # enrolled probes marked as somebody else
+        "misidentification_rate": rate(accepted & ~correct, enrolled),
+        # enrolled probes not marked at all
+        "false_reject_rate": rate(~accepted, enrolled),
+        # people not enrolled marked as a student
+        "false_accept_rate": rate(accepted, unknown),
+    }
+
+
+def _at(curve: Dict[str, np.ndarray], threshold: float) -> Dict[str, float]:
+    i = int(np.argmin(np.abs(curve["threshold"] - threshold)))
+    return {
+        "threshold": float(curve["threshold"][i]),
+        "far": float(curve["far"][i]),
+        "frr": float(curve["frr"][i]),
+    }
+
+
+def evaluate(
+    gallery,
+    gallery_labels: Sequence[int],
+    probes,
+    probe_labels: Sequence[int],
+    target_far: float = 0.001,
+    current_threshold: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Full report: ROC curve, EER, the threshold meeting target_far, and
+    verification/identification rates there (and at current_threshold).
+    """
+    scores = score_probes(gallery, gallery_labels, probes, probe_labels)
+    curve = roc(scores["genuine"], scores["impostor"])
+    chosen = threshold_for_far(curve, target_far)
+
+    report = {
+        "gallery_rows": int(len(gallery_labels)),
+        "identities": int(len(np.unique(gallery_labels))),
+        "probes": int(len(probe_labels)),
+        "genuine_comparisons": scores["genuine"].total,
+        "impostor_comparisons": scores["impostor"].total,
+        "eer": equal_error_rate(curve),
+        "target_far": target_far,
+        "recommended": {**_at(curve, chosen), **identification(scores, chosen)},
+        "roc": [
+            {"threshold": float(t), "far": float(a), "frr": float(r)}
+            for t, a, r in zip(curve["threshold"], curve["far"], curve["frr"])
+        ],
+    }
+    if current_threshold is not None:
+        report["current"] = {
+            **_at(curve, current_threshold),
+            **identification(scores, current_threshold),
+        }
+    return report
+
+
+class StageTimer:
+    """Wall-clock latency samples per pipeline stage."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float, count: int = 1) -> None:
+        """Add a sample; a batch of count items is recorded as its per-item time."""
+        self.samples.setdefault(name, []).extend([seconds / count] * count)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, values in self.samples.items():
+            ms = np.asarray(values) * 1000
+            result[name] = {
+                "count": len(ms),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return result
@@ -0,0 +1,137 @@
+"""
+Background delivery of queued notifications (the transactional outbox).
+
+Code that notifies many users at once (attendance saves, finalize, face
+attendance) calls `queue_notifications`, which writes outbox rows with one
+multi-row INSERT inside its own transaction: the notifications exist if and
+only if the change that caused them was committed, and the request does not
+pay for the fan-out.
+
+A daemon thread per serving process, started by the first request it
+handles (so `flask db upgrade`, the seed script and other CLI runs never
+deliver against a half-migrated schema), drains the outbox at once, when
+woken by `wake()` after queued rows are committed, and every
+NOTIFICATION_DISPATCH_INTERVAL_SECONDS. Each batch of up
+to NOTIFICATION_DISPATCH_BATCH due rows (deliver_after unset or passed,
+see coalescing in `queue_notifications`) is copied into notifications
+with one INSERT ... SELECT and deleted from the outbox in the same
+transaction. Rows are locked with FOR UPDATE SKIP LOCKED where the
+database supports it, so several processes can drain concurrently
+without delivering a row twice.
+
+NOTIFICATION_DISPATCHER=0 (or TESTING) keeps the thread from starting;
+`drain()` can then be called directly.
+"""
+import threading
+from datetime import datetime
+from typing import Dict
+from flask import current_app
+from sqlalchemy import delete, insert, or_, select
+from ..extensions import db
+from ..models.notification import Notification
+from ..models.notification_outbox import NotificationOutbox
+
+_wake = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {"dispatched": 0, "errors": 0}
+_config = {"batch": 500, "interval": 1.0, "thread": None}
+
+
+def _lock_batch(limit: int):
+    due = or_(
+        NotificationOutbox.deliver_after.is_(None),
+        NotificationOutbox.deliver_after <= datetime.utcnow(),
+    )
+    query = select(NotificationOutbox.id).where(due).order_by(NotificationOutbox.id).limit(limit)
+    if db.session.get_bind().dialect.name in ("mysql", "mariadb", "postgresql"):
+        query = query.with_for_update(skip_locked=True)
+    return [row_id for (row_id,) in db.session.execute(query)]
+
+
+def drain_batch(limit: int = None) -> int:
+    """Move one batch from the outbox into notifications; return rows moved."""
+    limit = limit or _config["batch"]
+    try:
+        ids = _lock_batch(limit)
+        if ids:
+            columns = ("user_id", "title", "message", "type", "created_at")
+            db.session.execute(
+                insert(Notification).from_select(
+                    columns,
+                    select(*(getattr(NotificationOutbox, c) for c in columns))
+                    .where(NotificationOutbox.id.in_(ids))
+                    .order_by(NotificationOutbox.id),
+                )
+            )
+            db.session.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(ids)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    with _stats_lock:
+        _stats["dispatched"] += len(ids)
+    return len(ids)
+
+
+def drain() -> int:
+    """Deliver everything due; return rows moved."""
+    total = 0
+    while True:
+        moved = drain_batch()
+        total += moved
+        if moved < _config["batch"]:
+            return total
+
+
+def _start(app) -> None:
+    """Start this process's dispatcher thread unless it is running or disabled."""
+    if app.testing or not app.config.get("NOTIFICATION_DISPATCHER", True):
+        return
+    with _stats_lock:
+        # a thread started before a fork (preloaded app) is not alive in the child
+        if _config["thread"] is None or not _config["thread"].is_alive():
+            _config["thread"] = threading.Thread(
+                target=_run, args=(app,), name="notification-dispatcher", daemon=True
+            )
+            _config["thread"].start()
+
+
+def _ensure_running() -> None:
+    """before_request hook: start the thread in the process serving requests."""
+    thread = _config["thread"]
+    if thread is None or not thread.is_alive():
+        _start(current_app._get_current_object())
+
+
+def wake() -> None:
+    """Ask the dispatcher to drain now (call after committing queued rows)."""
+    _wake.set()
+
+
+def _run(app) -> None:
+    while True:
+        _wake.wait(_config["interval"])
+        _wake.clear()
+        with app.app_context():
+            try:
+                drain()
+            except Exception as e:
+                with _stats_lock:
+                    _stats["errors"] += 1
+                print("Notification dispatch error:", e)
+            finally:
+                db.session.remove()
+
+
+def init_app(app) -> None:
+    _config["batch"] = app.config.get("NOTIFICATION_DISPATCH_BATCH", 500)
+    _config["interval"] = app.config.get("NOTIFICATION_DISPATCH_INTERVAL_SECONDS", 1.0)
+    if app.config.get("NOTIFICATION_DISPATCHER", True):
+        app.before_request(_ensure_running)
+
+
+def status() -> Dict[str, int]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["queued"] = db.session.query(NotificationOutbox.id).count()
+    return stats
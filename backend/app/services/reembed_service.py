@@ -0,0 +1,394 @@
+"""
+Background re-embedding of every stored face into a new model version.
+
+When FACE_EMBEDDING_BACKEND or FACE_EMBEDDING_VERSION changes, the stored
+vectors belong to the old model. A FaceReembedJob recomputes them from the
+aligned crops kept on disk:
+
+- each template's own aligned crop (FaceTemplate.image_path), falling
+  back to the owner's stored image;
+- for people enrolled before templates existed, the student's
+  face_image_path or the teacher's teacher_{id}.jpg.
+
+Owner images may predate the aligned pipeline: students' are unaligned
+detector crops and legacy teachers' are the whole uploaded frame. They go
+through face_pipeline detection and alignment first; a student crop with
+no detectable face is used as is, a teacher image without one fails.
+
+Crops are embedded with the configured (target) backend across a dedicated
+process pool, in batches. Each finished batch is staged in
+face_staged_embeddings and committed, which doubles as the checkpoint: a
+resumed job skips every staged item. Meanwhile the active version, and so
+all matching, stays on the old model.
+
+Once every item is staged (faces enrolled during the run are picked up in
+further passes), one transaction re-lists the items, writes the staged
+vectors into the templates and owners, recomputes centroids and activates
+the new version. The rosters are then bumped and the kiosk index rebuilt,
+and workers switch models at their next version check (see
+embedding_versions).
+
+The version is not activated while any item failed (no readable image or
+no face) or is still unstaged: matching filters by the active version, so
+those people would silently drop out of every roster. The job stops in
+NEEDS_ATTENTION instead; after re-enrolling (or removing) them, resuming
+retries the failed items and swaps.
+"""
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from ..extensions import db
+from ..models.face_reembed_job import FaceReembedJob
+from ..models.face_staged_embedding import FaceStagedEmbedding
+from ..models.face_template import FaceTemplate
+from ..models.student import Student
+from ..models.teacher import Teacher
+from ..utils.embedding_codec import encode_embedding
+from ..utils.errors import APIError
+from . import embedding_backends, embedding_versions, face_engine, face_index, face_pipeline
+from . import face_roster
+from .face_template_service import compute_centroid
+
+# passes over newly enrolled faces before the swap
+MAX_PASSES = 3
+
+# how an item's image is turned into the crop that is embedded:
+# CROP   aligned pipeline crop (templates), embedded as is
+# FACE   legacy unaligned face crop: aligned if a face is found, else as is
+# FRAME  possibly a whole frame (legacy teacher upload): a face must be found
+CROP, FACE, FRAME = "crop", "face", "frame"
+
+_worker_backend: Optional[embedding_backends.EmbeddingBackend] = None
+
+
+# ---------- worker process side ----------
+def init_reembed_worker(
+    backend_name: str, backend_options: Dict[str, Any], detector_model_path: str
+) -> None:
+    """Process initializer: load the target backend once per worker."""
+    global _worker_backend
+    # the detector aligns legacy owner images (see _face_crop)
+    face_engine.configure(detector_model_path, backend_name, backend_options)
+    _worker_backend = embedding_backends.create(backend_name, backend_options)
+    _worker_backend.load()
+
+
+def _face_crop(image, kind: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """(crop to embed, error) for a stored image of the given kind."""
+    if kind == CROP:
+        return image, None
+    faces = face_pipeline.detect_faces(image, max_faces=1)
+    if faces:
+        return faces[0]["crop"], None
+    if kind == FACE:
+        return image, None
+    return None, "No face found in stored image; re-enroll"
+
+
+def _embed_batch(items: List[Tuple[str, Optional[str], str]]):
+    """Embed the images at the given paths. Returns [(key, embedding, error)]."""
+    results, keys, images = [], [], []
+    for key, path, kind in items:
+        image = cv2.imread(path) if path and os.path.exists(path) else None
+        if image is None:
+            results.append((key, None, "No stored face image"))
+            continue
+        crop, error = _face_crop(image, kind)
+        if error:
+            results.append((key, None, error))
+        else:
+            keys.append(key)
+            images.append(crop)
+    if images:
+        for key, outcome in zip(keys, _worker_backend.represent_batch(images)):
+            if isinstance(outcome, BaseException):
+                results.append((key, None, str(outcome)[:255]))
+            else:
+                vec = np.asarray(outcome[0]["embedding"], dtype=np.float32).reshape(-1)
+                results.append((key, vec, None))
+    return results
+
+
+# ---------- web worker side ----------
+def _teacher_image(teacher_id: int) -> str:
+    # written by register_teacher_face under a fixed name: the aligned crop
+    # now, the whole uploaded frame for teachers enrolled before it
+    return os.path.join("uploads", "faces", f"teacher_{teacher_id}.jpg")
+
+
+def _items() -> List[Tuple[str, Optional[str], str]]:
+    """Every stored vector to recompute, as (item_key, image path, image kind)."""
+    student_images = dict(
+        db.session.query(Student.id, Student.face_image_path).filter(
+            Student.face_image_path.isnot(None)
+        )
+    )
+    items = []
+    with_templates = {"student": set(), "teacher": set()}
+    rows = db.session.query(
+        FaceTemplate.id, FaceTemplate.student_id, FaceTemplate.teacher_id, FaceTemplate.image_path
+    ).order_by(FaceTemplate.id)
+    for template_id, student_id, teacher_id, image_path in rows:
+        if student_id is not None:
+            with_templates["student"].add(student_id)
+            fallback = (student_images.get(student_id), FACE)
+        else:
+            with_templates["teacher"].add(teacher_id)
+            fallback = (_teacher_image(teacher_id), FRAME)
+        path, kind = (image_path, CROP) if image_path else fallback
+        items.append((f"template:{template_id}", path, kind))
+
+    for kind, model in (("student", Student), ("teacher", Teacher)):
+        owner_ids = db.session.query(model.id).filter(
+            (model.face_embedding_bin.isnot(None)) | (model.face_embedding.isnot(None))
+        ).order_by(model.id)
+        for (owner_id,) in owner_ids:
+            if owner_id not in with_templates[kind]:
+                if kind == "student":
+                    items.append((f"student:{owner_id}", student_images.get(owner_id), FACE))
+                else:
+                    items.append((f"teacher:{owner_id}", _teacher_image(owner_id), FRAME))
+    return items
+
+
+def _staged_keys(job_id: str) -> set:
+    return {
+        key
+        for (key,) in db.session.query(FaceStagedEmbedding.item_key).filter(
+            FaceStagedEmbedding.job_id == job_id
+        )
+    }
+
+
+def _running_job() -> Optional[FaceReembedJob]:
+    return FaceReembedJob.query.filter(FaceReembedJob.status.in_(("QUEUED", "RUNNING"))).first()
+
+
+def _stalled(job: FaceReembedJob, app) -> bool:
+    limit = timedelta(seconds=app.config.get("FACE_REEMBED_STALL_SECONDS", 300))
+    return job.updated_at is None or datetime.utcnow() - job.updated_at > limit
+
+
+def start_job(created_by: Optional[int], app) -> FaceReembedJob:
+    """Create a job re-embedding every stored face into the configured version and start it."""
+    running = _running_job()
+    if running and not _stalled(running, app):
+        raise APIError(f"Re-embed job {running.id} is already running", 409)
+
+    job = FaceReembedJob(
+        id=str(uuid.uuid4()),
+        status="QUEUED",
+        source_version=embedding_versions.active_version(refresh=True),
+        target_version=embedding_versions.configured_version(),
+        created_by=created_by,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _spawn(app, job.id)
+    return job
+
+
+def resume_job(job_id: str, app) -> FaceReembedJob:
+    """
+    Restart a failed, stalled or NEEDS_ATTENTION job; items staged before
+    are skipped and failed items are retried.
+    """
+    job = get_job(job_id)
+    if job.status == "COMPLETED":
+        raise APIError("Re-embed job already completed", 409)
+    if job.status in ("QUEUED", "RUNNING") and not _stalled(job, app):
+        raise APIError("Re-embed job is still running", 409)
+    if job.target_version != embedding_versions.configured_version():
+        raise APIError(
+            "The configured embedding model changed since this job started; start a new job",
+            409,
+        )
+
+    retried = FaceStagedEmbedding.query.filter(
+        FaceStagedEmbedding.job_id == job.id, FaceStagedEmbedding.embedding.is_(None)
+    ).delete(synchronize_session=False)
+    job.processed_items = max(0, job.processed_items - retried)
+    job.failed_items = 0
+    job.status = "QUEUED"
+    job.error = None
+    job.finished_at = None
+    db.session.commit()
+
+    _spawn(app, job.id)
+    return job
+
+
+def _spawn(app, job_id: str) -> None:
+    threading.Thread(
+        target=_run_job, args=(app, job_id), name=f"face-reembed-{job_id}", daemon=True
+    ).start()
+
+
+def _run_job(app, job_id: str) -> None:
+    with app.app_context():
+        job = db.session.get(FaceReembedJob, job_id)
+        try:
+            job.status = "RUNNING"
+            db.session.commit()
+            _process(app, job)
+            if _swap(job):
+                face_roster.bump(face_roster.STUDENTS)
+                face_roster.bump(face_roster.TEACHERS)
+                face_index.rebuild()
+        except Exception as e:
+            db.session.rollback()
+            print("Face re-embedding failed:", e)
+            job = db.session.get(FaceReembedJob, job_id)
+            job.status = "FAILED"
+            job.error = str(e)[:255]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def _process(app, job: FaceReembedJob) -> None:
+    name, options = face_engine.settings_for_version(
+        job.target_version, face_engine.backend_settings(app.config)[1]
+    )
+    workers = app.config.get("FACE_REEMBED_WORKERS") or os.cpu_count() or 1
+    batch_size = app.config.get("FACE_REEMBED_BATCH", 16)
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_reembed_worker,
+        initargs=(name, options, app.config["FACE_DETECTOR_MODEL_PATH"]),
+    )
+    try:
+        for _ in range(MAX_PASSES):
+            staged = _staged_keys(job.id)
+            todo = [item for item in _items() if item[0] not in staged]
+            job.total_items = len(staged) + len(todo)
+            db.session.commit()
+            if not todo:
+                return
+            _embed_all(executor, workers, batch_size, job, todo)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _embed_all(executor, workers: int, batch_size: int, job: FaceReembedJob, todo) -> None:
+    # keep a bounded window of batches in flight; each finished one is a checkpoint
+    batches = iter([todo[i : i + batch_size] for i in range(0, len(todo), batch_size)])
+    in_flight = set()
+    while True:
+        while len(in_flight) < workers * 2:
+            batch = next(batches, None)
+            if batch is None:
+                break
+            in_flight.add(executor.submit(_embed_batch, batch))
+        if not in_flight:
+            return
+
+        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in finished:
+            for key, embedding, error in future.result():
+                db.session.add(
+                    FaceStagedEmbedding(
+                        job_id=job.id,
+                        item_key=key,
+                        embedding=encode_embedding(embedding) if embedding is not None else None,
+                        error=error,
+                    )
+                )
+                job.processed_items += 1
+                if error:
+                    job.failed_items += 1
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+
+def _unresolved(job: FaceReembedJob) -> List[str]:
+    """Keys of current items with no staged vector (failed or never processed)."""
+    staged = {
+        key
+        for (key,) in db.session.query(FaceStagedEmbedding.item_key).filter(
+            FaceStagedEmbedding.job_id == job.id, FaceStagedEmbedding.embedding.isnot(None)
+        )
+    }
+    return [key for key, _, _ in _items() if key not in staged]
+
+
+def _swap(job: FaceReembedJob) -> bool:
+    """
+    Write every staged vector into place and activate the new version, in one
+    transaction. Returns False, leaving the job in NEEDS_ATTENTION, while any
+    stored face has no vector of the new version.
+    """
+    target = job.target_version
+    # re-listed in this transaction: enrollments after the last pass count
+    unresolved = _unresolved(job)
+    if unresolved:
+        job.status = "NEEDS_ATTENTION"
+        job.error = (
+            f"{len(unresolved)} faces not re-embedded (re-enroll, then resume): "
+            + ", ".join(unresolved[:10])
+        )[:255]
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return False
+
+    staged = FaceStagedEmbedding.query.filter(
+        FaceStagedEmbedding.job_id == job.id, FaceStagedEmbedding.embedding.isnot(None)
+    )
+    owners = {"student": set(), "teacher": set()}
+    for row in staged:
+        kind, item_id = row.item_key.split(":")
+        if kind == "template":
+            template = db.session.get(FaceTemplate, int(item_id))
+            if template is None:
+                continue
+            template.embedding = row.embedding
+            template.embedding_model = target
+            if template.student_id is not None:
+                owners["student"].add(template.student_id)
+            else:
+                owners["teacher"].add(template.teacher_id)
+        else:
+            owner = db.session.get(Student if kind == "student" else Teacher, int(item_id))
+            if owner is None:
+                continue
+            owner.face_embedding_bin = row.embedding
+            owner.face_embedding = None
+            owner.face_embedding_model = target
+    db.session.flush()
+
+    # centroids of people with templates, from their re-embedded templates
+    for kind, model, column in (
+        ("student", Student, FaceTemplate.student_id),
+        ("teacher", Teacher, FaceTemplate.teacher_id),
+    ):
+        for owner in model.query.filter(model.id.in_(owners[kind])) if owners[kind] else []:
+            vectors = [
+                t.get_embedding()
+                for t in FaceTemplate.query.filter(
+                    column == owner.id, FaceTemplate.embedding_model == target
+                )
+            ]
+            owner.set_face_embedding(compute_centroid(vectors))
+            owner.face_embedding_model = target
+
+    embedding_versions.activate(target)
+    job.status = "COMPLETED"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def get_job(job_id: str) -> FaceReembedJob:
+    job = db.session.get(FaceReembedJob, job_id)
+    if not job:
+        raise APIError("Re-embed job not found", 404)
+    return job
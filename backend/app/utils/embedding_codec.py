@@ -0,0 +1,68 @@
+"""
+Compact binary encoding for face embeddings.
+
+Embeddings are stored as raw little-endian float32 bytes, optionally prefixed
+with a fixed 16-byte header recording which model produced the vector:
+
+    magic (4s) | format version (B) | model version (B) | model name (10s)
+
+Blobs without the magic prefix are treated as headerless float32 data.
+Decoding uses np.frombuffer, so the returned array is a read-only view over
+the stored bytes and no copy is made.
+"""
+import json
+import struct
+from typing import Optional, Tuple
+import numpy as np
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+EMBEDDING_MODEL = "ArcFace"
+EMBEDDING_MODEL_VERSION = 1
+
+_MAGIC = b"FEMB"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sBB10s")
+
+
+def encode_embedding(
+    embedding,
+    model_name: Optional[str] = EMBEDDING_MODEL,
+    model_version: int = EMBEDDING_MODEL_VERSION,
+) -> bytes:
+    """
+    Encode an embedding as float32 bytes.
+    Pass model_name=None to write a headerless blob.
+    """
+    body = np.asarray(embedding, dtype=EMBEDDING_DTYPE).reshape(-1).tobytes()
+    if model_name is None:
+        return body
+    header = _HEADER.pack(
+        _MAGIC, _FORMAT_VERSION, model_version, model_name.encode("ascii")[:10]
+    )
+    return header + body
+
+
+def read_embedding_header(blob: bytes) -> Optional[Tuple[str, int]]:
+    """Return (model_name, model_version) from a blob, or None if headerless."""
+    if not blob or len(blob) < _HEADER.size or blob[:4] != _MAGIC:
+        return None
+    _, _, model_version, raw_name = _HEADER.unpack_from(blob)
+    return raw_name.rstrip(b"\0").decode("ascii"), model_version
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    """Return a read-only float32 view over the embedding stored in blob."""
+    offset = _HEADER.size if read_embedding_header(blob) else 0
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE, offset=offset)
+
+
+def load_embedding(blob: Optional[bytes], legacy_json: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Decode the binary column, falling back to the legacy JSON text column
+    for rows that have not been converted yet.
+    """
+    if blob:
+        return decode_embedding(blob)
+    if legacy_json:
+        return np.asarray(json.loads(legacy_json), dtype=EMBEDDING_DTYPE)
+    return None
@@ -31,6 +31,7 @@ def handle_api_error(error):
         "success": False,
         "error": error.message,
     }
+    response.update(error.payload)
     return jsonify(response), error.status_code
 
 
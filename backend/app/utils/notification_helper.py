@@ -1,5 +1,12 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, insert, select
 from app import db
 from ..models.notification import Notification
+from ..models.notification_outbox import NotificationOutbox
+
+# rows per multi-row INSERT
+OUTBOX_CHUNK = 1000
 
 def create_notification(user_id, title, message, type="info"):
     try:
@@ -13,4 +20,65 @@ def create_notification(user_id, title, message, type="info"):
         db.session.commit()
     except Exception as e:
         db.session.rollback()
-        print("Notification error:", e)
\ No newline at end of file
+        print("Notification error:", e)
+
+def queue_notifications(notifications, coalesce_key=None, window=None):
+    """
+    Add notifications ({user_id, title, message, type}) to the outbox with
+    multi-row INSERTs in the caller's transaction; nothing is committed.
+    They reach users once the caller commits and the notification
+    dispatcher drains the outbox. Returns the number queued.
+
+    With a coalesce_key, delivery waits `window` seconds (default
+    NOTIFICATION_COALESCE_SECONDS) and replaces any still-pending row with
+    the same user and key, keeping its delivery time: repeated edits within
+    the window become one notification carrying the latest message.
+
+    A coalesced notification may also carry "coalesce_from" and
+    "coalesce_to", the state (e.g. attendance status) before and after the
+    change it reports. The pending row remembers the state before the first
+    coalesced change; when a later change brings it back there, the row is
+    dropped instead, since nothing changed for the user overall.
+    """
+    rows = [{"type": "info", **n} for n in notifications]
+    if coalesce_key is not None and rows:
+        if window is None:
+            window = current_app.config.get("NOTIFICATION_COALESCE_SECONDS", 30)
+        due = datetime.utcnow() + timedelta(seconds=window)
+        pending = {}
+        user_ids = [r["user_id"] for r in rows]
+        for i in range(0, len(user_ids), OUTBOX_CHUNK):
+            chunk = user_ids[i : i + OUTBOX_CHUNK]
+            found = db.session.execute(
+                select(
+                    NotificationOutbox.user_id,
+                    NotificationOutbox.deliver_after,
+                    NotificationOutbox.coalesce_from,
+                ).where(
+                    NotificationOutbox.coalesce_key == coalesce_key,
+                    NotificationOutbox.user_id.in_(chunk),
+                )
+            )
+            for user_id, deliver_after, coalesce_from in found:
+                earliest = min(deliver_after or due, pending.get(user_id, (due,))[0])
+                pending[user_id] = (earliest, coalesce_from)
+            db.session.execute(
+                delete(NotificationOutbox).where(
+                    NotificationOutbox.coalesce_key == coalesce_key,
+                    NotificationOutbox.user_id.in_(chunk),
+                )
+            )
+        coalesced = []
+        for r in rows:
+            deliver_after, start = pending.get(r["user_id"], (due, r.get("coalesce_from")))
+            end = r.pop("coalesce_to", None)
+            r.update(coalesce_key=coalesce_key, deliver_after=deliver_after, coalesce_from=start)
+            if r["user_id"] in pending and start is not None and start == end:
+                continue  # back where it started: nothing to report
+            coalesced.append(r)
+        rows = coalesced
+    for r in rows:
+        r.pop("coalesce_to", None)
+    for i in range(0, len(rows), OUTBOX_CHUNK):
+        db.session.execute(insert(NotificationOutbox.__table__).values(rows[i : i + OUTBOX_CHUNK]))
+    return len(rows)
@@ -0,0 +1,117 @@
+"""add binary face embeddings
+
+Revision ID: b7d2e4f1c9a3
+Revises: 8ee5b1677fe9
+Create Date: 2026-03-02 10:14:27.318402
+
+"""
+import json
+import struct
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f1c9a3'
+down_revision = '8ee5b1677fe9'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Frozen copy of app.utils.embedding_codec's header so this migration keeps
+# producing the same bytes if the codec evolves.
+_HEADER = struct.Struct("<4sBB10s")
+_HEADER_BYTES = _HEADER.pack(b"FEMB", 1, 1, b"ArcFace")
+
+
+def _table(name):
+    return sa.table(
+        name,
+        sa.column('id', sa.Integer),
+        sa.column('face_embedding', sa.Text),
+        sa.column('face_embedding_bin', sa.LargeBinary),
+    )
+
+
+def _json_to_binary(bind, table):
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, table.c.face_embedding)
+            .where(table.c.id > last_id)
+            .where(table.c.face_embedding.isnot(None))
+            .where(table.c.face_embedding_bin.is_(None))
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        params = [
+            {
+                'row_id': row_id,
+                'blob': _HEADER_BYTES + np.asarray(json.loads(raw), dtype='<f4').tobytes(),
+            }
+            for row_id, raw in rows
+        ]
+        bind.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values(face_embedding_bin=sa.bindparam('blob'), face_embedding=None),
+            params,
+        )
+        last_id = rows[-1][0]
+
+
+def _binary_to_json(bind, table):
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, table.c.face_embedding_bin)
+            .where(table.c.id > last_id)
+            .where(table.c.face_embedding_bin.isnot(None))
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for row_id, blob in rows:
+            offset = _HEADER.size if blob[:4] == b"FEMB" else 0
+            vector = np.frombuffer(blob, dtype='<f4', offset=offset)
+            params.append({'row_id': row_id, 'text': json.dumps(vector.tolist())})
+        bind.execute(
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values(face_embedding=sa.bindparam('text')),
+            params,
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_embedding_bin', sa.LargeBinary(), nullable=True))
+
+    with op.batch_alter_table('teachers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('face_embedding_bin', sa.LargeBinary(), nullable=True))
+
+    bind = op.get_bind()
+    _json_to_binary(bind, _table('students'))
+    _json_to_binary(bind, _table('teachers'))
+
+
+def downgrade():
+    bind = op.get_bind()
+    _binary_to_json(bind, _table('students'))
+    _binary_to_json(bind, _table('teachers'))
+
+    with op.batch_alter_table('teachers', schema=None) as batch_op:
+        batch_op.drop_column('face_embedding_bin')
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('face_embedding_bin')
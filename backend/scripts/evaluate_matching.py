@@ -0,0 +1,166 @@
+"""
+Calibrate the face match threshold on a labeled probe set.
+
+Probe photos are laid out one directory per enrolled student, named by roll
+number; photos of people who are not enrolled go in `_unknown`:
+
+    probes/
+        R-001/a.jpg, b.jpg, ...
+        R-002/...
+        _unknown/...
+
+Each photo goes through the attendance pipeline (decode, detect, quality
+gate, embed) and is scored against the enrolled student roster of the
+active model version. Prints FAR/FRR at the current threshold and at the
+one meeting --target-far, the equal error rate, and per-stage latency;
+--json writes the full report with the ROC curve.
+
+--apply stores the recommended threshold for the active model version, and
+every worker uses it from its next version check.
+
+Run:
+    python scripts/evaluate_matching.py probes/ --target-far 0.001 [--apply]
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from app import create_app
+from app.extensions import db
+from app.models.student import Student
+from app.services import embedding_versions, face_pipeline, face_quality, face_roster
+from app.services import match_evaluation
+from app.utils.image_preprocess import decode_image
+
+UNKNOWN_DIR = "_unknown"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def probe_files(root):
+    for label in sorted(os.listdir(root)):
+        directory = os.path.join(root, label)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield label, os.path.join(directory, name)
+
+
+def embed_probes(root, roll_to_id, max_side, timer):
+    """Run every probe through the pipeline; returns (embeddings, labels, failures)."""
+    embeddings, labels, failures = [], [], {}
+    for label, path in probe_files(root):
+        if label == UNKNOWN_DIR:
+            student_id = match_evaluation.UNKNOWN
+        elif label.lower() in roll_to_id:
+            student_id = roll_to_id[label.lower()]
+        else:
+            failures["unknown_label"] = failures.get("unknown_label", 0) + 1
+            continue
+
+        with open(path, "rb") as fh:
+            data = fh.read()
+        with timer.stage("decode"):
+            image = decode_image(data, max_side)
+        if image is None:
+            failures["invalid_image"] = failures.get("invalid_image", 0) + 1
+            continue
+        with timer.stage("detect"):
+            faces = face_pipeline.detect_faces(image, max_faces=1)
+        if not faces:
+            failures[face_quality.NO_FACE] = failures.get(face_quality.NO_FACE, 0) + 1
+            continue
+        with timer.stage("quality"):
+            reason = face_quality.assess(faces[0])
+        if reason:
+            failures[reason] = failures.get(reason, 0) + 1
+            continue
+        with timer.stage("embed"):
+            embeddings.append(face_pipeline.embed_faces(faces)[0])
+        labels.append(student_id)
+    return embeddings, labels, failures
+
+
+def print_rates(title, rates):
+    print(
+        f"{title:<13} threshold {rates['threshold']:.3f}  FAR {rates['far']:.5f}  "
+        f"FRR {rates['frr']:.4f}  | rank-1 accept {rates['true_accept_rate']:.4f}  "
+        f"wrong {rates['misidentification_rate']:.4f}  "
+        f"unknown accepted {rates['false_accept_rate']:.4f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("probes", help="directory of probe photos, one folder per roll number")
+    parser.add_argument("--target-far", type=float, default=0.001)
+    parser.add_argument("--json", help="write the full report (with ROC curve) here")
+    parser.add_argument(
+        "--apply", action="store_true", help="store the recommended threshold for the model"
+    )
+    args = parser.parse_args()
+
+    app = create_app(os.environ.get("FLASK_CONFIG", "default"))
+    with app.app_context():
+        version = embedding_versions.ensure_engine()
+        roster = face_roster.get_roster(face_roster.STUDENTS)
+        if len(roster) == 0:
+            raise SystemExit("No enrolled faces for model version " + version)
+        roll_to_id = {
+            roll_no.strip().lower(): student_id
+            for student_id, roll_no in db.session.query(Student.id, Student.roll_no)
+        }
+
+        timer = match_evaluation.StageTimer()
+        embeddings, labels, failures = embed_probes(
+            args.probes, roll_to_id, app.config["FACE_IMAGE_MAX_SIDE"], timer
+        )
+        if not embeddings:
+            raise SystemExit("No probe produced an embedding")
+
+        current = embedding_versions.match_threshold(version)
+        started = time.perf_counter()
+        report = match_evaluation.evaluate(
+            np.asarray(roster.matrix),
+            roster.owner_ids,
+            np.vstack(embeddings),
+            labels,
+            target_far=args.target_far,
+            current_threshold=current,
+        )
+        timer.record("match", time.perf_counter() - started, count=len(embeddings))
+        report.update(
+            model_version=version, failed_probes=failures, latency=timer.summary()
+        )
+
+        print(
+            f"model {version}: {report['identities']} students ({report['gallery_rows']} rows), "
+            f"{report['probes']} probes, {sum(failures.values())} not embedded {failures}"
+        )
+        print(
+            f"{report['genuine_comparisons']} genuine / {report['impostor_comparisons']} "
+            f"impostor comparisons, EER {report['eer']['rate']:.4f} "
+            f"at {report['eer']['threshold']:.3f}"
+        )
+        print_rates("current", report["current"])
+        print_rates(f"FAR<={args.target_far}", report["recommended"])
+        print(f"{'stage':<10}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, stats in report["latency"].items():
+            print(
+                f"{stage:<10}{stats['count']:>7}{stats['mean_ms']:>10.2f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            )
+
+        if args.json:
+            with open(args.json, "w") as fh:
+                json.dump(report, fh, indent=2)
+
+        if args.apply:
+            embedding_versions.set_match_threshold(version, report["recommended"]["threshold"])
+            db.session.commit()
+            print(f"Stored match threshold {report['recommended']['threshold']:.3f} for {version}")
+
+
+if __name__ == "__main__":
+    main()
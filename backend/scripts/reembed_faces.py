@@ -0,0 +1,60 @@
+"""
+Re-embed every stored face into the configured model version.
+
+Run after changing FACE_EMBEDDING_BACKEND or FACE_EMBEDDING_VERSION (for
+example when upgrading to the aligned pipeline, version 2, over faces
+enrolled as version 1). Until the job completes, matching stays on the
+stored version; workers print a warning and the admin embedding status
+reports reembed_needed.
+
+The job is the same one POST /api/admin/face-embeddings/reembed starts;
+this script starts it and waits, printing progress. Exits non-zero if the
+job fails or needs attention (see its error for the unresolved faces).
+
+Run:
+    python scripts/reembed_faces.py [--force]
+"""
+import argparse
+import os
+import sys
+import time
+from app import create_app
+from app.extensions import db
+from app.models.face_reembed_job import FaceReembedJob
+from app.services import embedding_versions, reembed_service
+
+POLL_SECONDS = 5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--force", action="store_true", help="run even if the versions already match"
+    )
+    args = parser.parse_args()
+
+    app = create_app(os.environ.get("FLASK_CONFIG", "default"))
+    with app.app_context():
+        active = embedding_versions.active_version(refresh=True)
+        configured = embedding_versions.configured_version()
+        if active == configured and not args.force:
+            print("Stored faces are already", configured)
+            return 0
+
+        job = reembed_service.start_job(None, app)
+        print(f"Re-embedding {active} -> {configured} (job {job.id})")
+        while True:
+            time.sleep(POLL_SECONDS)
+            db.session.expire_all()
+            job = db.session.get(FaceReembedJob, job.id)
+            print(f"  {job.status}: {job.processed_items}/{job.total_items} items")
+            if job.status not in ("QUEUED", "RUNNING"):
+                break
+        if job.status != "COMPLETED":
+            print("Re-embed job", job.status, job.error or "")
+            return 1
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,16 +2,24 @@
 Pytest fixtures: a temporary in-memory SQLite app for unit tests.
 This isolates tests from your MySQL dev DB.
 """
+import os
 import pytest
+
+# tests drain the notification outbox themselves; no background thread
+os.environ.setdefault("NOTIFICATION_DISPATCHER", "0")
+# fixtures store untagged (legacy, label "1") vectors without a pinned model
+os.environ.setdefault("FACE_EMBEDDING_VERSION", "1")
+
 from app import create_app
 from app.extensions import db
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     app = create_app("default")
     # override DB URI to in-memory sqlite for tests
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
     app.config["TESTING"] = True
+    app.config["FACE_ROSTER_DIR"] = str(tmp_path / "roster")
     with app.app_context():
         db.create_all()
         yield app
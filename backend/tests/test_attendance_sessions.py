@@ -0,0 +1,68 @@
+"""
+get_or_create_session: conflict-tolerant insert, one lookup, per-process cache.
+"""
+from datetime import date
+from sqlalchemy import event
+from app.extensions import db
+from app.models.classes import Class
+from app.models.subject import Subject
+from app.models.attendance_session import AttendanceSession
+from app.services import attendance_sessions
+
+
+def make_class():
+    klass = Class(name="Sess", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    subject = Subject(name="Maths", class_id=klass.id)
+    db.session.add(subject)
+    db.session.commit()
+    return klass.id, subject.id
+
+
+def statements_of(fn):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.lstrip().split()[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        return fn(), statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_get_or_create(app):
+    class_id, subject_id = make_class()
+    day = date(2026, 3, 20)
+
+    session, created = attendance_sessions.get_or_create_session(class_id, subject_id, day, 1)
+    assert created
+    assert session.teacher_id == 1
+
+    # another worker: the insert conflicts and the existing row is returned
+    attendance_sessions.clear()
+    again, created = attendance_sessions.get_or_create_session(class_id, subject_id, day, 2)
+    assert not created
+    assert again.id == session.id and again.teacher_id == 1
+    assert AttendanceSession.query.count() == 1
+
+
+def test_cached_lookup_and_stale_entry(app):
+    class_id, subject_id = make_class()
+    day = date(2026, 3, 21)
+    session, _ = attendance_sessions.get_or_create_session(class_id, subject_id, day, 1)
+    db.session.expunge_all()
+
+    (cached, created), statements = statements_of(
+        lambda: attendance_sessions.get_or_create_session(class_id, subject_id, day, 1)
+    )
+    assert cached.id == session.id and not created
+    assert statements == ["SELECT"]
+
+    # the session was deleted meanwhile: resolved (and created) again
+    AttendanceSession.query.filter_by(id=session.id).delete()
+    db.session.commit()
+    fresh, created = attendance_sessions.get_or_create_session(class_id, subject_id, day, 1)
+    assert created
+    assert attendance_sessions.metrics()["hits"] == 2
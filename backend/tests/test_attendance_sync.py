@@ -0,0 +1,100 @@
+"""
+Offline batch sync: sessions created as needed, one transaction per batch,
+idempotent per client key.
+"""
+from app.extensions import db
+from app.models.user import User
+from app.models.teacher import Teacher
+from app.models.classes import Class
+from app.models.subject import Subject
+from app.models.student import Student
+from app.models.attendance_session import AttendanceSession
+from app.models.attendance_record import AttendanceRecord
+from app.models.notification_outbox import NotificationOutbox
+from app.models.teacher_subject_assignments import TeacherSubjectAssignment
+from app.services.attendance_sync import sync_sessions
+
+
+def make_school():
+    klass = Class(name="Sync", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    subjects = [Subject(name=n, class_id=klass.id) for n in ("Maths", "Art")]
+    db.session.add_all(subjects); db.session.flush()
+
+    tuser = User(name="t", email="t@test", role="TEACHER")
+    tuser.set_password("t")
+    db.session.add(tuser); db.session.flush()
+    teacher = Teacher(user_id=tuser.id)
+    db.session.add(teacher); db.session.flush()
+    db.session.add(
+        TeacherSubjectAssignment(
+            teacher_id=teacher.id, class_id=klass.id, subject_id=subjects[0].id
+        )
+    )
+
+    student_ids = []
+    for i in range(3):
+        u = User(name=f"s{i}", email=f"s{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"s{i}", class_id=klass.id)
+        db.session.add(s); db.session.flush()
+        student_ids.append(s.id)
+    db.session.commit()
+    return teacher.id, klass.id, [s.id for s in subjects], student_ids
+
+
+def item(key, class_id, subject_id, day, student_ids, status="PRESENT"):
+    return {
+        "key": key,
+        "class_id": class_id,
+        "subject_id": subject_id,
+        "session_date": day,
+        "records": [{"student_id": sid, "status": status} for sid in student_ids],
+    }
+
+
+def test_batch_creates_sessions_and_is_idempotent(app):
+    teacher_id, class_id, (maths, art), students = make_school()
+    batch = [
+        item("k1", class_id, maths, "2026-03-20", students),
+        item("k2", class_id, maths, "2026-03-21", students, status="ABSENT"),
+        item("k3", class_id, art, "2026-03-20", students),
+        {"key": "k4", "class_id": class_id},
+    ]
+
+    results = sync_sessions(teacher_id, batch)
+    assert [r["status"] for r in results] == ["created", "created", "forbidden", "invalid"]
+    assert results[0]["changed"] == 3
+    assert AttendanceSession.query.count() == 2
+    assert AttendanceRecord.query.count() == 6
+    assert NotificationOutbox.query.count() == 6  # one per student and session
+
+    # the device timed out and resends the batch
+    again = sync_sessions(teacher_id, batch)
+    assert [r["status"] for r in again] == ["duplicate", "duplicate", "forbidden", "invalid"]
+    assert again[0]["session_id"] == results[0]["session_id"]
+    assert again[0]["result"] == "created"
+    assert AttendanceRecord.query.count() == 6
+
+
+def test_existing_session_is_updated(app):
+    teacher_id, class_id, (maths, _), students = make_school()
+    first = sync_sessions(teacher_id, [item("a", class_id, maths, "2026-03-20", students)])
+
+    results = sync_sessions(
+        teacher_id,
+        [
+            item("b", class_id, maths, "2026-03-20", students[:2]),
+            item("b", class_id, maths, "2026-03-20", students),
+        ],
+    )
+    assert results[0] == {
+        "key": "b",
+        "status": "updated",
+        "session_id": first[0]["session_id"],
+        "changed": 1,
+    }
+    # the repeated key in the same batch is not applied twice
+    assert results[1]["status"] == "duplicate"
+    assert AttendanceRecord.query.count() == 2
@@ -0,0 +1,40 @@
+"""
+Embedding backends: selection by config and the deterministic stub.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import embedding_backends, face_engine
+
+
+def test_stub_is_deterministic_and_normalised():
+    backend = embedding_backends.create("stub", {"stub_dim": 16})
+    a = np.zeros((8, 8, 3), dtype=np.uint8)
+    b = np.ones((8, 8, 3), dtype=np.uint8)
+
+    first, second, again = backend.embed([a, b, a])
+    assert first.shape == (16,)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert np.array_equal(first, again)
+    assert not np.allclose(first, second)
+
+    with pytest.raises(ValueError):
+        embedding_backends.create("nope", {})
+
+
+def test_engine_uses_configured_backend():
+    config = {
+        "FACE_DETECTOR_MODEL_PATH": None,
+        "FACE_ENGINE_WARMUP": False,
+        "FACE_EMBEDDING_BACKEND": "stub",
+        "FACE_STUB_DIM": 8,
+    }
+    face_engine.init_app(SimpleNamespace(config=config))
+    try:
+        assert face_engine.status()["backend"] == "stub"
+        # aligned pipeline vectors are not tagged like the legacy ones
+        assert face_engine.model_version() == "stub:stub:2"
+        outcomes = face_engine.represent_batch([np.zeros((4, 4, 3), np.uint8)] * 2)
+        assert [len(o[0]["embedding"]) for o in outcomes] == [8, 8]
+    finally:
+        face_engine.configure(None)
@@ -0,0 +1,46 @@
+"""
+Unit tests for the binary face embedding codec and model accessors.
+"""
+import json
+import numpy as np
+from app.models.student import Student
+from app.utils.embedding_codec import (
+    encode_embedding,
+    decode_embedding,
+    read_embedding_header,
+    load_embedding,
+)
+
+
+def test_roundtrip_with_header():
+    vec = np.linspace(-1, 1, 512)
+    blob = encode_embedding(vec)
+    assert len(blob) == 16 + 512 * 4
+    assert read_embedding_header(blob) == ("ArcFace", 1)
+
+    decoded = decode_embedding(blob)
+    assert decoded.dtype == np.float32
+    assert not decoded.flags.owndata  # view over blob, no copy
+    np.testing.assert_allclose(decoded, vec, rtol=1e-6)
+
+
+def test_headerless_blob():
+    blob = encode_embedding([1.0, 2.0, 3.0], model_name=None)
+    assert len(blob) == 12
+    assert read_embedding_header(blob) is None
+    assert decode_embedding(blob).tolist() == [1.0, 2.0, 3.0]
+
+
+def test_load_falls_back_to_legacy_json():
+    assert load_embedding(None, json.dumps([0.5, 0.25])).tolist() == [0.5, 0.25]
+    assert load_embedding(None, None) is None
+
+
+def test_student_accessors():
+    student = Student(face_embedding=json.dumps([1.0, 0.0]))
+    assert student.has_face_embedding
+    assert student.get_face_embedding().tolist() == [1.0, 0.0]
+
+    student.set_face_embedding([0.0, 1.0])
+    assert student.face_embedding is None
+    assert student.get_face_embedding().tolist() == [0.0, 1.0]
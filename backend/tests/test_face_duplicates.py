@@ -0,0 +1,70 @@
+"""
+Duplicate-enrollment checks against the shared student roster.
+"""
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.services import face_duplicates, face_roster
+
+
+def unit(vec):
+    vec = np.asarray(vec, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def seed(vectors):
+    klass = Class(name="Dup", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    ids = []
+    for i, vec in enumerate(vectors):
+        u = User(name=f"D{i}", email=f"d{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"D-{i}", class_id=klass.id if i % 2 else None)
+        s.set_face_embedding(vec)
+        db.session.add(s); db.session.flush()
+        ids.append(s.id)
+    db.session.commit()
+    face_roster.bump(face_roster.STUDENTS)
+    return ids
+
+
+def test_find_matches_school_wide(app):
+    base, other, third = np.eye(8, dtype=np.float32)[:3]
+    ids = seed([base, other, third])
+
+    # a new photo of student 0, registered for another student
+    [matches] = face_duplicates.find_matches([base + 0.05 * other], exclude_ids=[ids[2]])
+    assert [sid for sid, _ in matches] == [ids[0]]
+    assert matches[0][1] < 0.01
+
+    # re-registering student 0 is not a duplicate of themselves
+    assert face_duplicates.find_matches([base], exclude_ids=[ids[0]]) == [[]]
+
+
+def test_duplicate_pairs_blockwise(app, monkeypatch):
+    rng = np.random.default_rng(0)
+    vectors = [unit(v) for v in rng.standard_normal((40, 16))]
+    vectors[25] = unit(vectors[3] + 0.05 * rng.standard_normal(16))
+    vectors[39] = unit(vectors[10] + 0.05 * rng.standard_normal(16))
+    ids = seed(vectors)
+
+    # force many small blocks
+    monkeypatch.setattr(face_duplicates, "BLOCK_ELEMENTS", 64)
+    pairs = face_duplicates.duplicate_pairs(0.2)
+
+    matrix = np.vstack(vectors)
+    distances = 1.0 - matrix @ matrix.T
+    expected = {
+        (ids[i], ids[j]) for i in range(40) for j in range(i + 1, 40) if distances[i, j] <= 0.2
+    }
+    assert {(a, b) for a, b, _ in pairs} == expected
+    assert {(ids[3], ids[25]), (ids[10], ids[39])} <= expected
+    assert [d for _, _, d in pairs] == sorted(d for _, _, d in pairs)
+
+
+def test_batch_pairs():
+    a = unit([1, 0, 0])
+    assert face_duplicates.batch_pairs([a, unit([0, 1, 0]), a], 0.1)[0][:2] == (0, 2)
@@ -0,0 +1,113 @@
+"""
+Bulk ZIP face enrollment, run with an in-process executor and a fake
+embedder so no model is loaded.
+"""
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import numpy as np
+from werkzeug.datastructures import FileStorage
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.models.face_enrollment_job import FaceEnrollmentJob
+from app.services import face_enrollment_service, face_index
+
+
+class InlineExecutor(ThreadPoolExecutor):
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers)
+
+
+def fake_enroll_one(name, data, max_side=0):
+    if data == b"bad":
+        return name, None, None, "No face detected"
+    return name, np.full(4, float(len(data)), dtype=np.float32), b"jpg", None
+
+
+def make_zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return FileStorage(stream=buf, filename="faces.zip")
+
+
+def seed_students(app):
+    klass = Class(name="Enroll", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    students = []
+    for i in range(3):
+        u = User(name=f"E{i}", email=f"e{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"R-00{i}", class_id=klass.id)
+        db.session.add(s)
+        students.append(s)
+    db.session.commit()
+    return students
+
+
+def test_bulk_enrollment_report(app, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(face_enrollment_service, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(face_enrollment_service, "_enroll_one", fake_enroll_one)
+    # run the job synchronously instead of in a background thread
+    monkeypatch.setattr(face_enrollment_service, "_spawn", face_enrollment_service._run_job)
+    monkeypatch.setitem(face_index._config, "path", str(tmp_path / "face_index.npz"))
+    students = seed_students(app)
+
+    upload = make_zip({
+        "photos/R-000.jpg": b"aa",
+        "photos/r-001.JPG": b"bad",
+        "photos/R-999.jpg": b"cc",
+        "photos/notes.txt": b"ignored",
+    })
+    job_id = face_enrollment_service.start_job(upload, "roll_no", None, app).id
+
+    db.session.expire_all()
+    job = db.session.get(FaceEnrollmentJob, job_id)
+    data = job.to_dict()
+    assert data["status"] == "COMPLETED"
+    assert data["registered_count"] == 1
+    assert data["processed_files"] == 3
+    statuses = {r["file"]: r["status"] for r in data["report"]}
+    assert statuses == {
+        "photos/R-000.jpg": "registered",
+        "photos/r-001.JPG": "failed",
+        "photos/R-999.jpg": "skipped",
+    }
+
+    db.session.expire_all()
+    enrolled = db.session.get(Student, students[0].id)
+    # stored as the (normalised) centroid of the student's templates
+    assert enrolled.get_face_embedding().tolist() == [0.5, 0.5, 0.5, 0.5]
+    assert len(enrolled.face_templates) == 1
+    assert enrolled.face_image_path.endswith(f"student_{enrolled.id}.jpg")
+
+
+def test_report_failure_keeps_enrollment(app, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(face_enrollment_service, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(face_enrollment_service, "_enroll_one", fake_enroll_one)
+    monkeypatch.setattr(face_enrollment_service, "_spawn", face_enrollment_service._run_job)
+    monkeypatch.setitem(face_index._config, "path", str(tmp_path / "face_index.npz"))
+    students = seed_students(app)
+
+    def unwritable(report):
+        raise ValueError("report too large")
+
+    monkeypatch.setattr(face_enrollment_service, "json", SimpleNamespace(dumps=unwritable))
+    job_id = face_enrollment_service.start_job(
+        make_zip({"R-000.jpg": b"aa"}), "roll_no", None, app
+    ).id
+
+    db.session.expire_all()
+    job = db.session.get(FaceEnrollmentJob, job_id)
+    assert job.status == "COMPLETED"
+    assert job.registered_count == 1
+    assert job.report is None and job.error
+    assert db.session.get(Student, students[0].id).face_embedding_bin is not None
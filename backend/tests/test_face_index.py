@@ -0,0 +1,170 @@
+"""
+Unit tests for the school-wide IVF face index.
+"""
+import json
+import time
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.student import Student
+from app.services import face_index
+from app.services.face_index import IVFIndex, MIN_TRAIN_SIZE
+
+
+def random_unit(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def test_flat_search_add_remove():
+    vecs = random_unit(50)
+    index = IVFIndex.build(list(range(50)), vecs)
+    assert index.centroids is None
+
+    assert index.search(vecs[7], k=1)[0][0] == 7
+
+    index.add(7, vecs[8])
+    hits = index.search(vecs[8], k=2)
+    assert {hits[0][0], hits[1][0]} == {7, 8}
+    assert len(index) == 50
+
+    assert index.remove(8)
+    assert index.search(vecs[8], k=1)[0][0] == 7
+    assert not index.remove(8)
+
+
+def test_ivf_recall_and_roundtrip(tmp_path):
+    n = MIN_TRAIN_SIZE + 500
+    vecs = random_unit(n, seed=1)
+    index = IVFIndex.build(np.arange(n), vecs)
+    assert index.centroids is not None
+
+    found = sum(index.search(vecs[i], k=1, n_probe=8)[0][0] == i for i in range(0, n, 50))
+    assert found == len(range(0, n, 50))
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == n
+    assert loaded.search(vecs[123], k=3) == index.search(vecs[123], k=3)
+    assert isinstance(loaded._exact, np.memmap)
+    # int8 codes are a quarter of the float32 matrix
+    assert loaded.memory_bytes() < vecs.nbytes / 2
+
+
+def test_save_only_removes_the_replaced_exact_file(tmp_path):
+    path = str(tmp_path / "index.npz")
+    first = IVFIndex.build(list(range(10)), random_unit(10, seed=4))
+    second = IVFIndex.build(list(range(20)), random_unit(20, seed=5))
+    first.save(path)
+    replaced = face_index._exact_file_of(path)
+    # another worker's save in progress: its .npy exists, its .npz not yet
+    in_flight = tmp_path / "index.0123456789ab.exact.npy"
+    np.save(in_flight, np.zeros((1, 16), np.float32))
+
+    second.save(path)
+    assert len(IVFIndex.load(path)) == 20
+    assert in_flight.exists()
+    assert not (tmp_path / replaced).exists()
+
+
+def test_quantized_first_pass_is_reranked_exactly():
+    vecs = random_unit(500, dim=64, seed=2)
+    noisy = vecs + np.random.default_rng(3).normal(scale=0.05, size=vecs.shape)
+    for mode in ("int8", "float16"):
+        index = IVFIndex.build(np.arange(500), vecs, quantization=mode)
+        hit_id, similarity = index.search(noisy[42], k=1)[0]
+        assert hit_id == 42
+        expected = float(vecs[42] @ (noisy[42] / np.linalg.norm(noisy[42])))
+        assert abs(similarity - expected) < 1e-5
+
+
+def test_identify_rebuilds_from_database(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(face_index._config, "path", str(tmp_path / "face_index.npz"))
+    monkeypatch.setattr(face_index, "_index", None)
+    monkeypatch.setattr(face_index, "_loaded_mtime", 0.0)
+
+    ids = []
+    for i, vec in enumerate([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]):
+        u = User(name=f"K{i}", email=f"k{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"K{i}", face_embedding=json.dumps(vec))
+        db.session.add(s); db.session.flush()
+        ids.append(s.id)
+    db.session.commit()
+
+    assert face_index.identify([0.1, 0.9, 0.0], k=1)[0][0] == ids[1]
+
+    face_index.upsert_student(ids[0], [0.0, 0.0, 1.0])
+    face_index.remove_student(ids[1])
+    face_index.flush()
+    assert face_index.identify([0.0, 0.1, 0.9], k=5) == [
+        (ids[0], face_index.identify([0.0, 0.1, 0.9], k=1)[0][1])
+    ]
+
+
+def test_empty_index_is_not_rebuilt_per_query(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(face_index._config, "path", str(tmp_path / "face_index.npz"))
+    monkeypatch.setattr(face_index, "_index", None)
+    monkeypatch.setattr(face_index, "_loaded_mtime", 0.0)
+    rebuilds = []
+    original = face_index.rebuild
+    monkeypatch.setattr(face_index, "rebuild", lambda: rebuilds.append(1) or original())
+
+    assert face_index.identify([1.0, 0.0, 0.0]) == []
+    assert face_index.identify([1.0, 0.0, 0.0]) == []
+    assert len(rebuilds) == 1
+    assert (tmp_path / "face_index.npz").exists()
+
+
+def test_change_after_recent_save_is_written_later(app, monkeypatch, tmp_path):
+    path = tmp_path / "face_index.npz"
+    monkeypatch.setitem(face_index._config, "path", str(path))
+    monkeypatch.setitem(face_index._config, "save_interval", 0.2)
+    monkeypatch.setattr(face_index, "_index", None)
+    monkeypatch.setattr(face_index, "_save_timer", None)
+    monkeypatch.setattr(face_index, "_loaded_mtime", 0.0)
+
+    u = User(name="D", email="d@test", role="STUDENT")
+    u.set_password("s")
+    db.session.add(u); db.session.flush()
+    s = Student(user_id=u.id, roll_no="D", face_embedding=json.dumps([1.0, 0.0, 0.0]))
+    db.session.add(s)
+    db.session.commit()
+    face_index.rebuild()
+
+    # within the save interval: not written yet, but a save is scheduled
+    face_index.upsert_student(s.id + 1, [0.0, 1.0, 0.0])
+    assert len(IVFIndex.load(str(path))) == 1
+    time.sleep(0.5)
+    assert len(IVFIndex.load(str(path))) == 2
+
+
+def test_unreadable_file_is_rebuilt(app, monkeypatch, tmp_path):
+    path = tmp_path / "face_index.npz"
+    path.write_bytes(b"not an index")
+    monkeypatch.setitem(face_index._config, "path", str(path))
+    monkeypatch.setattr(face_index, "_index", None)
+    monkeypatch.setattr(face_index, "_loaded_mtime", 0.0)
+    monkeypatch.setattr(face_index, "_dirty", False)
+
+    assert face_index.identify([1.0, 0.0, 0.0]) == []
+    assert face_index._load_file(str(path)) is None  # the empty marker
+
+
+def test_deferred_save_yields_to_a_newer_file(app, monkeypatch, tmp_path):
+    path = tmp_path / "face_index.npz"
+    IVFIndex.build([1, 2], random_unit(2)).save(str(path))
+    monkeypatch.setitem(face_index._config, "path", str(path))
+    monkeypatch.setattr(face_index, "_index", IVFIndex.build([1], random_unit(1)))
+    monkeypatch.setattr(face_index, "_dirty", True)
+    # loaded before the other worker's save
+    monkeypatch.setattr(face_index, "_loaded_mtime", face_index._file_mtime() - 1)
+    rebuilds = []
+    monkeypatch.setattr(face_index, "rebuild", lambda: rebuilds.append(1))
+
+    face_index._deferred_save()
+    assert rebuilds == [1]
+    assert len(IVFIndex.load(str(path))) == 2
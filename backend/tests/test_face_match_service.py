@@ -0,0 +1,74 @@
+"""
+Unit tests for the per-class embedding cache in face_match_service.
+"""
+import json
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.services import face_match_service
+from app.services.face_match_service import (
+    match_embedding,
+    assign_embeddings,
+    invalidate_class,
+    get_class_matrix,
+)
+
+
+def seed_faces(app, vectors):
+    klass = Class(name="Face Class", section="A", year=2025)
+    db.session.add(klass)
+    db.session.flush()
+    students = []
+    for i, vec in enumerate(vectors):
+        u = User(name=f"F{i}", email=f"f{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"F{i}", class_id=klass.id,
+                    face_embedding=json.dumps(vec) if vec is not None else None)
+        db.session.add(s)
+        students.append(s)
+    db.session.commit()
+    invalidate_class()
+    return klass, students
+
+
+def test_match_picks_closest_student(app):
+    klass, students = seed_faces(app, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], None])
+    student_id, distance = match_embedding(klass.id, [0.1, 0.9, 0.0])
+    assert student_id == students[1].id
+    assert distance < 0.1
+
+    ids, matrix = get_class_matrix(klass.id)
+    assert matrix.dtype == np.float32
+    assert list(ids) == [students[0].id, students[1].id]
+
+
+def test_match_respects_threshold(app):
+    klass, _ = seed_faces(app, [[1.0, 0.0, 0.0]])
+    assert match_embedding(klass.id, [0.0, 0.0, 1.0]) is None
+
+
+def test_invalidate_rebuilds_matrix(app):
+    klass, students = seed_faces(app, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    assert match_embedding(klass.id, [0.0, 0.0, 1.0]) is None
+
+    students[0].face_embedding = json.dumps([0.0, 0.0, 1.0])
+    db.session.commit()
+    # stale until invalidated
+    assert match_embedding(klass.id, [0.0, 0.0, 1.0]) is None
+
+    invalidate_class(klass.id)
+    assert match_embedding(klass.id, [0.0, 0.0, 1.0])[0] == students[0].id
+    assert klass.id in face_match_service._class_cache
+
+
+def test_assign_embeddings_is_one_to_one(app):
+    klass, students = seed_faces(app, [[1.0, 0.0, 0.0], [0.8, 0.6, 0.0], [0.0, 0.0, 1.0]])
+    # both faces prefer student 0; assignment must split them
+    faces = [[1.0, 0.05, 0.0], [0.95, 0.3, 0.0], [0.0, -1.0, 0.0]]
+    results = assign_embeddings(klass.id, faces)
+    assert results[0][0] == students[0].id
+    assert results[1][0] == students[1].id
+    assert results[2] is None
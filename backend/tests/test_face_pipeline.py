@@ -0,0 +1,83 @@
+"""
+Single-detection face pipeline with a fake detector and embedder.
+"""
+from types import SimpleNamespace
+import numpy as np
+from app.services import face_pipeline
+
+
+def fake_detection(x, y, w, h, eyes=((0.3, 0.3), (0.6, 0.3)), score=0.9):
+    return SimpleNamespace(
+        bounding_box=SimpleNamespace(origin_x=x, origin_y=y, width=w, height=h),
+        keypoints=[SimpleNamespace(x=ex, y=ey) for ex, ey in eyes],
+        categories=[SimpleNamespace(score=score)],
+    )
+
+
+def test_detects_once_and_embeds_crops_in_one_call(monkeypatch):
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    detections = [fake_detection(10, 10, 20, 20), fake_detection(50, 40, 40, 80)]
+    monkeypatch.setattr(
+        face_pipeline.face_engine, "detect", lambda mp_image: SimpleNamespace(detections=detections)
+    )
+    calls = []
+
+    def fake_represent_many(images, **kwargs):
+        calls.append((len(images), kwargs))
+        return [[{"embedding": [float(img.shape[0])]}] for img in images]
+
+    monkeypatch.setattr(face_pipeline.inference_pool, "represent_many", fake_represent_many)
+
+    detected = face_pipeline.all_faces(image)
+    # largest first, box clamped to the image
+    assert [face["box"] for face, _ in detected] == [
+        {"x": 50, "y": 40, "w": 40, "h": 60},
+        {"x": 10, "y": 10, "w": 20, "h": 20},
+    ]
+    assert [emb.tolist() for _, emb in detected] == [[60.0], [20.0]]
+    assert calls == [(2, {"detector_backend": "skip"})]
+
+
+def test_tilted_face_is_rotated_in_memory():
+    image = np.zeros((100, 100, 3), dtype=np.uint8)
+    image[40:60, 20:80] = 255
+    box = {"x": 20, "y": 20, "w": 60, "h": 60}
+    level = [SimpleNamespace(x=0.3, y=0.4), SimpleNamespace(x=0.7, y=0.4)]
+    tilted = [SimpleNamespace(x=0.3, y=0.3), SimpleNamespace(x=0.7, y=0.5)]
+
+    straight = face_pipeline._align_crop(image, box, level)
+    assert np.array_equal(straight, image[20:80, 20:80])
+
+    aligned = face_pipeline._align_crop(image, box, tilted)
+    assert aligned.shape == straight.shape
+    assert not np.array_equal(aligned, straight)
+
+
+def test_group_photos_are_detected_in_tiles(monkeypatch):
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+    calls = []
+
+    def fake_detect(mp_image, group=False):
+        calls.append((mp_image.width, group))
+        if mp_image.width == 200:
+            # the whole frame: only the front-row face
+            return SimpleNamespace(detections=[fake_detection(0, 0, 60, 60, score=0.8)])
+        # the first tile sees the front-row face again, the second a back-row one
+        detections = {
+            2: [fake_detection(0, 0, 60, 60, score=0.9)],
+            3: [fake_detection(40, 50, 20, 20, eyes=((0.4, 0.5), (0.5, 0.5)))],
+        }
+        return SimpleNamespace(detections=detections.get(len(calls), []))
+
+    monkeypatch.setattr(face_pipeline.face_engine, "detect", fake_detect)
+    monkeypatch.setitem(face_pipeline._config, "group_tiles", 2)
+
+    faces = face_pipeline.detect_faces(image, group=True)
+    assert [width for width, _ in calls] == [200, 115, 115, 115, 115]
+    assert all(group for _, group in calls)
+    # second tile starts at x=85; the front-row face is kept once
+    assert [face["box"] for face in faces] == [
+        {"x": 0, "y": 0, "w": 60, "h": 60},
+        {"x": 125, "y": 50, "w": 20, "h": 20},
+    ]
+    assert faces[0]["confidence"] == 0.9
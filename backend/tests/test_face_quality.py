@@ -0,0 +1,70 @@
+"""
+Face quality gate: reason codes, and rejected faces skip embedding.
+"""
+import cv2
+import numpy as np
+from app.services import face_pipeline, face_quality
+
+
+def make_face(crop, confidence=0.9):
+    return {
+        "crop": crop,
+        "box": {"x": 0, "y": 0, "w": crop.shape[1], "h": crop.shape[0]},
+        "confidence": confidence,
+    }
+
+
+def textured(size=120, level=128):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(-60, 60, size=(size // 8, size // 8, 1))
+    crop = np.clip(level + noise, 0, 255).astype(np.uint8)
+    return np.repeat(cv2.resize(crop, (size, size), interpolation=cv2.INTER_NEAREST)[..., None], 3, 2)
+
+
+def test_reasons(app):
+    sharp = textured()
+    assert face_quality.assess(make_face(sharp)) is None
+    assert face_quality.assess(make_face(sharp, confidence=0.3)) == face_quality.LOW_CONFIDENCE
+    assert face_quality.assess(make_face(sharp[:40, :40])) == face_quality.FACE_TOO_SMALL
+    assert face_quality.assess(make_face(cv2.GaussianBlur(sharp, (0, 0), 6))) == face_quality.BLURRY
+    assert face_quality.assess(make_face(textured(level=15))) == face_quality.TOO_DARK
+    assert face_quality.assess(make_face(textured(level=245))) == face_quality.TOO_BRIGHT
+
+    scores = face_quality.scores(make_face(sharp))
+    assert set(scores) == {"confidence", "face_px", "brightness", "sharpness"}
+
+
+def test_rejected_faces_are_not_embedded(app, monkeypatch):
+    faces = [make_face(textured()), make_face(textured(), confidence=0.2)]
+    monkeypatch.setattr(
+        face_pipeline, "detect_faces", lambda image, max_faces=None, group=False: faces
+    )
+    embedded = []
+
+    def fake_embed(accepted):
+        embedded.append(len(accepted))
+        return [np.ones(4, dtype=np.float32) for _ in accepted]
+
+    monkeypatch.setattr(face_pipeline, "embed_faces", fake_embed)
+
+    detected = face_pipeline.all_faces(None, check_quality=True)
+    assert [emb is None for _, emb in detected] == [False, True]
+    assert detected[1][0]["rejected"] == face_quality.LOW_CONFIDENCE
+    assert embedded == [1]
+
+
+def test_small_faces_pass_in_group_photos(app, monkeypatch):
+    # back rows of a classroom frame: 40 px faces
+    faces = [make_face(textured()[:40, :40]) for _ in range(3)]
+    monkeypatch.setattr(
+        face_pipeline, "detect_faces", lambda image, max_faces=None, group=False: faces
+    )
+    monkeypatch.setattr(
+        face_pipeline, "embed_faces", lambda accepted: [np.ones(4, np.float32) for _ in accepted]
+    )
+
+    single = face_pipeline.all_faces(None, check_quality=True)
+    assert {face["rejected"] for face, _ in single} == {face_quality.FACE_TOO_SMALL}
+
+    group = face_pipeline.all_faces(None, check_quality=True, group=True)
+    assert all(emb is not None for _, emb in group)
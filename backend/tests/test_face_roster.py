@@ -0,0 +1,63 @@
+"""
+Memory-mapped embedding rosters shared between worker processes.
+"""
+import os
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.services import face_roster
+
+
+def add_student(class_id, name, vec):
+    u = User(name=name, email=f"{name}@test", role="STUDENT")
+    u.set_password("s")
+    db.session.add(u); db.session.flush()
+    s = Student(user_id=u.id, roll_no=name, class_id=class_id)
+    s.set_face_embedding(vec)
+    db.session.add(s); db.session.flush()
+    return s
+
+
+def test_roster_is_mapped_and_sliced_by_class(app, monkeypatch):
+    a = Class(name="A", section="A", year=2025)
+    b = Class(name="B", section="B", year=2025)
+    db.session.add_all([a, b]); db.session.flush()
+    s1 = add_student(b.id, "r1", [0.0, 2.0])
+    s2 = add_student(a.id, "r2", [3.0, 0.0])
+    s3 = add_student(None, "r3", [1.0, 1.0])
+    db.session.commit()
+    face_roster.bump(face_roster.STUDENTS)
+
+    roster = face_roster.get_roster(face_roster.STUDENTS)
+    assert isinstance(roster.matrix, np.memmap)
+    ids, matrix = roster.group_rows(a.id)
+    assert ids.tolist() == [s2.id] and matrix.tolist() == [[1.0, 0.0]]
+    assert roster.group_rows(None)[0].tolist() == [s3.id]
+    assert roster.owner_rows(s1.id).tolist() == [[0.0, 1.0]]
+
+    # another worker maps the existing file instead of rebuilding
+    face_roster.init_app(app)
+    monkeypatch.setattr(face_roster, "_write", None)
+    assert face_roster.get_roster(face_roster.STUDENTS).token == roster.token
+
+
+def test_bump_remaps_and_removes_stale_files(app):
+    klass = Class(name="C", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    student = add_student(klass.id, "g1", [1.0, 0.0])
+    db.session.commit()
+
+    old = face_roster.get_roster(face_roster.STUDENTS)
+    student.set_face_embedding([0.0, 1.0])
+    db.session.commit()
+    # unchanged until the generation is bumped
+    assert face_roster.get_roster(face_roster.STUDENTS) is old
+
+    face_roster.bump(face_roster.STUDENTS)
+    new = face_roster.get_roster(face_roster.STUDENTS)
+    assert new.token != old.token
+    assert new.owner_rows(student.id).tolist() == [[0.0, 1.0]]
+    files = sorted(os.listdir(app.config["FACE_ROSTER_DIR"]))
+    assert files == sorted([f"students.{new.token}.npy", f"students.{new.token}.ids.npz"])
@@ -0,0 +1,115 @@
+"""
+Per-session marked set; PRESENT records are written through as students
+are recognised.
+"""
+from datetime import date
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.models.notification import Notification
+from app.models.attendance_session import AttendanceSession
+from app.models.attendance_record import AttendanceRecord
+from app.services import face_session_state, notification_dispatcher
+from app.services.attendance_service import save_records
+
+
+def make_student(klass, name):
+    u = User(name=name, email=f"{name}@test", role="STUDENT")
+    u.set_password("s")
+    db.session.add(u); db.session.flush()
+    s = Student(user_id=u.id, roll_no=name, class_id=klass.id)
+    db.session.add(s); db.session.flush()
+    return s
+
+
+def make_session(app):
+    klass = Class(name="S", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    students = [make_student(klass, f"s{i}") for i in range(3)]
+    session = AttendanceSession(
+        class_id=klass.id, subject_id=1, teacher_id=1, session_date=date(2026, 1, 5)
+    )
+    db.session.add(session); db.session.flush()
+    db.session.add(AttendanceRecord(session_id=session.id, student_id=students[0].id, status="PRESENT"))
+    db.session.commit()
+    return session, students
+
+
+def test_marks_are_written_through(app):
+    session, students = make_session(app)
+    ids = [s.id for s in students]
+
+    state = face_session_state.get_state(session)
+    assert state.student(ids[1])[1] == "s1"
+    assert state.mark([ids[0], ids[1]]) == [ids[1]]
+    assert state.mark([ids[1], ids[2]]) == [ids[2]]
+    assert face_session_state.get_state(session) is state
+
+    # visible to every process without a finalize
+    marked = {r.student_id for r in AttendanceRecord.query.filter_by(session_id=session.id)}
+    assert marked == set(ids)
+    # notifications go through the outbox, delivered by the dispatcher
+    assert Notification.query.count() == 0
+    assert notification_dispatcher.drain() == 2
+    assert Notification.query.count() == 2
+
+    face_session_state.finalize(session)
+    assert face_session_state.status() == {"sessions": 0}
+
+
+def test_mark_overrides_absent_from_finalize(app):
+    session, students = make_session(app)
+    state = face_session_state.get_state(session)
+
+    # finalize ran on another worker before this one recognised s1
+    db.session.add(
+        AttendanceRecord(session_id=session.id, student_id=students[1].id, status="ABSENT")
+    )
+    db.session.commit()
+
+    assert state.mark([students[1].id]) == [students[1].id]
+    record = AttendanceRecord.query.filter_by(
+        session_id=session.id, student_id=students[1].id
+    ).one()
+    assert record.status == "PRESENT"
+    assert notification_dispatcher.drain() == 1
+
+    # a fresh state does not count ABSENT records as marked
+    db.session.add(
+        AttendanceRecord(session_id=session.id, student_id=students[2].id, status="ABSENT")
+    )
+    db.session.commit()
+    face_session_state.finalize(session)
+    state = face_session_state.get_state(session)
+    assert students[2].id not in state.marked
+    assert state.mark([students[2].id]) == [students[2].id]
+
+
+def test_manual_edit_is_not_hidden_by_the_marked_set(app, monkeypatch):
+    session, students = make_session(app)
+    ids = [s.id for s in students]
+    state = face_session_state.get_state(session)
+    assert state.mark([ids[1]]) == [ids[1]]
+
+    # the teacher sets s1 back to ABSENT in this process
+    save_records(
+        session.id,
+        [
+            {"student_id": ids[0], "status": "PRESENT"},
+            {"student_id": ids[1], "status": "ABSENT"},
+            {"student_id": ids[2], "status": "PRESENT"},
+        ],
+    )
+    state = face_session_state.get_state(session)
+    assert state.marked == {ids[0], ids[2]}
+    assert state.mark([ids[1]]) == [ids[1]]
+
+    # ... or on another worker: seen at the next refresh
+    AttendanceRecord.query.filter_by(session_id=session.id, student_id=ids[2]).update(
+        {"status": "ABSENT"}
+    )
+    db.session.commit()
+    assert ids[2] in face_session_state.get_state(session).marked
+    monkeypatch.setitem(face_session_state._config, "refresh_seconds", 0)
+    assert ids[2] not in face_session_state.get_state(session).marked
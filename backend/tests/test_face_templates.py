@@ -0,0 +1,60 @@
+"""
+Multiple enrollment templates per person and max-similarity matching.
+"""
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.models.face_template import FaceTemplate
+from app.services.face_match_service import invalidate_class, match_embedding, assign_embeddings
+from app.services.face_template_service import add_template
+
+
+def make_student(klass, name):
+    u = User(name=name, email=f"{name}@test", role="STUDENT")
+    u.set_password("s")
+    db.session.add(u); db.session.flush()
+    s = Student(user_id=u.id, roll_no=name, class_id=klass.id)
+    db.session.add(s); db.session.flush()
+    return s
+
+
+def test_templates_seed_legacy_and_cap(app):
+    klass = Class(name="T", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    student = make_student(klass, "t0")
+    student.set_face_embedding([1.0, 0.0, 0.0])
+    db.session.commit()
+
+    assert add_template(student, [0.0, 1.0, 0.0], max_templates=3) == 2
+    sources = [t.source for t in FaceTemplate.query.filter_by(student_id=student.id)]
+    assert sources == ["LEGACY", "REGISTER"]
+    assert np.allclose(student.get_face_embedding(), np.array([1, 1, 0]) / np.sqrt(2))
+
+    add_template(student, [0.0, 0.0, 1.0], max_templates=3)
+    assert add_template(student, [0.0, 0.0, 1.0], max_templates=3) == 3
+    db.session.commit()
+    assert FaceTemplate.query.filter_by(student_id=student.id, source="LEGACY").count() == 0
+
+    assert add_template(student, [1.0, 0.0, 0.0], replace=True) == 1
+    db.session.commit()
+    assert FaceTemplate.query.filter_by(student_id=student.id).count() == 1
+
+
+def test_match_uses_best_template(app):
+    klass = Class(name="M", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    a, b = make_student(klass, "m0"), make_student(klass, "m1")
+    # a: frontal and strongly lit captures whose centroid is far from both
+    add_template(a, [1.0, 0.0, 0.0, 0.0])
+    add_template(a, [0.0, 1.0, 0.0, 0.0])
+    add_template(b, [0.0, 0.0, 1.0, 0.0])
+    db.session.commit()
+    invalidate_class()
+
+    student_id, distance = match_embedding(klass.id, [0.0, 1.0, 0.05, 0.0])
+    assert student_id == a.id and distance < 0.01
+
+    results = assign_embeddings(klass.id, [[1.0, 0.0, 0.0, 0.0], [0.0, 0.0, 1.0, 0.1]])
+    assert [r[0] for r in results] == [a.id, b.id]
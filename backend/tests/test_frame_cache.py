@@ -0,0 +1,73 @@
+"""
+Frame dedup cache: exact and re-encoded repeats, session scoping, LRU bound,
+no near-duplicate reuse of a match.
+"""
+import cv2
+import numpy as np
+from app.services import frame_cache
+
+
+def encode(image, quality=95):
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    assert ok
+    return buf.tobytes()
+
+
+def frame(seed):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(24, 32, 3), dtype=np.uint8)
+    return cv2.resize(small, (640, 480), interpolation=cv2.INTER_LINEAR)
+
+
+def test_repeat_frames_hit_within_session(app):
+    scope = (1, 2, "2026-01-05", "single")
+    original = encode(frame(0))
+
+    cached, key = frame_cache.lookup(scope, original)
+    assert cached is None
+    frame_cache.store(key, {"matched": False, "reason": "no_face"}, similar=True)
+
+    assert frame_cache.lookup(scope, original)[0] == {"matched": False, "reason": "no_face"}
+    # re-encoded copy of the same frame
+    assert frame_cache.lookup(scope, encode(frame(0), quality=80))[0]["reason"] == "no_face"
+    # another session, or a different frame
+    assert frame_cache.lookup((1, 2, "2026-01-06", "single"), original)[0] is None
+    assert frame_cache.lookup(scope, encode(frame(1)))[0] is None
+
+    stats = frame_cache.metrics()
+    assert (stats["exact_hits"], stats["similar_hits"], stats["misses"]) == (1, 1, 3)
+
+
+def test_bounded_and_expiring(app, monkeypatch):
+    monkeypatch.setitem(frame_cache._config, "size", 2)
+    scope = (1, 2, "2026-01-05", "group")
+    frames = [encode(frame(seed)) for seed in range(3)]
+    for seed, data in enumerate(frames):
+        frame_cache.store(frame_cache.lookup(scope, data)[1], {"seed": seed})
+
+    assert frame_cache.metrics()["evictions"] == 1
+    assert frame_cache.lookup(scope, frames[0])[0] is None
+    assert frame_cache.lookup(scope, frames[2])[0] == {"seed": 2}
+
+    monkeypatch.setitem(frame_cache._config, "ttl", -1)
+    frame_cache.store(frame_cache.lookup(scope, frames[0])[1], {"seed": 0})
+    assert frame_cache.lookup(scope, frames[0])[0] is None
+
+
+def test_match_is_not_reused_for_another_face(app):
+    scope = (1, 2, "2026-01-05", "single")
+    background = frame(0)
+    first, second = background.copy(), background.copy()
+    first[200:264, 300:348] = frame(1)[:64, :48]
+    second[200:264, 300:348] = frame(2)[:64, :48]
+    # the frames are near-duplicates by dHash
+    assert frame_cache._distance(
+        frame_cache.difference_hash(encode(first)), frame_cache.difference_hash(encode(second))
+    ) <= frame_cache._config["max_distance"]
+
+    data = encode(first)
+    frame_cache.store(frame_cache.lookup(scope, data)[1], {"matched": True, "student_id": 7})
+
+    assert frame_cache.lookup(scope, encode(second))[0] is None
+    # an exact re-send still hits
+    assert frame_cache.lookup(scope, data)[0]["student_id"] == 7
@@ -0,0 +1,20 @@
+"""
+Health endpoints report face engine readiness.
+"""
+from app.services import face_engine
+
+
+def test_health_reports_face_engine(client):
+    res = client.get("/health")
+    assert res.status_code == 200
+    assert res.get_json()["face_engine"]["model"] == "ArcFace"
+
+
+def test_ready_follows_face_engine_state(client, monkeypatch):
+    monkeypatch.setitem(face_engine._state, "ready", False)
+    assert client.get("/health/ready").status_code == 503
+
+    monkeypatch.setitem(face_engine._state, "ready", True)
+    res = client.get("/health/ready")
+    assert res.status_code == 200
+    assert res.get_json()["success"] is True
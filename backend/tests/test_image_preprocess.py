@@ -0,0 +1,25 @@
+"""
+Reduced decoding and downscaling of uploaded photos.
+"""
+import cv2
+import numpy as np
+from app.utils import image_preprocess
+from app.utils.image_preprocess import decode_image
+
+
+def jpeg(width, height):
+    image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_large_image_uses_reduced_decode_and_cap():
+    before = image_preprocess.metrics()["reduced_decodes"]
+    image = decode_image(jpeg(4000, 3000), max_side=1000)
+    assert image.shape == (750, 1000, 3)
+    assert image_preprocess.metrics()["reduced_decodes"] == before + 1
+
+
+def test_small_image_and_disabled_cap_keep_size():
+    assert decode_image(jpeg(640, 480), max_side=1280).shape == (480, 640, 3)
+    assert decode_image(jpeg(2000, 1000), max_side=0).shape == (1000, 2000, 3)
+    assert decode_image(b"not an image", max_side=1280) is None
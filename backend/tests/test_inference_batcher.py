@@ -0,0 +1,69 @@
+"""
+Micro-batching scheduler: grouping, per-request results and error isolation.
+"""
+import time
+from concurrent.futures import Future
+import pytest
+from app.services.inference_batcher import MicroBatcher
+from app.utils.errors import APIError
+
+
+def make_batcher(calls, **options):
+    def run_batch(images, kwargs):
+        calls.append((list(images), kwargs))
+        future = Future()
+        future.set_result(
+            [ValueError(image) if image == "bad" else [{"embedding": image}] for image in images]
+        )
+        return future
+
+    return MicroBatcher(run_batch, **options)
+
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+    batcher = make_batcher(calls, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(f"img{i}", detector_backend="opencv") for i in range(4)]
+
+    assert [f.result(timeout=2)[0]["embedding"] for f in futures] == [
+        "img0", "img1", "img2", "img3"
+    ]
+    assert calls == [(["img0", "img1", "img2", "img3"], {"detector_backend": "opencv"})]
+    assert batcher.stats()["max_batch"] == 4
+
+
+def test_failures_and_options_are_isolated():
+    calls = []
+    batcher = make_batcher(calls, max_batch_size=8, max_wait_ms=200)
+    good = batcher.submit("good")
+    bad = batcher.submit("bad")
+    other = batcher.submit("skip", detector_backend="skip")
+
+    assert good.result(timeout=2)[0]["embedding"] == "good"
+    with pytest.raises(ValueError):
+        bad.result(timeout=2)
+    assert other.result(timeout=2)[0]["embedding"] == "skip"
+    # different represent options never share a model call
+    assert sorted(len(images) for images, _ in calls) == [1, 2]
+
+
+def test_cancelled_batch_fails_every_request():
+    pending = []
+
+    def run_batch(images, kwargs):
+        pending.append(Future())
+        return pending[-1]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait_ms=200)
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for _ in range(200):
+        if pending:
+            break
+        time.sleep(0.01)
+
+    # e.g. the pool was reset or shut down with cancel_futures=True
+    assert pending[0].cancel()
+    for future in futures:
+        with pytest.raises(APIError) as error:
+            future.result(timeout=2)
+        assert error.value.status_code == 503
@@ -0,0 +1,30 @@
+"""
+Backpressure and metrics for the inference pool (no model is loaded).
+"""
+import threading
+import pytest
+from app.services import inference_pool
+from app.utils.errors import APIError
+
+
+def test_inline_mode_calls_engine(app, monkeypatch):
+    monkeypatch.setitem(inference_pool._config, "workers", 0)
+    monkeypatch.setattr(
+        inference_pool.face_engine, "represent", lambda image, **kw: [{"embedding": [1.0]}]
+    )
+    before = inference_pool.metrics()["completed"]
+    assert inference_pool.represent("img")[0]["embedding"] == [1.0]
+    assert inference_pool.metrics()["completed"] == before + 1
+    assert inference_pool.metrics()["mode"] == "inline"
+
+
+def test_full_queue_is_rejected(app, monkeypatch):
+    monkeypatch.setitem(inference_pool._config, "workers", 1)
+    monkeypatch.setattr(inference_pool, "_slots", threading.BoundedSemaphore(1))
+    inference_pool._slots.acquire()
+
+    before = inference_pool.metrics()["rejected"]
+    with pytest.raises(APIError) as exc:
+        inference_pool.represent("img")
+    assert exc.value.status_code == 503
+    assert inference_pool.metrics()["rejected"] == before + 1
@@ -0,0 +1,89 @@
+"""
+Threshold calibration: FAR/FRR from blockwise score histograms, and the
+calibrated threshold stored per model version.
+"""
+import numpy as np
+from app.extensions import db
+from app.services import embedding_versions, face_engine, match_evaluation
+from app.services.face_match_service import match_threshold
+
+
+def synthetic(rng, identities=30, rows=2, probes=4, dim=32, noise=0.08):
+    centres = rng.standard_normal((identities, dim))
+    gallery = np.repeat(centres, rows, axis=0)
+    gallery = gallery + noise * rng.standard_normal(gallery.shape)
+    gallery_labels = np.repeat(np.arange(identities), rows)
+    probe_labels = np.repeat(np.arange(identities), probes)
+    probe_vectors = centres[probe_labels] + noise * rng.standard_normal((len(probe_labels), dim))
+    # people who are not enrolled
+    strangers = rng.standard_normal((10, dim))
+    probe_vectors = np.vstack([probe_vectors, strangers])
+    probe_labels = np.r_[probe_labels, [match_evaluation.UNKNOWN] * 10]
+    return gallery, gallery_labels, probe_vectors, probe_labels
+
+
+def brute_force(gallery, gallery_labels, probes, probe_labels, threshold):
+    g = gallery / np.linalg.norm(gallery, axis=1, keepdims=True)
+    p = probes / np.linalg.norm(probes, axis=1, keepdims=True)
+    genuine, impostor = [], []
+    for vec, label in zip(p, probe_labels):
+        for identity in np.unique(gallery_labels):
+            distance = 1 - (g[gallery_labels == identity] @ vec).max()
+            (genuine if identity == label else impostor).append(distance)
+    genuine, impostor = np.array(genuine), np.array(impostor)
+    return (impostor <= threshold).mean(), (genuine > threshold).mean()
+
+
+def test_roc_matches_brute_force(monkeypatch):
+    rng = np.random.default_rng(0)
+    gallery, gallery_labels, probes, probe_labels = synthetic(rng)
+    # force many probe blocks
+    monkeypatch.setattr(match_evaluation, "BLOCK_ELEMENTS", 100)
+
+    scores = match_evaluation.score_probes(gallery, gallery_labels, probes, probe_labels)
+    curve = match_evaluation.roc(scores["genuine"], scores["impostor"])
+    assert scores["genuine"].total == 120
+    assert scores["impostor"].total == 130 * 30 - 120
+
+    for threshold in (0.01, 0.3, 0.6, 0.9):
+        i = int(np.argmin(np.abs(curve["threshold"] - threshold)))
+        far, frr = brute_force(gallery, gallery_labels, probes, probe_labels, threshold)
+        assert np.isclose(curve["far"][i], far)
+        assert np.isclose(curve["frr"][i], frr)
+
+    assert np.all(np.diff(curve["far"]) >= 0) and np.all(np.diff(curve["frr"]) <= 0)
+
+
+def test_evaluate_recommends_threshold():
+    rng = np.random.default_rng(1)
+    report = match_evaluation.evaluate(*synthetic(rng), target_far=0.001, current_threshold=0.6)
+
+    recommended = report["recommended"]
+    assert recommended["far"] <= 0.001
+    # well separated synthetic identities: everyone enrolled is found
+    assert recommended["true_accept_rate"] == 1.0
+    assert recommended["false_accept_rate"] == 0.0
+    assert report["current"]["threshold"] == 0.6
+    assert report["roc"][0]["threshold"] == 0.0
+
+
+def test_stage_timer():
+    timer = match_evaluation.StageTimer()
+    with timer.stage("detect"):
+        pass
+    timer.record("match", 0.02, count=4)
+    summary = timer.summary()
+    assert summary["match"]["count"] == 4
+    assert summary["match"]["mean_ms"] == 5.0
+    assert summary["detect"]["count"] == 1
+
+
+def test_threshold_per_model_version(app):
+    version = face_engine.model_version()
+    assert match_threshold() == app.config["FACE_MATCH_THRESHOLD"]
+
+    embedding_versions.set_match_threshold(version, 0.42)
+    embedding_versions.set_match_threshold("stub:stub:1", 0.3)
+    db.session.commit()
+    assert match_threshold() == 0.42
+    assert embedding_versions.match_threshold("stub:stub:1") == 0.3
@@ -0,0 +1,135 @@
+"""
+Notifications queued in the caller's transaction and delivered by the dispatcher.
+"""
+from datetime import datetime, timedelta
+from app.extensions import db
+from app.models.user import User
+from app.models.notification import Notification
+from app.models.notification_outbox import NotificationOutbox
+from app.services import notification_dispatcher
+from app.utils.notification_helper import queue_notifications
+
+
+def make_users(n):
+    users = []
+    for i in range(n):
+        u = User(name=f"n{i}", email=f"n{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u)
+        users.append(u)
+    db.session.commit()
+    return [u.id for u in users]
+
+
+def notify(user_ids):
+    return queue_notifications(
+        {"user_id": uid, "title": "Hi", "message": f"for {uid}"} for uid in user_ids
+    )
+
+
+def test_queued_with_the_transaction(app):
+    user_ids = make_users(3)
+
+    notify(user_ids)
+    db.session.rollback()
+    assert NotificationOutbox.query.count() == 0
+
+    assert notify(user_ids) == 3
+    db.session.commit()
+    assert NotificationOutbox.query.count() == 3
+    assert Notification.query.count() == 0
+
+
+def test_drain_in_batches(app, monkeypatch):
+    monkeypatch.setitem(notification_dispatcher._config, "batch", 2)
+    user_ids = make_users(5)
+    notify(user_ids)
+    db.session.commit()
+
+    assert notification_dispatcher.drain_batch() == 2
+    assert notification_dispatcher.drain() == 3
+    assert NotificationOutbox.query.count() == 0
+
+    delivered = Notification.query.order_by(Notification.id).all()
+    assert [(n.user_id, n.message, n.type) for n in delivered] == [
+        (uid, f"for {uid}", "info") for uid in user_ids
+    ]
+    assert notification_dispatcher.status()["queued"] == 0
+
+
+def test_coalesced_per_user_and_key(app):
+    user_ids = make_users(2)
+    queue_notifications(
+        [{"user_id": uid, "title": "Hi", "message": "ABSENT"} for uid in user_ids],
+        coalesce_key="attendance:1",
+    )
+    db.session.commit()
+    first_due = NotificationOutbox.query.first().deliver_after
+
+    # edited again within the window: one pending row per user, same due time
+    queue_notifications(
+        [{"user_id": user_ids[0], "title": "Hi", "message": "PRESENT"}], coalesce_key="attendance:1"
+    )
+    queue_notifications([{"user_id": user_ids[0], "title": "Hi", "message": "other"}])
+    db.session.commit()
+    pending = NotificationOutbox.query.filter_by(coalesce_key="attendance:1").all()
+    assert sorted((n.user_id, n.message) for n in pending) == [
+        (user_ids[0], "PRESENT"),
+        (user_ids[1], "ABSENT"),
+    ]
+    assert all(n.deliver_after == first_due for n in pending)
+
+    # only the uncoalesced row is due yet
+    assert notification_dispatcher.drain() == 1
+    NotificationOutbox.query.update({"deliver_after": datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert notification_dispatcher.drain() == 2
+    assert sorted(n.message for n in Notification.query) == ["ABSENT", "PRESENT", "other"]
+
+
+def test_dispatcher_starts_with_the_first_request(app, monkeypatch):
+    started = []
+    monkeypatch.setattr(notification_dispatcher, "_run", started.append)
+    monkeypatch.setitem(notification_dispatcher._config, "thread", None)
+
+    app.testing = False
+    app.config["NOTIFICATION_DISPATCHER"] = True
+    notification_dispatcher.init_app(app)
+    # creating the app (e.g. for flask db upgrade) does not start it
+    notification_dispatcher.wake()
+    assert notification_dispatcher._config["thread"] is None
+
+    app.test_client().get("/health")
+    notification_dispatcher._config["thread"].join(1)
+    assert started == [app]
+
+
+def test_edit_reverted_within_the_window_is_dropped(app):
+    user_ids = make_users(2)
+
+    def edit(uid, before, after):
+        queue_notifications(
+            [
+                {
+                    "user_id": uid,
+                    "title": "Attendance Updated",
+                    "message": after,
+                    "coalesce_from": before,
+                    "coalesce_to": after,
+                }
+            ],
+            coalesce_key="attendance:1",
+        )
+
+    edit(user_ids[0], "PRESENT", "ABSENT")
+    edit(user_ids[1], "PRESENT", "ABSENT")
+    db.session.commit()
+    # user 0 is set back, user 1 edited twice in the same direction
+    edit(user_ids[0], "ABSENT", "PRESENT")
+    edit(user_ids[1], "ABSENT", "ABSENT")
+    db.session.commit()
+
+    pending = NotificationOutbox.query.filter_by(coalesce_key="attendance:1").all()
+    assert [(n.user_id, n.message, n.coalesce_from) for n in pending] == [
+        (user_ids[1], "ABSENT", "PRESENT")
+    ]
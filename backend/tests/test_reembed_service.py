@@ -0,0 +1,175 @@
+"""
+Re-embedding stored faces into a new model version, with the stub backend
+and an in-process executor so no model is loaded.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.models.teacher import Teacher
+from app.models.face_template import FaceTemplate
+from app.models.face_embedding_model import FaceEmbeddingModel
+from app.models.face_reembed_job import FaceReembedJob
+from app.models.face_staged_embedding import FaceStagedEmbedding
+from app.utils.embedding_codec import encode_embedding
+from app.services import embedding_backends, embedding_versions, face_index, reembed_service
+
+
+class InlineExecutor(ThreadPoolExecutor):
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+
+def crop(tmp_path, name, seed):
+    path = str(tmp_path / f"{name}.png")
+    cv2.imwrite(path, np.random.default_rng(seed).integers(0, 255, (16, 16, 3), dtype=np.uint8))
+    return path
+
+
+def stub_vector(path):
+    return embedding_backends.StubBackend({"stub_dim": 8}).embed([cv2.imread(path)])[0]
+
+
+def seed_legacy(tmp_path):
+    """One student with a template and one enrolled before templates, on the legacy model."""
+    klass = Class(name="Reembed", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    students = []
+    for i in range(2):
+        u = User(name=f"R{i}", email=f"r{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"RE-{i}", class_id=klass.id)
+        s.face_image_path = crop(tmp_path, f"student_{i}", i)
+        s.set_face_embedding(np.ones(4, dtype=np.float32))
+        db.session.add(s)
+        students.append(s)
+    db.session.flush()
+    template = FaceTemplate(
+        student_id=students[0].id, source="REGISTER", image_path=crop(tmp_path, "template", 7)
+    )
+    template.set_embedding(np.ones(4, dtype=np.float32))
+    db.session.add(template)
+    db.session.add(FaceEmbeddingModel(version=embedding_versions.LEGACY_MODEL_VERSION, active=True))
+    db.session.commit()
+    return students, template
+
+
+def setup(app, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    app.config.update(FACE_EMBEDDING_BACKEND="stub", FACE_STUB_DIM=8, FACE_REEMBED_WORKERS=1)
+    monkeypatch.setattr(reembed_service, "ProcessPoolExecutor", InlineExecutor)
+    # run the job synchronously instead of in a background thread
+    monkeypatch.setattr(reembed_service, "_spawn", reembed_service._run_job)
+    monkeypatch.setitem(face_index._config, "path", str(tmp_path / "face_index.npz"))
+
+
+def test_reembed_swaps_version(app, monkeypatch, tmp_path):
+    setup(app, monkeypatch, tmp_path)
+    students, template = seed_legacy(tmp_path)
+    legacy = embedding_versions.LEGACY_MODEL_VERSION
+    assert embedding_versions.active_version(refresh=True) == legacy
+
+    job_id = reembed_service.start_job(None, app).id
+
+    db.session.expire_all()
+    job = db.session.get(FaceReembedJob, job_id)
+    assert job.status == "COMPLETED"
+    assert (job.total_items, job.processed_items, job.failed_items) == (2, 2, 0)
+    assert job.target_version == "stub:stub:1"
+    assert embedding_versions.active_version(refresh=True) == "stub:stub:1"
+
+    template = db.session.get(FaceTemplate, template.id)
+    assert template.embedding_model == "stub:stub:1"
+    assert np.allclose(template.get_embedding(), stub_vector(template.image_path))
+    for student in (db.session.get(Student, s.id) for s in students):
+        assert student.face_embedding_model == "stub:stub:1"
+        assert student.get_face_embedding().shape == (8,)
+    templateless = db.session.get(Student, students[1].id)
+    assert np.allclose(templateless.get_face_embedding(), stub_vector(templateless.face_image_path))
+
+
+def test_resume_skips_staged_items(app, monkeypatch, tmp_path):
+    setup(app, monkeypatch, tmp_path)
+    students, template = seed_legacy(tmp_path)
+    job = FaceReembedJob(
+        id="job-1",
+        status="FAILED",
+        source_version=embedding_versions.LEGACY_MODEL_VERSION,
+        target_version="stub:stub:1",
+        total_items=2,
+        processed_items=1,
+    )
+    staged = FaceStagedEmbedding(
+        job_id="job-1",
+        item_key=f"template:{template.id}",
+        embedding=encode_embedding(np.full(8, 0.5, dtype=np.float32)),
+    )
+    db.session.add_all([job, staged])
+    db.session.commit()
+
+    embedded = []
+    original = reembed_service._embed_batch
+    monkeypatch.setattr(
+        reembed_service,
+        "_embed_batch",
+        lambda items: embedded.extend(key for key, *_ in items) or original(items),
+    )
+    reembed_service.resume_job("job-1", app)
+
+    assert embedded == [f"student:{students[1].id}"]
+    db.session.expire_all()
+    assert db.session.get(FaceReembedJob, "job-1").status == "COMPLETED"
+    assert db.session.get(FaceTemplate, template.id).get_embedding().tolist() == [0.5] * 8
+
+
+def test_unresolved_faces_block_the_swap(app, monkeypatch, tmp_path):
+    setup(app, monkeypatch, tmp_path)
+    seed_legacy(tmp_path)
+    legacy = embedding_versions.LEGACY_MODEL_VERSION
+    # legacy teacher: the whole uploaded frame was stored, and it has no face
+    u = User(name="T", email="t@test", role="TEACHER")
+    u.set_password("t")
+    db.session.add(u); db.session.flush()
+    teacher = Teacher(user_id=u.id)
+    teacher.set_face_embedding(np.ones(4, dtype=np.float32))
+    db.session.add(teacher)
+    db.session.commit()
+    (tmp_path / "uploads" / "faces").mkdir(parents=True)
+    cv2.imwrite(
+        str(tmp_path / "uploads" / "faces" / f"teacher_{teacher.id}.jpg"),
+        np.full((64, 64, 3), 128, dtype=np.uint8),
+    )
+
+    job_id = reembed_service.start_job(None, app).id
+    db.session.expire_all()
+    job = db.session.get(FaceReembedJob, job_id)
+    assert job.status == "NEEDS_ATTENTION"
+    assert f"teacher:{teacher.id}" in job.error
+    assert job.failed_items == 1
+    assert embedding_versions.active_version(refresh=True) == legacy
+
+    # the teacher is removed from face login; resuming completes the swap
+    teacher = db.session.get(Teacher, teacher.id)
+    teacher.face_embedding_bin = None
+    teacher.face_embedding = None
+    db.session.commit()
+    reembed_service.resume_job(job_id, app)
+    db.session.expire_all()
+    assert db.session.get(FaceReembedJob, job_id).status == "COMPLETED"
+    assert embedding_versions.active_version(refresh=True) == "stub:stub:1"
+
+
+def test_version_mismatch_is_reported(app, capsys):
+    legacy = embedding_versions.LEGACY_MODEL_VERSION
+    db.session.add(FaceEmbeddingModel(version=legacy, active=True))
+    db.session.commit()
+    app.config.update(FACE_EMBEDDING_BACKEND="stub")
+
+    assert embedding_versions.active_version(refresh=True) == legacy
+    embedding_versions.active_version(refresh=True)
+    assert capsys.readouterr().out.count("re-embed job") == 1
+    assert embedding_versions.status()["reembed_needed"]
@@ -0,0 +1,116 @@
+"""
+save_records writes only the difference to the session's current records.
+"""
+from datetime import date
+import pytest
+from sqlalchemy import event
+from app.extensions import db
+from app.models.user import User
+from app.models.classes import Class
+from app.models.student import Student
+from app.models.attendance_session import AttendanceSession
+from app.models.attendance_record import AttendanceRecord
+from app.services.attendance_service import upsert_records, save_records
+from app.utils.errors import APIError
+
+
+def make_session(size=4):
+    klass = Class(name="Rec", section="A", year=2025)
+    db.session.add(klass); db.session.flush()
+    ids = []
+    for i in range(size):
+        u = User(name=f"r{i}", email=f"r{i}@test", role="STUDENT")
+        u.set_password("s")
+        db.session.add(u); db.session.flush()
+        s = Student(user_id=u.id, roll_no=f"r{i}", class_id=klass.id)
+        db.session.add(s); db.session.flush()
+        ids.append(s.id)
+    session = AttendanceSession(
+        class_id=klass.id, subject_id=1, teacher_id=1, session_date=date(2026, 2, 2)
+    )
+    db.session.add(session)
+    db.session.commit()
+    return session.id, ids
+
+
+def rows(session_id):
+    return {
+        r.student_id: (r.id, r.status, r.remarks)
+        for r in AttendanceRecord.query.filter_by(session_id=session_id)
+    }
+
+
+def test_only_differences_are_written(app):
+    session_id, ids = make_session()
+    payload = [{"student_id": sid, "status": "PRESENT"} for sid in ids]
+    changes = save_records(session_id, payload)
+    assert [c["student_id"] for c in changes] == ids
+    assert all(c["previous_status"] is None for c in changes)
+    before = rows(session_id)
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert save_records(session_id, payload) == []
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert all(s.lstrip().upper().startswith("SELECT") for s in statements)
+
+    # one correction: the other rows keep their ids
+    payload[1] = {"student_id": ids[1], "status": "ABSENT", "remarks": "sick"}
+    changes = save_records(session_id, payload)
+    assert changes == [
+        {"student_id": ids[1], "status": "ABSENT", "remarks": "sick", "previous_status": "PRESENT"}
+    ]
+    after = rows(session_id)
+    assert after[ids[1]] == (before[ids[1]][0], "ABSENT", "sick")
+    assert {sid: after[sid] for sid in ids if sid != ids[1]} == {
+        sid: before[sid] for sid in ids if sid != ids[1]
+    }
+
+
+def test_insert_update_and_delete(app):
+    session_id, ids = make_session()
+    save_records(
+        session_id,
+        [{"student_id": ids[0], "status": "PRESENT"}, {"student_id": ids[2], "status": "PRESENT"}],
+    )
+
+    changes = save_records(
+        session_id,
+        [{"student_id": ids[1], "status": "PRESENT"}, {"student_id": ids[2], "status": "ABSENT"}],
+    )
+    assert {c["student_id"]: (c["previous_status"], c["status"]) for c in changes} == {
+        ids[0]: ("PRESENT", None),
+        ids[1]: (None, "PRESENT"),
+        ids[2]: ("PRESENT", "ABSENT"),
+    }
+    assert {sid: r[1] for sid, r in rows(session_id).items()} == {
+        ids[1]: "PRESENT",
+        ids[2]: "ABSENT",
+    }
+
+
+def test_insert_of_existing_record_updates_it(app):
+    session_id, ids = make_session()
+    save_records(session_id, [{"student_id": ids[0], "status": "PRESENT"}])
+    record_id = rows(session_id)[ids[0]][0]
+
+    # e.g. written by face attendance between reading and inserting
+    upsert_records(
+        [{"session_id": session_id, "student_id": ids[0], "status": "ABSENT", "remarks": "late"}]
+    )
+    db.session.commit()
+    assert rows(session_id) == {ids[0]: (record_id, "ABSENT", "late")}
+
+
+def test_rejects_bad_records(app):
+    session_id, ids = make_session()
+    with pytest.raises(APIError):
+        save_records(session_id, [{"student_id": ids[0], "status": "LATE"}])
+    with pytest.raises(APIError):
+        save_records(session_id, [{"status": "PRESENT"}])